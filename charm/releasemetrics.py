@@ -2,7 +2,7 @@ import logging
 import os
 import shutil
 from pathlib import Path
-from subprocess import check_call
+from subprocess import call, check_call
 
 from charmlibs import apt
 
@@ -16,17 +16,22 @@ class ReleaseMetrics:
     def __init__(self):
         self._systemd_dir = Path("/etc/systemd/system/")
         self._influx_path = Path("/home/ubuntu/influx.conf")
-        self.run_metric_collector_service_template = f"""[Unit]
-Description=Run $METRIC metric
+        self.collector_daemon_service = "ubuntu-release-metrics-collector"
+        self.collector_daemon_service_template = f"""[Unit]
+Description=Run the ubuntu-release-metrics collectors
+Wants=network-online.target
+After=network-online.target
 
 [Install]
 WantedBy=multi-user.target
 
 [Service]
+CacheDirectory=ubuntu-release-metrics
 DynamicUser=yes
 Environment=DRY_RUN=$DRY_RUN
 EnvironmentFile={str(self._influx_path)}
-ExecStart=/usr/bin/python3 -c 'from metrics.collectors.$METRIC import run_metric; run_metric(dry_run=$DRY_RUN, verbose=True)'
+ExecStart=/usr/bin/python3 -c 'from metrics.daemon import run_daemon; run_daemon(dry_run=$DRY_RUN, verbose=True)'
+KillMode=mixed
 NoNewPrivileges=yes
 PrivateMounts=yes
 PrivateUsers=yes
@@ -36,26 +41,17 @@ ProtectHostname=yes
 ProtectKernelLogs=yes
 ProtectKernelModules=yes
 ProtectKernelTunables=yes
+Restart=always
+RestartSec=30s
 RestrictAddressFamilies=AF_UNIX AF_INET AF_INET6
 RestrictRealtime=yes
 RestrictSUIDSGID=yes
-RuntimeMaxSec=10m
+StateDirectory=ubuntu-release-metrics
+TimeoutStopSec=10m
 Type=simple
 User=ubuntu
 Group=ubuntu
 WorkingDirectory=/home/ubuntu/ubuntu-release-metrics/"""  # flake8: noqa: F401
-        self.run_metric_collector_timer_template = """[Unit]
-Description=Run run-metric-collector@$METRIC.service on a timer
-
-[Timer]
-OnBootSec=30s
-OnUnitInactiveSec=5m
-FixedRandomDelay=yes
-RandomizedDelaySec=1m
-Unit=run-metric-collector@$METRIC.service
-
-[Install]
-WantedBy=timers.target"""
 
     def configure(self, config: dict):
         logger.info(f"config:\n{config}")
@@ -113,64 +109,44 @@ WantedBy=timers.target"""
                 )
         self._influx_path.write_text("\n".join(influx_vars))
 
-    def _setup_units(self, config: dict):
-        logger.info("setting up ubuntu-release-metrics systemd units")
-        # first, check for anything old under /etc/systemd/system and remove it
-        old_systemd_files = [
-            f for f in Path("/etc/systemd/system/").glob("run-metric-collector@*")
-        ]
+    def _remove_old_units(self):
+        """Stop and remove the per-collector services and timers used before
+        the collectors moved into a single daemon."""
+        old_systemd_files = list(self._systemd_dir.glob("run-metric-collector@*"))
+        for fl in old_systemd_files:
+            # best effort: the unit may already be stopped or unloaded
+            call(["systemctl", "disable", "--now", fl.name])
         for fl in old_systemd_files:
             os.remove(fl)
+
+    def _setup_units(self, config: dict):
+        logger.info("setting up ubuntu-release-metrics systemd units")
+        self._remove_old_units()
         # this is the set of juju config variables involved in the systemd units
         config_vars = [
             "dry_run",
         ]
-        # list of metrics - each directory under metrics/collectors
-        metrics = [
-            f
-            for f in Path(REPO_LOCATION / "metrics" / "collectors").glob("**/*")
-            if f.is_dir()
-        ]
-        services = []
-        for metric in metrics:
-            logger.info(f"setting up {metric} systemd unit and timer")
-            try:
-                # for each metric, re-write the service and timer files
-                metric_service_file = self.run_metric_collector_service_template
-                for cfg_var in config_vars:
-                    cfg_value = config.get(cfg_var, None)
-                    if cfg_value is None:
-                        raise Exception(f"{cfg_var} cannot be None in juju config")
-                    metric_service_file = metric_service_file.replace(
-                        f"${cfg_var.upper()}",
-                        str(cfg_value),
-                    )
-                metric_service_file = metric_service_file.replace(
-                    "$METRIC",
-                    metric.name,
-                )
-                metric_timer_file = self.run_metric_collector_timer_template.replace(
-                    "$METRIC",
-                    metric.name,
-                )
-                service_file = (
-                    self._systemd_dir / f"run-metric-collector@{metric.name}.service"
-                )
-                timer_file = (
-                    self._systemd_dir / f"run-metric-collector@{metric.name}.timer"
-                )
-                service_file.write_text(metric_service_file)
-                timer_file.write_text(metric_timer_file)
-                services.append(f"run-metric-collector@{metric.name}")
-            except Exception as e:
-                logger.error(
-                    f"failed to install {str(metric)} systemd unit + timer, traceback:\n{e}"
+        try:
+            service_file_content = self.collector_daemon_service_template
+            for cfg_var in config_vars:
+                cfg_value = config.get(cfg_var, None)
+                if cfg_value is None:
+                    raise Exception(f"{cfg_var} cannot be None in juju config")
+                service_file_content = service_file_content.replace(
+                    f"${cfg_var.upper()}",
+                    str(cfg_value),
                 )
-                return
-        # There is no need to restart services, since they're
-        # periodically triggered and very short-lived.
-        # So we just reload the daemon.
+            service_file = (
+                self._systemd_dir / f"{self.collector_daemon_service}.service"
+            )
+            service_file.write_text(service_file_content)
+        except Exception as e:
+            logger.error(
+                f"failed to install the collector daemon unit, traceback:\n{e}"
+            )
+            return
+        # The daemon is long-running and only imports the collectors at
+        # startup, so restart it to pick up new code and configuration.
         check_call(["systemctl", "daemon-reload"])
-        for srvc in services:
-            check_call(["systemctl", "enable", f"{srvc}.service"])
-            check_call(["systemctl", "enable", "--now", f"{srvc}.timer"])
+        check_call(["systemctl", "enable", f"{self.collector_daemon_service}.service"])
+        check_call(["systemctl", "restart", f"{self.collector_daemon_service}.service"])
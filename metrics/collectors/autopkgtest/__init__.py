@@ -1,5 +1,7 @@
 from metrics.collectors.autopkgtest.autopkgtest_collector import AutopkgtestMetrics
 
+RUN_INTERVAL = "5m"
+
 
 def run_metric(*args, **kwargs):
     AutopkgtestMetrics(*args, **kwargs).run()
@@ -1,10 +1,11 @@
 # Copyright 2020 Canonical Ltd
 
-import json
-import urllib.request
 from collections import defaultdict
 
+import requests
+
 from metrics.lib.basemetric import Metric
+from metrics.lib.point import Point
 
 QUEUE_SIZE_URL = {
     "production": "https://autopkgtest.ubuntu.com/queue_size.json",
@@ -17,12 +18,26 @@ RUNNING_URL = {
 }
 
 
+def count_running(running):
+    """Count the tests in ``running.json`` as ``{release: {arch: count}}``."""
+    counts = defaultdict(lambda: defaultdict(int))
+
+    for pkg in running:
+        for params in running[pkg]:
+            for release in running[pkg][params]:
+                for arch in running[pkg][params][release]:
+                    counts[release][arch] += 1
+    return counts
+
+
 class AutopkgtestMetrics(Metric):
+    GETTERS = ("collect_queue_sizes", "collect_running")
+
     def fetch(self, url):
         try:
-            with urllib.request.urlopen(url) as resp:
-                return json.load(resp)
-        except urllib.error.URLError:
+            return self.http.get_json(url)
+        except requests.exceptions.RequestException as e:
+            self.log.warning(f"Failed to fetch {url}: {e}")
             return []
 
     def collect_queue_sizes(self):
@@ -35,16 +50,16 @@ class AutopkgtestMetrics(Metric):
                 for release in queue_sizes[context]:
                     for arch, count in queue_sizes[context][release].items():
                         data.append(
-                            {
-                                "measurement": "autopkgtest_queue_size",
-                                "fields": {"count": count},
-                                "tags": {
+                            Point(
+                                "autopkgtest_queue_size",
+                                {"count": count},
+                                {
                                     "context": context,
                                     "release": release,
                                     "arch": arch,
                                     "instance": instance,
                                 },
-                            }
+                            )
                         )
         return data
 
@@ -52,32 +67,16 @@ class AutopkgtestMetrics(Metric):
         data = []
         for instance in ("production", "staging"):
             running = self.fetch(RUNNING_URL[instance])
-            counts = defaultdict(lambda: defaultdict(int))
-
-            for pkg in running:
-                for params in running[pkg]:
-                    for release in running[pkg][params]:
-                        for arch in running[pkg][params][release]:
-                            counts[release][arch] += 1
+            counts = count_running(running)
 
             for release in counts:
                 for arch, count in counts[release].items():
                     data.append(
-                        {
-                            "measurement": "autopkgtest_running",
-                            "fields": {"count": count},
-                            "tags": {
-                                "release": release,
-                                "arch": arch,
-                                "instance": instance,
-                            },
-                        }
+                        Point(
+                            "autopkgtest_running",
+                            {"count": count},
+                            {"release": release, "arch": arch, "instance": instance},
+                        )
                     )
 
             return data
-
-    def collect(self):
-        d1 = self.collect_queue_sizes()
-        d2 = self.collect_running()
-
-        return d1 + d2
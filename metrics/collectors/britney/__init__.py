@@ -1,5 +1,7 @@
 from metrics.collectors.britney.britney_collector import BritneyMetrics
 
+RUN_INTERVAL = "15m"
+
 
 def run_metric(*args, **kwargs):
     BritneyMetrics(*args, **kwargs).run()
@@ -4,20 +4,60 @@ from datetime import datetime, timezone
 from urllib.parse import urljoin
 
 import csv
+import re
 import requests
 import time
-import yaml
 
 from distro_info import UbuntuDistroInfo
-from yaml import CLoader as Loader
 from metrics.lib.basemetric import Metric
+from metrics.lib.freshness import DEFAULT_PROBE_BYTES
 
 BRITNEY_URL = "https://ubuntu-archive-team.ubuntu.com/proposed-migration/"
 UPDATE_EXCUSES_CSV_URL = BRITNEY_URL + "update_excuses.csv"
 UPDATE_EXCUSES_BY_TEAM_URL = BRITNEY_URL + "update_excuses_by_team.yaml"
 
+# e.g. "<p>Generated: 2026.01.15 12:00:00 +0000</p>" in update_excuses.html
+_GENERATED = re.compile(r"Generated: (\S+ \S+)")
+
+
+def parse_update_excuses_by_team(text):
+    """Parse ``update_excuses_by_team.yaml``.
+
+    Returns ``{team: (count, average age)}`` of the team's packages stuck in
+    proposed for more than 3 days.  Raises ``yaml.YAMLError`` on invalid
+    input.
+    """
+    import yaml
+
+    parsed_yaml = yaml.load(text, Loader=yaml.CLoader)
+    if parsed_yaml is None:
+        parsed_yaml = {}
+
+    by_team = {}
+    for team, packages in parsed_yaml.items():
+        npackages = 0
+        ages = []
+
+        if packages:
+            for item in packages:
+                age_val = float(item["age"])
+                if age_val > 3.0:
+                    npackages += 1
+                    ages.append(age_val)
+
+        age_average = sum(ages) / len(ages) if ages else 0.0
+        by_team[team] = (npackages, age_average)
+    return by_team
+
 
 class BritneyMetrics(Metric):
+    # The duration getter needs the latest_dates found by the age getter
+    GETTERS = (
+        ("get_britney_last_run_age", "get_britney_last_run_duration"),
+        "get_update_excuses_stats",
+        "get_update_excuses_by_team_stats",
+    )
+
     def __init__(self, dry_run=False, verbose=False):
         super().__init__(dry_run, verbose)
         supported_series = UbuntuDistroInfo().supported()
@@ -30,7 +70,7 @@ class BritneyMetrics(Metric):
         """returns run duration from log in minutes,
         or false if log is from an incomplete run"""
         LOG_TIME_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
-        log_text = requests.get(log_url).text
+        log_text = self.http.get(log_url).text
         log_lines = log_text.splitlines()
         if not log_lines[-1].startswith("Finished at:"):
             return False
@@ -40,9 +80,8 @@ class BritneyMetrics(Metric):
         )
         return (finish_time - start_time).seconds // 60
 
-    def get_latest_log(self, logs_url):
+    def get_latest_log(self, logs_url, date_logs):
         "yield the link to the latest valid log for date"
-        date_logs = requests.get(logs_url).text
         date_logs = date_logs.split("<td>")
         date_logs.reverse()
         for line in date_logs[1:]:
@@ -55,18 +94,27 @@ class BritneyMetrics(Metric):
 
     def get_britney_last_run_age(self):
         data = []
-        for s in self.active_series:
+        urls = {
+            s: urljoin(BRITNEY_URL, f"{s}/update_excuses.html")
+            for s in self.active_series
+        }
+        # Only the head of these (large) pages is needed for their stamp
+        responses = self.fetch_all(
+            urls.values(),
+            headers={
+                "Range": f"bytes=0-{DEFAULT_PROBE_BYTES - 1}",
+                "Accept-Encoding": "identity",
+            },
+        )
+        for s, url in urls.items():
             self.log.debug("Getting run time for " + s)
-            url = urljoin(BRITNEY_URL, f"{s}/update_excuses.html")
-            generated_datetime = None
-            update_excuses = requests.get(url).text
-            for line in update_excuses.splitlines():
-                if "Generated:" in line:
-                    tokens = line.split(" ")
-                    generated_datetime = " ".join(tokens[1:3])
-                    break
-            if not generated_datetime:
+            response = responses[url]
+            if isinstance(response, Exception):
+                raise response
+            m = _GENERATED.search(response.text)
+            if not m:
                 continue
+            generated_datetime = m.group(1)
             now = datetime.now(timezone.utc)
             generated_datetime = datetime.strptime(
                 generated_datetime, "%Y.%m.%d %H:%M:%S"
@@ -84,11 +132,18 @@ class BritneyMetrics(Metric):
 
     def get_britney_last_run_duration(self):
         data = []
-        for s in self.active_series:
+        urls = {
+            s: urljoin(BRITNEY_URL, f"log/{s}/{self.latest_dates[s]}/")
+            for s in self.active_series
+        }
+        responses = self.fetch_all(urls.values())
+        for s, url in urls.items():
             self.log.debug("Getting run duration for " + s)
-            url = urljoin(BRITNEY_URL, f"log/{s}/{self.latest_dates[s]}/")
+            response = responses[url]
+            if isinstance(response, Exception):
+                raise response
 
-            for latest_log_url in self.get_latest_log(url):
+            for latest_log_url in self.get_latest_log(url, response.text):
                 log_duration = self.get_log_duration(latest_log_url)
                 if log_duration:
                     data.append(
@@ -105,21 +160,21 @@ class BritneyMetrics(Metric):
     def get_update_excuses_stats(self):
         data = []
         self.log.debug("Getting update_excuses stats for " + self.dev_series)
-        self.log.debug("Downloading CSV...")
+        self.log.debug("Downloading new CSV rows...")
 
         try:
-            response = requests.get(UPDATE_EXCUSES_CSV_URL, timeout=60)
-            response.raise_for_status()
+            tail = self.follow(UPDATE_EXCUSES_CSV_URL, header=True)
 
             self.log.debug("Parsing CSV...")
-            lines = response.text.strip().splitlines()
-            reader = csv.DictReader(lines)
+            reader = csv.DictReader([tail.header] + tail.lines)
 
-            # Since we are stateless, we look back 12 hours to ensure
-            # we never miss a record, even if this cron job skipped a few runs.
+            # Only rows appended since the last run are read, and the newest
+            # timestamp sent is remembered; but when the whole file has to be
+            # read (first run, file replaced) still look back no more than
+            # 12 hours.
             now_ms = int(time.time() * 1000)
             lookback_ms = 12 * 60 * 60 * 1000
-            cutoff = now_ms - lookback_ms
+            cutoff = newest = max(now_ms - lookback_ms, tail.watermark or 0)
 
             for row in reader:
                 try:
@@ -141,6 +196,7 @@ class BritneyMetrics(Metric):
                                 },
                             }
                         )
+                        newest = max(newest, ts)
                 except (KeyError, ValueError) as exc:
                     # Skip malformed rows but continue processing the rest of the CSV
                     self.log.warning(
@@ -150,14 +206,17 @@ class BritneyMetrics(Metric):
         except (requests.exceptions.RequestException, csv.Error) as exc:
             self.log.warning("Failed to download or parse update_excuses CSV: %s", exc)
             return []
+        self.stage_state(tail.update(watermark=newest))
         return data
 
     def get_update_excuses_by_team_stats(self):
+        import yaml
+
         data = []
         self.log.debug("Getting update_excuses_by_team stats for " + self.dev_series)
         self.log.debug("Fetching YAML data...")
         try:
-            response = requests.get(UPDATE_EXCUSES_BY_TEAM_URL, timeout=60)
+            response = self.http.get(UPDATE_EXCUSES_BY_TEAM_URL)
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             self.log.warning(f"Failed to fetch data: {e}")
@@ -165,26 +224,12 @@ class BritneyMetrics(Metric):
 
         self.log.debug("Parsing YAML data...")
         try:
-            parsed_yaml = yaml.load(response.text, Loader=Loader)
+            by_team = parse_update_excuses_by_team(response.text)
         except yaml.YAMLError as e:
             self.log.warning(f"Failed to parse YAML: {e}")
             return []
 
-        if parsed_yaml is None:
-            parsed_yaml = {}
-        for team, packages in parsed_yaml.items():
-            npackages = 0
-            ages = []
-
-            if packages:
-                for item in packages:
-                    age_val = float(item["age"])
-                    if age_val > 3.0:
-                        npackages += 1
-                        ages.append(age_val)
-
-            age_average = sum(ages) / len(ages) if ages else 0.0
-
+        for team, (npackages, age_average) in by_team.items():
             data.append(
                 {
                     "measurement": "update_excuses_by_team_stats",
@@ -193,15 +238,3 @@ class BritneyMetrics(Metric):
                 }
             )
         return data
-
-    def collect(self):
-        run_ages = self.get_britney_last_run_age()
-        run_durations = self.get_britney_last_run_duration()
-        update_excuses_stats = self.get_update_excuses_stats()
-        update_excuses_by_team_stats = self.get_update_excuses_by_team_stats()
-        return (
-            run_ages
-            + run_durations
-            + update_excuses_stats
-            + update_excuses_by_team_stats
-        )
@@ -1,5 +1,7 @@
 from metrics.collectors.cnf.command_not_found import CommandNotFoundMetric
 
+RUN_INTERVAL = "1h"
+
 
 def run_metric(*args, **kwargs):
     CommandNotFoundMetric(*args, **kwargs).run()
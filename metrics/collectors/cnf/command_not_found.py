@@ -5,12 +5,12 @@ Collects metrics for command not found indexes
 """
 
 import datetime
-import tempfile
-import urllib
 
-from launchpadlib.launchpad import Launchpad
+import requests
 
+from metrics.lib import launchpad
 from metrics.lib.basemetric import Metric
+from metrics.lib.fetch import unwrap
 
 URL = "http://archive.ubuntu.com/ubuntu/dists/release/main/cnf/"
 
@@ -23,14 +23,8 @@ class CommandNotFoundMetric(Metric):
     def __init__(self, dry_run=False, verbose=False):
         super().__init__(dry_run, verbose)
 
-        self.lp = Launchpad.login_anonymously(
-            "metrics",
-            "production",
-            launchpadlib_dir=tempfile.mkdtemp(),
-            version="devel",
-        )
-        self.ubuntu = self.lp.distributions["ubuntu"]
-        self.active_series = {s.name: s for s in self.ubuntu.series if s.active}
+        ubuntu = launchpad.login().distributions["ubuntu"]
+        self.active_series = {s.name for s in ubuntu.series if s.active}
         self.date_now = datetime.datetime.now()
 
     def get_cnf_ages_in_days(self):
@@ -38,13 +32,13 @@ class CommandNotFoundMetric(Metric):
         metrics collecting function
         """
         data = []
-        for s in self.active_series:
-            url = URL.replace("release", s)
+        urls = {s: URL.replace("release", s) for s in self.active_series}
+        responses = self.fetch_all(urls.values())
+        for s, url in urls.items():
             count = None
             try:
-                with urllib.request.urlopen(url) as fp:
-                    bytes_resp = fp.read()
-                op_str = bytes_resp.decode("utf-8")
+                response = unwrap(responses[url])
+                op_str = response.content.decode("utf-8")
                 for line in op_str.splitlines():
                     if "Commands" in line:
                         # flake8: noqa: E203
@@ -60,7 +54,7 @@ class CommandNotFoundMetric(Metric):
                         )
                         age = self.date_now - datetime_object
                         count = age.total_seconds() / 86400
-            except urllib.error.HTTPError:
+            except requests.exceptions.HTTPError:
                 count = None
                 continue
             data.append(
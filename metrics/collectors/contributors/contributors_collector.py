@@ -1,8 +1,6 @@
 # Copyright 2026 Canonical Ltd
 
-import tempfile
-
-from launchpadlib.launchpad import Launchpad
+from metrics.lib import launchpad
 from metrics.lib.basemetric import Metric
 
 TEAMS = [
@@ -20,27 +18,34 @@ TEAMS = [
 
 
 class ContributorsMetrics(Metric):
-    def __init__(self, dry_run=False, verbose=False):
-        super().__init__(dry_run, verbose)
-
-        self.lp = Launchpad.login_anonymously(
-            "metrics",
-            "production",
-            launchpadlib_dir=tempfile.mkdtemp(),
-            version="devel",
-        )
-        self.ubuntu = self.lp.distributions["ubuntu"]
-        self.active_series = {s.name: s for s in self.ubuntu.series if s.active}
+    DEDUP_MEASUREMENTS = ("launchpad_team_members",)
 
     def collect(self):
         data_points = []
 
+        self.log.debug(f"Fetching member counts for {len(TEAMS)} Launchpad teams")
+        counts = launchpad.count_all(
+            self.http,
+            {
+                (team_name, count_type): (
+                    launchpad.api_url(f"~{team_name}/{count_type}"),
+                    {},
+                )
+                for team_name in TEAMS
+                for count_type in ("members", "participants")
+            },
+        )
+
         for team_name in TEAMS:
-            try:
-                self.log.debug(f"Fetching member count for Launchpad team: {team_name}")
-                team = self.lp.people[team_name]
-                member_count = len(team.members)
-                participants_count = len(team.participants)
+            member_count = counts[(team_name, "members")]
+            participants_count = counts[(team_name, "participants")]
+            for e in (member_count, participants_count):
+                if isinstance(e, Exception):
+                    self.log.warning(
+                        f"Failed to fetch data for Launchpad team '{team_name}': {e}"
+                    )
+                    break
+            else:
                 self.log.debug(
                     f"Team {team_name} has {member_count} members and {participants_count} participants."
                 )
@@ -59,10 +64,5 @@ class ContributorsMetrics(Metric):
                         "fields": {"count": participants_count},
                     }
                 )
-            except Exception as e:
-                self.log.warning(
-                    f"Failed to fetch data for Launchpad team '{team_name}': {e}"
-                )
-                continue
 
         return data_points
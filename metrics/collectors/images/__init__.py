@@ -1,5 +1,7 @@
 from metrics.collectors.images.images_collector import ImagesMetrics
 
+RUN_INTERVAL = "1h"
+
 
 def run_metric(*args, **kwargs):
     ImagesMetrics(*args, **kwargs).run()
@@ -1,12 +1,11 @@
 # Copyright 2020 Canonical Ltd
 
-import json
-import urllib.request
 from collections import defaultdict
 
 from distro_info import UbuntuDistroInfo as UDI
 
 from metrics.lib.basemetric import Metric
+from metrics.lib.fetch import unwrap
 from metrics.lib.ubunturelease import UbuntuRelease
 
 INCOMING_URL_PATTERN = (
@@ -37,25 +36,31 @@ class ReleaseBugsMetrics(Metric):
         }
         data = []
 
-        def fetch(urls, result_dict):
-            for codename, url in urls:
-                self.log.debug(f"Fetching {url}")
-                with urllib.request.urlopen(url) as resp:
-                    resp_json = json.load(resp)
-                    for bug in resp_json["tasks"]:
-                        teams_for_this_bug = set()
-                        for task in resp_json["tasks"][bug]:
-                            teams = task["team"]
-                            if not teams:
-                                continue
-                            for team in teams:
-                                if team in teams_for_this_bug:
-                                    continue
-                                teams_for_this_bug.add(team)
-                                result_dict[team][codename] += 1
+        # Download every incoming and tracking report in one concurrent batch
+        urls = [
+            (tag, codename, url)
+            for tag, pattern in (
+                ("incoming", INCOMING_URL_PATTERN),
+                ("tracking", TRACKING_URL_PATTERN),
+            )
+            for codename, url in self.urls(pattern)
+        ]
+        self.log.debug(f"Fetching {len(urls)} reports")
+        responses = self.fetch_all(url for _, _, url in urls)
 
-        fetch(self.urls(INCOMING_URL_PATTERN), counts["incoming"])
-        fetch(self.urls(TRACKING_URL_PATTERN), counts["tracking"])
+        for tag, codename, url in urls:
+            resp_json = unwrap(responses[url]).json()
+            for bug in resp_json["tasks"]:
+                teams_for_this_bug = set()
+                for task in resp_json["tasks"][bug]:
+                    teams = task["team"]
+                    if not teams:
+                        continue
+                    for team in teams:
+                        if team in teams_for_this_bug:
+                            continue
+                        teams_for_this_bug.add(team)
+                        counts[tag][team][codename] += 1
 
         self.log.debug("Finished fetching data")
 
@@ -1,5 +1,7 @@
 from metrics.collectors.sponsoring.sponsoring_collector import SponsoringMetrics
 
+RUN_INTERVAL = "15m"
+
 
 def run_metric(*args, **kwargs):
     SponsoringMetrics(*args, **kwargs).run()
@@ -1,13 +1,12 @@
 # Copyright 2026 Canonical Ltd
 
 import re
-import tempfile
 
 import requests
 import time
 
 from datetime import datetime, timezone
-from launchpadlib.launchpad import Launchpad
+from metrics.lib import launchpad
 from metrics.lib.basemetric import Metric
 from metrics.lib.lp_scrape_mps import count_team_reviews
 
@@ -21,71 +20,145 @@ PRIORITY_MISMATCHES_URL = (
     "https://ubuntu-archive-team.ubuntu.com/priority-mismatches.txt"
 )
 
+_SUMMARY_SECTION = re.compile(r"\* summary\n(.*?)(?=\n# Generated:)", re.DOTALL)
+_SUMMARY_LINE = re.compile(r"^\s*(\d+)\s+(\S+)\s*$")
+_BYARCH_GENERATED = re.compile(r"# Generated:\s+(.+)")
+_MISMATCHES_GENERATED = re.compile(r"Generated:\s+(.+)")
+
+# The by-arch reports end with their "# Generated:" line
+BYARCH_STAMP_BYTES = 512
+
+
+def parse_byarch_report(text):
+    """Parse a proposed-migration ``*_uninst.txt``/``*_outdate.txt`` report.
+
+    Returns its generation time and ``{arch: count}`` from its summary.
+    Raises ``ValueError`` if either cannot be found.
+    """
+    # Parse the "* summary" section
+    summary_match = _SUMMARY_SECTION.search(text)
+    if not summary_match:
+        raise ValueError("Could not find summary section")
+
+    # Parse the generated timestamp
+    generated_match = _BYARCH_GENERATED.search(text)
+    if not generated_match:
+        raise ValueError("Could not find generated timestamp")
+
+    try:
+        generated_time = datetime.strptime(
+            generated_match.group(1).strip(), "%a, %d %b %Y %H:%M:%S %z"
+        )
+    except ValueError as exc:
+        raise ValueError(f"Failed to parse generated timestamp: {exc}") from exc
+
+    counts = {}
+    for line in summary_match.group(1).splitlines():
+        m = _SUMMARY_LINE.match(line)
+        if m:
+            counts[m.group(2)] = int(m.group(1))
+    return generated_time, counts
+
+
+def parse_priority_mismatches(text, architectures):
+    """Parse ``priority-mismatches.txt``.
+
+    Returns its generation time and the number of mismatched packages for
+    each of *architectures*.  Raises ``ValueError`` if the generation time
+    cannot be found.
+    """
+    # Parse the generated timestamp
+    generated_match = _MISMATCHES_GENERATED.search(text)
+    if not generated_match:
+        raise ValueError("Could not find generated timestamp")
+
+    try:
+        ts_str = generated_match.group(1).strip().replace(" GMT ", " ")
+        generated_time = datetime.strptime(ts_str, "%a %b %d %H:%M:%S %Y").replace(
+            tzinfo=timezone.utc
+        )
+    except ValueError as exc:
+        raise ValueError(f"Failed to parse generated timestamp: {exc}") from exc
+
+    counts_by_arch = {arch: 0 for arch in architectures}
+    lines = text.splitlines()
+    arch = None
+
+    for i, line in enumerate(lines):
+        if not line or line.startswith("Generated:"):
+            continue
+        # Architecture section header: name line followed by '====' underline
+        if i + 1 < len(lines) and lines[i + 1].startswith("===="):
+            arch = line
+            continue
+        # Separator lines
+        if line.startswith("====") or line.startswith("----"):
+            continue
+        # Subsection header lines always contain spaces; package names never do
+        if " " in line:
+            continue
+        # Last word of a multi-line subsection header is followed by '----'
+        if i + 1 < len(lines) and lines[i + 1].startswith("----"):
+            continue
+        # Remaining lines are package names
+        if arch and arch in counts_by_arch:
+            counts_by_arch[arch] += 1
+
+    return generated_time, counts_by_arch
+
 
 class UbuntuArchiveMetrics(Metric):
+    GETTERS = (
+        "get_nbs_stats",
+        "get_uninst_stats",
+        "get_outdate_stats",
+        "get_priority_mismatch_stats",
+        "get_component_mismatch_stats",
+        "get_review_stats",
+        "get_bug_stats",
+    )
+    DEDUP_MEASUREMENTS = ("ubuntu_archive_bugs",)
+
     def __init__(self, dry_run=False, verbose=False):
         super().__init__(dry_run, verbose)
 
-        self.lp = Launchpad.login_anonymously(
-            "metrics",
-            "production",
-            launchpadlib_dir=tempfile.mkdtemp(),
-            version="devel",
-        )
-        self.ubuntu = self.lp.distributions["ubuntu"]
-        self.active_series = {s.name: s for s in self.ubuntu.series if s.active}
-        self.dev_series = self.ubuntu.current_series.name
+        # Only plain data: getters run in other threads (see metrics.lib.launchpad)
+        current_series = launchpad.login().distributions["ubuntu"].current_series
+        self.dev_series = current_series.name
         self.architectures = [
-            arch.architecture_tag for arch in self.ubuntu.current_series.architectures
+            arch.architecture_tag for arch in current_series.architectures
         ]
 
-    def _fetch_recent_csv_lines(self, url, buffer_size=2048):
-        """Fetch the tail of a CSV via a Range request and return parsed lines.
-
-        For a 206 partial response the first line is discarded as it is likely
-        a fragment.  For a 200 full response all lines are kept.  Returns an
-        empty list on network or unexpected-status errors.
-        """
+    def _follow_csv(self, url, buffer_size=2048):
+        """Return the Tail of the CSV lines appended to *url* since the last
+        run (on the first run, of its last *buffer_size* bytes), or None on
+        network errors."""
         try:
-            headers = {"Range": f"bytes=-{buffer_size}"}
-            response = requests.get(url, headers=headers, timeout=60)
-            response.raise_for_status()
+            return self.follow(url, initial_tail=buffer_size)
         except requests.exceptions.RequestException as exc:
             self.log.warning("Failed to download CSV from %s: %s", url, exc)
-            return []
+            return None
 
-        lines = response.text.strip().splitlines()
-        status_code = response.status_code
-
-        if status_code == 206:
-            # The first line of a partial response is almost always a fragment.
-            if len(lines) > 1:
-                lines = lines[1:]
-        elif status_code == 200:
-            # Server ignored the Range header; keep all lines.
-            self.log.debug("Received full CSV from %s (status 200)", url)
-        else:
-            self.log.warning(
-                "Unexpected status code %s when requesting CSV from %s",
-                status_code,
-                url,
-            )
-            return []
+    @staticmethod
+    def _csv_cutoff(tail):
+        """Return the timestamp (ms) rows of *tail* must be newer than.
 
-        return lines
+        That is the newest one already sent, but no more than 12h ago, as a
+        safety period for files read in full or without any state.
+        """
+        cutoff = int(time.time() * 1000) - (12 * 60 * 60 * 1000)
+        return max(cutoff, tail.watermark or 0)
 
     def get_nbs_stats(self):
         data = []
         self.log.debug("Getting NBS stats for %s", self.dev_series)
 
-        lines = self._fetch_recent_csv_lines(NBS_CSV_URL)
-        if not lines:
+        tail = self._follow_csv(NBS_CSV_URL)
+        if tail is None:
             return []
 
-        now_ms = int(time.time() * 1000)
-        cutoff = now_ms - (12 * 60 * 60 * 1000)  # 12h safety period
-
-        for line in lines:
+        cutoff = newest = self._csv_cutoff(tail)
+        for line in tail.lines:
             parts = line.split(",")
             if len(parts) != 3:
                 continue
@@ -105,16 +178,16 @@ class UbuntuArchiveMetrics(Metric):
                             },
                         }
                     )
+                    newest = max(newest, ts)
             except ValueError as exc:
                 self.log.debug("Skipping line due to parse error: %s", exc)
                 continue
 
+        self.stage_state(tail.update(watermark=newest))
         return data
 
     def get_component_mismatch_stats(self):
         data = []
-        now_ms = int(time.time() * 1000)
-        cutoff = now_ms - (12 * 60 * 60 * 1000)  # 12h safety period
 
         # Columns: time, source promotions, binary promotions,
         #          source demotions, binary demotions
@@ -131,9 +204,12 @@ class UbuntuArchiveMetrics(Metric):
                 self.dev_series,
                 pocket,
             )
-            lines = self._fetch_recent_csv_lines(url)
+            tail = self._follow_csv(url)
+            if tail is None:
+                continue
 
-            for line in lines:
+            cutoff = newest = self._csv_cutoff(tail)
+            for line in tail.lines:
                 parts = line.split(",")
                 if len(parts) != 5:
                     continue
@@ -155,9 +231,11 @@ class UbuntuArchiveMetrics(Metric):
                                 "fields": {"count": int(parts[i + 1])},
                             }
                         )
+                    newest = max(newest, ts)
                 except ValueError as exc:
                     self.log.debug("Skipping line due to parse error: %s", exc)
                     continue
+            self.stage_state(tail.update(watermark=newest))
 
         return data
 
@@ -166,45 +244,26 @@ class UbuntuArchiveMetrics(Metric):
         self.log.debug("Downloading %s report from %s", measurement, url)
 
         try:
-            response = requests.get(url, timeout=60)
+            stamp = self.probe_stamp(url, _BYARCH_GENERATED, tail=BYARCH_STAMP_BYTES)
+            if stamp.unchanged:
+                self.log.debug(
+                    "%s report unchanged since %s, skipping", measurement, stamp.value
+                )
+                return []
+            response = stamp.document or self.http.get(url)
             response.raise_for_status()
         except requests.exceptions.RequestException as exc:
             self.log.warning("Failed to download %s report: %s", measurement, exc)
             return []
 
-        text = response.text
-
-        # Parse the "* summary" section
-        summary_match = re.search(
-            r"\* summary\n(.*?)(?=\n# Generated:)", text, re.DOTALL
-        )
-        if not summary_match:
-            self.log.warning("Could not find summary section in %s report", measurement)
-            return []
-
-        # Parse the generated timestamp
-        generated_match = re.search(r"# Generated:\s+(.+)", text)
-        if not generated_match:
-            self.log.warning(
-                "Could not find generated timestamp in %s report", measurement
-            )
-            return []
-
         try:
-            generated_time = datetime.strptime(
-                generated_match.group(1).strip(), "%a, %d %b %Y %H:%M:%S %z"
-            )
+            generated_time, counts = parse_byarch_report(response.text)
         except ValueError as exc:
-            self.log.warning("Failed to parse generated timestamp: %s", exc)
+            self.log.warning("%s in %s report", exc, measurement)
             return []
 
         counts_by_arch = {arch: 0 for arch in self.architectures}
-        for line in summary_match.group(1).splitlines():
-            m = re.match(r"^\s*(\d+)\s+(\S+)\s*$", line)
-            if m:
-                count, arch = int(m.group(1)), m.group(2)
-                counts_by_arch[arch] = count
-
+        counts_by_arch.update(counts)
         for arch, count in counts_by_arch.items():
             data.append(
                 {
@@ -214,6 +273,7 @@ class UbuntuArchiveMetrics(Metric):
                     "fields": {"count": count},
                 }
             )
+        self.stage_state(stamp.update())
         return data
 
     def get_uninst_stats(self):
@@ -229,55 +289,26 @@ class UbuntuArchiveMetrics(Metric):
         self.log.debug("Downloading priority mismatches report")
 
         try:
-            response = requests.get(PRIORITY_MISMATCHES_URL, timeout=60)
+            stamp = self.probe_stamp(PRIORITY_MISMATCHES_URL, _MISMATCHES_GENERATED)
+            if stamp.unchanged:
+                self.log.debug(
+                    "Priority mismatches unchanged since %s, skipping", stamp.value
+                )
+                return []
+            response = stamp.document or self.http.get(PRIORITY_MISMATCHES_URL)
             response.raise_for_status()
         except requests.exceptions.RequestException as exc:
             self.log.warning("Failed to download priority mismatches report: %s", exc)
             return []
 
-        text = response.text
-
-        # Parse the generated timestamp
-        generated_match = re.search(r"Generated:\s+(.+)", text)
-        if not generated_match:
-            self.log.warning(
-                "Could not find generated timestamp in priority mismatches report"
-            )
-            return []
-
         try:
-            ts_str = generated_match.group(1).strip().replace(" GMT ", " ")
-            generated_time = datetime.strptime(ts_str, "%a %b %d %H:%M:%S %Y").replace(
-                tzinfo=timezone.utc
+            generated_time, counts_by_arch = parse_priority_mismatches(
+                response.text, self.architectures
             )
         except ValueError as exc:
-            self.log.warning("Failed to parse generated timestamp: %s", exc)
+            self.log.warning("%s in priority mismatches report", exc)
             return []
 
-        counts_by_arch = {arch: 0 for arch in self.architectures}
-        lines = text.splitlines()
-        arch = None
-
-        for i, line in enumerate(lines):
-            if not line or line.startswith("Generated:"):
-                continue
-            # Architecture section header: name line followed by '====' underline
-            if i + 1 < len(lines) and lines[i + 1].startswith("===="):
-                arch = line
-                continue
-            # Separator lines
-            if line.startswith("====") or line.startswith("----"):
-                continue
-            # Subsection header lines always contain spaces; package names never do
-            if " " in line:
-                continue
-            # Last word of a multi-line subsection header is followed by '----'
-            if i + 1 < len(lines) and lines[i + 1].startswith("----"):
-                continue
-            # Remaining lines are package names
-            if arch and arch in counts_by_arch:
-                counts_by_arch[arch] += 1
-
         for arch, count in counts_by_arch.items():
             data.append(
                 {
@@ -287,13 +318,14 @@ class UbuntuArchiveMetrics(Metric):
                     "fields": {"count": count},
                 }
             )
+        self.stage_state(stamp.update())
         return data
 
     def get_review_stats(self):
         data = []
         self.log.debug("Getting review stats for ubuntu-archive team")
         try:
-            count = count_team_reviews("ubuntu-archive")
+            count = count_team_reviews("ubuntu-archive", http=self.http)
             data.append(
                 {
                     "measurement": "ubuntu_archive_reviews",
@@ -307,56 +339,30 @@ class UbuntuArchiveMetrics(Metric):
     def get_bug_stats(self):
         data = []
         self.log.debug("Getting bug stats for ubuntu-archive team")
-        try:
-            archive_team = self.lp.people["ubuntu-archive"]
-        except Exception as exc:
-            self.log.warning("Failed to fetch Launchpad team 'ubuntu-archive': %s", exc)
-            return data
-
-        try:
-            subscribed_bugs = archive_team.searchTasks(bug_subscriber=archive_team)
-            data.append(
-                {
-                    "measurement": "ubuntu_archive_bugs",
-                    "tags": {"type": "subscribed"},
-                    "fields": {"count": len(subscribed_bugs)},
-                }
-            )
-        except Exception as exc:
-            self.log.warning(
-                "Failed to fetch subscribed bug stats from Launchpad: %s", exc
-            )
+        team_url = launchpad.api_url("~ubuntu-archive")
+        counts = launchpad.count_all(
+            self.http,
+            {
+                "subscribed": (
+                    team_url,
+                    {"ws.op": "searchTasks", "bug_subscriber": team_url},
+                ),
+                "assigned": (team_url, {"ws.op": "searchTasks", "assignee": team_url}),
+            },
+        )
 
-        try:
-            assigned_bugs = archive_team.searchTasks(assignee=archive_team)
+        for bug_type, count in counts.items():
+            if isinstance(count, Exception):
+                self.log.warning(
+                    "Failed to fetch %s bug stats from Launchpad: %s", bug_type, count
+                )
+                continue
             data.append(
                 {
                     "measurement": "ubuntu_archive_bugs",
-                    "tags": {"type": "assigned"},
-                    "fields": {"count": len(assigned_bugs)},
+                    "tags": {"type": bug_type},
+                    "fields": {"count": count},
                 }
             )
-        except Exception as exc:
-            self.log.warning(
-                "Failed to fetch assigned bug stats from Launchpad: %s", exc
-            )
 
         return data
-
-    def collect(self):
-        nbs = self.get_nbs_stats()
-        uninst = self.get_uninst_stats()
-        outdate = self.get_outdate_stats()
-        priority_mismatches = self.get_priority_mismatch_stats()
-        component_mismatches = self.get_component_mismatch_stats()
-        reviews = self.get_review_stats()
-        bugs = self.get_bug_stats()
-        return (
-            nbs
-            + uninst
-            + outdate
-            + priority_mismatches
-            + component_mismatches
-            + reviews
-            + bugs
-        )
@@ -1,5 +1,7 @@
 from metrics.collectors.upload_queues.upload_queue_collector import UbuntuQueueMetrics
 
+RUN_INTERVAL = "5m"
+
 
 def run_metric(*args, **kwargs):
     UbuntuQueueMetrics(*args, **kwargs).run()
@@ -1,62 +1,72 @@
 # Copyright 2020 Canonical Ltd
 
-import tempfile
-
-from launchpadlib.launchpad import Launchpad
-
+from metrics.lib import launchpad
 from metrics.lib.basemetric import Metric
 
 
 class UbuntuQueueMetrics(Metric):
+    # queue_ages and collect_new_queue_types run in the same thread, and so
+    # share its Launchpad session
+    GETTERS = ("collect_queue_sizes", ("queue_ages", "collect_new_queue_types"))
+
     def __init__(self, dry_run=False, verbose=False):
         super().__init__(dry_run, verbose)
 
-        self.lp = Launchpad.login_anonymously(
-            "metrics",
-            "production",
-            launchpadlib_dir=tempfile.mkdtemp(),
-            version="devel",
-        )
-        self.ubuntu = self.lp.distributions["ubuntu"]
-        self.active_series = {s.name: s for s in self.ubuntu.series if s.active}
+        # Only plain data: getters run in other threads (see metrics.lib.launchpad)
+        ubuntu = launchpad.login().distributions["ubuntu"]
+        self.active_series = {s.name: s.self_link for s in ubuntu.series if s.active}
+        self.dev_series = ubuntu.current_series.name
 
     def _is_devel(self, series):
-        return self.active_series[series] == self.ubuntu.current_series
+        return series == self.dev_series
 
     def collect_queue_sizes(self):
         """Get the number of UNAPPROVED/NEW uploads for proposed for each series."""
         measurements = []
-        for series in self.active_series:
-            for status in ("Unapproved", "New"):
-                queue_size = len(
-                    self.active_series[series].getPackageUploads(
-                        status=status, pocket="Proposed"
-                    )
-                )
-                measurements.append(
+        counts = launchpad.count_all(
+            self.http,
+            {
+                (series, status): (
+                    self.active_series[series],
                     {
-                        "measurement": "ubuntu_queue_size",
-                        "fields": {"count": queue_size},
-                        "tags": {
-                            "devel": self._is_devel(series),
-                            "status": status,
-                            "release": series,
-                        },
-                    }
+                        "ws.op": "getPackageUploads",
+                        "status": status,
+                        "pocket": "Proposed",
+                    },
                 )
+                for series in self.active_series
+                for status in ("Unapproved", "New")
+            },
+        )
+        for (series, status), queue_size in counts.items():
+            if isinstance(queue_size, Exception):
+                raise queue_size
+            measurements.append(
+                {
+                    "measurement": "ubuntu_queue_size",
+                    "fields": {"count": queue_size},
+                    "tags": {
+                        "devel": self._is_devel(series),
+                        "status": status,
+                        "release": series,
+                    },
+                }
+            )
         return measurements
 
     def collect_new_queue_types(self):
         """Count NEW uploads in Proposed split by upload types."""
         measurements = []
+        lp = launchpad.login()
         for series in self.active_series:
-            uploads = self.active_series[series].getPackageUploads(
+            uploads = lp.load(self.active_series[series]).getPackageUploads(
                 status="New", pocket="Proposed"
             )
             source_count = 0
             binary_count = 0
             sync_count = 0
             for u in uploads:
+                launchpad.check_deadline()
                 if getattr(u, "contains_source", False):
                     source_count += 1
                 if getattr(u, "contains_build", False):
@@ -86,15 +96,16 @@ class UbuntuQueueMetrics(Metric):
         from datetime import datetime
 
         measurement = []
+        lp = launchpad.login()
         for series in self.active_series:
+            lp_series = lp.load(self.active_series[series])
             for status in ("Unapproved", "New"):
-                uploads = self.active_series[series].getPackageUploads(
-                    status=status, pocket="Proposed"
-                )
+                uploads = lp_series.getPackageUploads(status=status, pocket="Proposed")
                 oldest_age_in_days = 0
                 backlog_count = 0
                 today = datetime.today()
                 for upload in uploads:
+                    launchpad.check_deadline()
                     # the granularity only needs to be in days so tzinfo doesn't need
                     # to be accurate
                     age_in_days = (
@@ -123,10 +134,3 @@ class UbuntuQueueMetrics(Metric):
                 )
 
         return measurement
-
-    def collect(self):
-        d1 = self.collect_queue_sizes()
-        d2 = self.queue_ages()
-        d3 = self.collect_new_queue_types()
-
-        return d1 + d2 + d3
@@ -1,9 +1,9 @@
 # Copyright 2021 Canonical Ltd
 
 import urllib.parse
-import urllib.request
 
 from metrics.lib.basemetric import Metric
+from metrics.lib.fetch import unwrap
 
 VERSIONS_STATS_URL = (
     "https://people.canonical.com/~platform/desktop/versions/stats/current/"
@@ -11,39 +11,45 @@ VERSIONS_STATS_URL = (
 
 
 class VersionsMetrics(Metric):
+    DEDUP_MEASUREMENTS = ("versions_script_stats",)
+
+    @staticmethod
+    def _lines(response):
+        text = response.content.decode("utf-8", errors="ignore")
+        return [line.strip() for line in text.splitlines()]
+
     def collect(self):
         """Collect the sponsoring queue details"""
         data = []
 
         known_reports_lst = []
-        with urllib.request.urlopen(
-            urllib.parse.urljoin(VERSIONS_STATS_URL, "reports")
-        ) as reports:
-            for report in reports:
-                report = report.decode("utf-8", errors="ignore").strip()
-                if report:
-                    known_reports_lst.append(report)
-
-        for report in known_reports_lst:
-            with urllib.request.urlopen(
-                urllib.parse.urljoin(VERSIONS_STATS_URL, report)
-            ) as stats:
-                for category in stats:
-                    category = category.decode("utf-8", errors="ignore").strip()
-                    if not category:
-                        continue
-                    category, value = category.split("=")
-                    value = int(value)
-                    data.append(
-                        {
-                            "measurement": "versions_script_stats",
-                            "fields": {"count": value},
-                            "tags": {
-                                "report": report,
-                                "category": category,
-                                "series": "devel",
-                            },
-                        }
-                    )
+        reports = self.http.get(urllib.parse.urljoin(VERSIONS_STATS_URL, "reports"))
+        reports.raise_for_status()
+        for report in self._lines(reports):
+            if report:
+                known_reports_lst.append(report)
+
+        urls = {
+            report: urllib.parse.urljoin(VERSIONS_STATS_URL, report)
+            for report in known_reports_lst
+        }
+        responses = self.fetch_all(urls.values())
+        for report, url in urls.items():
+            for category in self._lines(unwrap(responses[url])):
+                if not category:
+                    continue
+                category, value = category.split("=")
+                value = int(value)
+                data.append(
+                    {
+                        "measurement": "versions_script_stats",
+                        "fields": {"count": value},
+                        "tags": {
+                            "report": report,
+                            "category": category,
+                            "series": "devel",
+                        },
+                    }
+                )
 
         return data
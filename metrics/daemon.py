@@ -0,0 +1,177 @@
+# Copyright 2026 Canonical Ltd
+
+"""Run every collector periodically from a single long-lived process.
+
+Rather than systemd starting a fresh interpreter for each collector run, the
+daemon imports all collectors once and schedules them in-process.  The
+shared HTTP client, the InfluxDB client and the on-disk caches therefore
+stay warm between cycles, and a background thread drains the write-ahead
+spool to InfluxDB independently of collection.
+
+Runs start on the boundaries of the collector's ``RUN_INTERVAL`` (e.g. every
+hour on the hour), plus a random offset of up to ``STARTUP_SPREAD`` seconds
+drawn for each collector when the daemon starts: the first such time after
+the previous run finished.  Each run therefore lands in an interval of its
+own, whose start is the time given to its points (see
+``metrics.lib.basemetric.aligned_time()``).  A collector that fails is logged
+and retried on its next cycle without affecting the others.
+
+Run with ``python3 -m metrics.daemon``.
+"""
+
+import argparse
+import logging
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics.lib.basemetric import (
+    aligned_time,
+    start_background_drain,
+    stop_background_drain,
+)
+from metrics.lib.registry import discover, run_interval
+
+# Collectors start at a random point in this window (or in the first half of
+# their interval, if shorter) after each interval boundary, so they do not
+# all hit the network at the same moment (cf. RandomizedDelaySec= on the old
+# timers)
+STARTUP_SPREAD = 60
+
+DEFAULT_WORKERS = 4
+
+log = logging.getLogger(__name__)
+
+
+class CollectorDaemon:
+    def __init__(
+        self,
+        collectors,
+        dry_run=False,
+        verbose=False,
+        workers=DEFAULT_WORKERS,
+        clock=time.time,
+    ):
+        self.collectors = collectors
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.intervals = {
+            name: run_interval(module) for name, module in collectors.items()
+        }
+        self.offsets = {
+            name: random.uniform(0, min(STARTUP_SPREAD, interval / 2))
+            for name, interval in self.intervals.items()
+        }
+        self.workers = workers
+        self.clock = clock
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # collector name -> time it is next due; absent while running
+        self._due = {}
+
+    def stop(self, *args):
+        log.info("Stopping after the running collectors finish")
+        self._stop.set()
+
+    def run_collector(self, name):
+        start = self.clock()
+        try:
+            log.info("Running collector %s", name)
+            self.collectors[name].run_metric(dry_run=self.dry_run, verbose=self.verbose)
+        except Exception:
+            log.exception("Collector %s failed", name)
+        else:
+            log.info("Collector %s finished in %.1fs", name, self.clock() - start)
+        finally:
+            with self._lock:
+                self._due[name] = self.next_run(name, self.clock())
+
+    def next_run(self, name, now):
+        """Return the first interval boundary of collector *name*, plus its
+        offset, after *now*."""
+        interval = self.intervals[name]
+        start = aligned_time(interval, now).timestamp() + self.offsets[name]
+        if start <= now:
+            start += interval
+        return start
+
+    def schedule_startup(self):
+        """Make every collector due its offset from now."""
+        now = self.clock()
+        with self._lock:
+            self._due = {name: now + self.offsets[name] for name in self.collectors}
+
+    def run_due(self, submit):
+        """Pass each collector that is due to *submit* (as in
+        ``Executor.submit(run_collector, name)``) and return the seconds
+        until the next one is."""
+        now = self.clock()
+        with self._lock:
+            due = [name for name, when in self._due.items() if when <= now]
+            for name in due:
+                del self._due[name]
+            next_due = min(self._due.values(), default=now + 1)
+        for name in due:
+            submit(self.run_collector, name)
+        return next_due - now
+
+    def serve_forever(self):
+        self.schedule_startup()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="collector"
+        ) as pool:
+            while not self._stop.is_set():
+                self._stop.wait(max(0.5, min(self.run_due(pool.submit), 10)))
+
+
+def run_daemon(dry_run=False, verbose=False, only=None, workers=DEFAULT_WORKERS):
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format="%(levelname)s - %(threadName)s - %(message)s",
+    )
+    collectors = discover(only)
+    daemon = CollectorDaemon(collectors, dry_run, verbose, workers=workers)
+    for name, interval in daemon.intervals.items():
+        log.info("Scheduling collector %s every %ds", name, interval)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    if not dry_run:
+        # Collectors only append to the spool; send it to InfluxDB from here
+        start_background_drain()
+    try:
+        daemon.serve_forever()
+    finally:
+        stop_background_drain(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Do not act but print what would be submitted",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Be more verbose")
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="COLLECTOR",
+        help="Only schedule this collector (may be given more than once)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Maximum number of collectors running at once",
+    )
+    args = parser.parse_args()
+
+    run_daemon(args.dry_run, args.verbose, args.only, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,165 @@
 # Copyright 2020 Canonical Ltd
 
 import argparse
+import atexit
+import contextvars
 import logging
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 
-from influxdb import InfluxDBClient
-
+from metrics.lib.deadline import Deadline, DeadlineExceeded
+from metrics.lib.dedup import filter_unchanged
+from metrics.lib.dirs import state_dir
 from metrics.lib.errors import CollectorError
+from metrics.lib.fetch import DEFAULT_CONCURRENCY, fetch_all
+from metrics.lib.freshness import FreshnessGate
+from metrics.lib.httpclient import get_client
+from metrics.lib.kvstore import get_store
+from metrics.lib.point import Point, encode
+from metrics.lib.registry import COLLECTORS_PACKAGE, run_interval
+from metrics.lib.selfstats import CollectorStats
+from metrics.lib.sinks import (
+    WRITE_TIME_PRECISION,
+    FanOutSink,
+    QueuedSink,
+    sink_from_spec,
+)
+from metrics.lib.spool import Spool, SpoolDrainer
+from metrics.lib.tail import TailFollower
+from metrics.lib.timespan import parse_timespan
+
+# How long to wait at exit for mirrors to write what they still hold
+MIRROR_CLOSE_TIMEOUT = 30
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+_mirror = None
+_spool = None
+_drainer = None
+
+# The state items staged by the getter running in this context, if any
+_getter_state = contextvars.ContextVar("getter_state", default=None)
+
+
+def sink_from_env(log):
+    """Return the primary sink, ``$METRICS_SINK`` (InfluxDB 1.x configured by
+    the INFLUXDB_* environment by default); see metrics.lib.sinks.
+
+    Long-running processes (see metrics.daemon) construct collectors every
+    cycle; sharing the sink keeps its HTTP connection alive between them.
+    """
+    spec = os.environ.get("METRICS_SINK", "influxdb")
+    key = (spec,) + tuple(
+        sorted(item for item in os.environ.items() if item[0].startswith("INFLUXDB_"))
+    )
+    with _sinks_lock:
+        if key not in _sinks:
+            _sinks[key] = sink_from_spec(spec, log)
+        return _sinks[key]
+
+
+def get_mirror(log):
+    """Return the sink mirroring every point written, ``$METRICS_MIRRORS``,
+    or None if there is none.
+
+    Each mirror writes from its own background thread; whatever they still
+    hold is written when the process exits.
+    """
+    global _mirror
+    specs = [s for s in os.environ.get("METRICS_MIRRORS", "").split(",") if s.strip()]
+    if not specs:
+        return None
+    with _sinks_lock:
+        if _mirror is None:
+            _mirror = FanOutSink(QueuedSink(sink_from_spec(s, log)) for s in specs)
+            atexit.register(_mirror.close, MIRROR_CLOSE_TIMEOUT)
+        return _mirror
+
+
+def get_spool():
+    """Return the process-wide write-ahead spool, or None if unusable."""
+    global _spool
+    if _spool is None:
+        try:
+            _spool = Spool(state_dir("spool"))
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Spool unavailable: {e}")
+    return _spool
+
+
+def start_background_drain():
+    """Drain the spool from a background thread from now on.
+
+    Without this, ``Metric.run()`` drains the spool itself before returning,
+    which is what a one-shot collector process wants.
+    """
+    global _drainer
+    log = logging.getLogger(__name__)
+    writer = sink_from_env(log)
+    spool = get_spool()
+    if spool is None:
+        return
+    _drainer = SpoolDrainer(lambda: writer.drain(spool))
+    _drainer.start()
+
+
+def stop_background_drain(timeout=None):
+    """Stop the background drain, after a last attempt to empty the spool."""
+    global _drainer
+    if _drainer is not None:
+        _drainer.stop(timeout)
+        _drainer = None
+
+
+def to_lines(data, default_time=None):
+    """Encode Points (or point dicts) as line protocol.
+
+    Points without a ``time`` are stamped with *default_time*, or the current
+    time, so that they keep their collection time however late the spool is
+    drained.
+    """
+    if default_time is None:
+        default_time = datetime.now(timezone.utc)
+    return encode(data, WRITE_TIME_PRECISION, default_time=default_time)
+
+
+def aligned_time(interval, now=None):
+    """Return *now* (a POSIX timestamp, by default the current time) rounded
+    down to a multiple of *interval* seconds, as a UTC datetime."""
+    if now is None:
+        now = time.time()
+    interval = max(int(interval), 1)
+    return datetime.fromtimestamp(now // interval * interval, tz=timezone.utc)
+
+
+def write_lines(writer, lines, log):
+    """Spool line protocol *lines* and drain the spool with the sink
+    *writer*, and mirror them; see ``Metric.write()``."""
+    mirror = get_mirror(log)
+    if mirror is not None:
+        mirror.write_batch(lines)
+    spool = get_spool()
+    if spool is not None:
+        try:
+            spool.append(lines)
+        except OSError as e:
+            log.warning(f"Failed to spool points, writing directly: {e}")
+        else:
+            log.debug(f"Spooled {len(lines)} points")
+            if _drainer is not None:
+                _drainer.wake()
+            else:
+                writer.drain(spool)
+            return
+    writer.write(lines)
 
 
 def run_metric_main(module, cls):
+    from contextlib import nullcontext
     from importlib import import_module
 
     parser = argparse.ArgumentParser()
@@ -21,61 +170,399 @@ def run_metric_main(module, cls):
         help="Do not act but print what would be submitted",
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Be more verbose")
+    fixtures = parser.add_mutually_exclusive_group()
+    fixtures.add_argument(
+        "--record",
+        metavar="FIXTURES",
+        help="Record every HTTP response into this fixture bundle (.json.gz)",
+    )
+    fixtures.add_argument(
+        "--replay",
+        metavar="FIXTURES",
+        help="Serve HTTP responses from this fixture bundle, not the network; "
+        "implies --dry-run, so that stale data is never submitted",
+    )
+    parser.add_argument(
+        "--import-profile",
+        action="store_true",
+        help="Print the slowest imports of this collector and exit",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=f"{module.rsplit('.', 1)[-1]}-profile",
+        metavar="PREFIX",
+        help="Profile the run: write PREFIX.pstats and PREFIX.collapsed (for "
+        "flame graphs) and print where the time went",
+    )
 
     args = parser.parse_args()
 
+    if args.import_profile:
+        from metrics.lib.importprofile import format_report, profile_imports
+
+        print(format_report(module, profile_imports(module)))
+        return
+
+    if args.record or args.replay:
+        from metrics.lib.fixtures import http_fixtures
+
+        if args.record:
+            context = http_fixtures("record", args.record)
+        else:
+            context = http_fixtures("replay", args.replay)
+    else:
+        context = nullcontext()
+
+    if args.profile:
+        from metrics.lib.profiling import profiled
+
+        profiling = profiled(args.profile)
+    else:
+        profiling = nullcontext()
+
     cls = getattr(import_module(module), cls)
     try:
-        cls(dry_run=args.dry_run, verbose=args.verbose).run()
+        with context, profiling:
+            # Replayed responses are stale: never submit what they yield
+            dry_run = args.dry_run or args.replay is not None
+            cls(dry_run=dry_run, verbose=args.verbose).run()
     except CollectorError:
         sys.exit(1)
 
 
 class Metric:
+    # Names of the methods returning this collector's points, run by the
+    # default collect() on a pool of GETTER_WORKERS threads.  A tuple of
+    # names is run in order in a single thread: group getters that share a
+    # launchpadlib session, which must not be used concurrently.
+    GETTERS = ()
+    GETTER_WORKERS = 4
+
+    # Measurements whose points are only written when their fields changed
+    # since the last write for the same tags, or when the last write is
+    # DEDUP_MAX_SILENCE old, by default DEDUP_SILENCE_RUNS times the
+    # collector's RUN_INTERVAL (see metrics.lib.dedup)
+    DEDUP_MEASUREMENTS = ()
+    DEDUP_MAX_SILENCE = None
+    DEDUP_SILENCE_RUNS = 6
+
+    # Time budget of a run, which every request made through self.http draws
+    # from (see metrics.lib.deadline).  Each getter may use GETTER_DEADLINE
+    # of it, or all that is left if None; getters still running when the run
+    # is out of time, plus DEADLINE_GRACE seconds to return what they
+    # gathered until then, are abandoned, and the points of the others written.
+    DEADLINE = "8m"
+    GETTER_DEADLINE = None
+    DEADLINE_GRACE = 5
+
     def __init__(self, dry_run=False, verbose=False):
         self.dry_run = dry_run
         self.verbose = verbose
 
         self.log = logging.getLogger(__name__)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        formatter = logging.Formatter("%(levelname)s - %(message)s")
-        ch.setFormatter(formatter)
-        self.log.addHandler(ch)
+        # Only install our handler once per process, and not at all when the
+        # caller (e.g. metrics.daemon) has configured logging already.
+        if not self.log.handlers and not logging.getLogger().handlers:
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            formatter = logging.Formatter("%(levelname)s - %(message)s")
+            ch.setFormatter(formatter)
+            self.log.addHandler(ch)
 
         self.log.setLevel(logging.INFO)
 
         if self.verbose:
             self.log.setLevel(logging.DEBUG)
 
+        self.stats = CollectorStats()
+        # Time of the points of this run that have none; see gather()
+        self.collection_time = None
+        self.deadline = Deadline(parse_timespan(self.DEADLINE))
+        self.failed_getters = []
+        # (namespace, key, value) state to store once the points are written
+        self.pending_state = []
+
+        # Shared, pooled HTTP client: collectors should fetch through this
+        # rather than calling requests/urllib directly.
+        self.http = get_client().with_stats(self.stats)
+
         if not self.dry_run:
-            try:
-                hostname = os.environ["INFLUXDB_HOSTNAME"]
-                port = os.environ["INFLUXDB_PORT"]
-                username = os.environ["INFLUXDB_USERNAME"]
-                password = os.environ["INFLUXDB_PASSWORD"]
-                database = os.environ["INFLUXDB_DATABASE"]
-            except KeyError as e:
-                self.log.error(f"Make sure {e} is set in the environment.")
-                raise CollectorError(f"Variable {e} not set") from e
-
-            self.log.debug(f"Connecting to influxdb at {hostname}:{port}...")
-
-            self.influx_client = InfluxDBClient(
-                hostname, port, username, password, database, ssl=True, verify_ssl=False
-            )
+            self.writer = sink_from_env(self.log)
         else:
             self.log.info("Running in dry-run mode.")
 
+    def fetch_all(self, urls, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+        """Fetch *urls* concurrently with ``self.http``.
+
+        Returns a dict mapping each URL to its ``requests.Response``, or to the
+        exception raised while fetching it.
+        """
+        return fetch_all(self.http, urls, concurrency, **kwargs)
+
+    def follow(self, url, **kwargs):
+        """Return the lines appended to *url* since the last run.
+
+        See ``metrics.lib.tail.TailFollower.read()``; pass the ``update()``
+        of the returned Tail to ``stage_state()`` once its lines are handled.
+        """
+        return TailFollower(self.http, get_store()).read(url, **kwargs)
+
+    def probe_stamp(self, url, pattern, **kwargs):
+        """Return the generation stamp of the report at *url*, read from just
+        its first or last bytes.
+
+        See ``metrics.lib.freshness.FreshnessGate.probe()``; if the stamp is
+        ``unchanged`` the report can be skipped, otherwise pass its
+        ``update()`` to ``stage_state()`` once the report is handled.
+        """
+        return FreshnessGate(self.http, get_store()).probe(url, pattern, **kwargs)
+
+    def stage_state(self, item):
+        """Store the ``(namespace, key, value)`` *item* in the state store
+        once this run's points have been written.
+
+        Items staged by a getter of ``GETTERS`` are only kept if it finishes
+        in time, as are its points.
+        """
+        staged = _getter_state.get()
+        (self.pending_state if staged is None else staged).append(item)
+
+    @property
+    def name(self):
+        """The collector's name, e.g. ``ubuntu_archive``."""
+        parts = type(self).__module__.split(".")
+        if len(parts) > 2 and parts[:2] == ["metrics", "collectors"]:
+            return parts[2]
+        return type(self).__name__
+
+    @property
+    def interval(self):
+        """How often the collector runs, in seconds (see
+        ``metrics.lib.registry.run_interval()``)."""
+        return run_interval(sys.modules.get(f"{COLLECTORS_PACKAGE}.{self.name}"))
+
+    def run_getter(self, getter, *args, **kwargs):
+        """Call *getter* within its share of ``self.deadline`` and return its
+        points as a list, timing it in ``self.stats``.
+
+        A getter running out of time is recorded in ``self.failed_getters``;
+        if it handled that as a network error, the points it returned are
+        kept.
+        """
+        name = getter.__name__
+        budget = self.GETTER_DEADLINE
+        share = self.deadline.share(None if budget is None else parse_timespan(budget))
+        start = time.monotonic()
+        try:
+            with self.stats.timer(name), share.applied():
+                data = list(getter(*args, **kwargs))
+        except DeadlineExceeded:
+            self._report_timeout(name, time.monotonic() - start)
+            raise
+        if share.exceeded:
+            self._report_timeout(name, time.monotonic() - start, len(data))
+        return data
+
+    def _report_timeout(self, name, seconds, kept=0):
+        self.log.warning(
+            f"Getter {name} of {self.name} ran out of time after {seconds:.1f}s, "
+            f"keeping {kept} points"
+        )
+        self.stats.mark_timed_out(name, seconds)
+        self.failed_getters.append(name)
+
+    def run_getters(self):
+        """Run ``GETTERS`` concurrently and return all of their points.
+
+        A getter that raises is logged and recorded in
+        ``self.failed_getters``, as are those still running or not started
+        when ``self.deadline`` passes; the points of the others are still
+        returned.
+        """
+        # getter name -> its points, once it has finished
+        done = {}
+        # Set under lock once the getters still running are abandoned
+        lock = threading.Lock()
+        abandoned = threading.Event()
+        start = time.monotonic()
+        pool = ThreadPoolExecutor(
+            max_workers=self.GETTER_WORKERS, thread_name_prefix=f"{self.name}-getter"
+        )
+        futures = []
+        try:
+            for group in self.GETTERS:
+                futures.append(
+                    pool.submit(self._run_getter_group, group, done, lock, abandoned)
+                )
+            wait(futures, timeout=self.deadline.remaining() + self.DEADLINE_GRACE)
+        finally:
+            with lock:
+                abandoned.set()
+                finished = dict(done)
+            # Do not wait for getters past the deadline: their requests fail
+            # with DeadlineExceeded, so they end soon enough on their own, and
+            # whatever they return or stage then is dropped
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+        running = sum(1 for future in futures if future.running())
+        if running:
+            self.log.warning(
+                f"Abandoning {running} getter threads of {self.name} still running"
+            )
+        self.stats.abandoned_threads = running
+        data = []
+        for group in self.GETTERS:
+            for name in (group,) if isinstance(group, str) else group:
+                if name in finished:
+                    data.extend(finished[name])
+                else:
+                    self._report_timeout(name, time.monotonic() - start)
+        return data
+
+    def _run_getter_group(self, group, done, lock, abandoned):
+        cpu_start = time.thread_time()
+        for name in (group,) if isinstance(group, str) else group:
+            if self.deadline.expired:
+                # Reported by run_getters() as not finished
+                break
+            staged = []
+            token = _getter_state.set(staged)
+            failed = False
+            try:
+                data = self.run_getter(getattr(self, name))
+            except DeadlineExceeded:
+                data = []
+            except Exception:
+                self.log.exception(f"Getter {name} of {self.name} failed")
+                failed = True
+                data = []
+            finally:
+                _getter_state.reset(token)
+            with lock:
+                if abandoned.is_set():
+                    # Reported by run_getters() as not finished
+                    break
+                if failed:
+                    self.failed_getters.append(name)
+                done[name] = data
+                self.pending_state.extend(staged)
+        self.stats.add_cpu(time.thread_time() - cpu_start)
+
     def collect(self):
-        raise NotImplementedError
+        """Return (or yield) the points to submit, as Points or point dicts.
+
+        By default, the points of the ``GETTERS``.
+        """
+        if not self.GETTERS:
+            raise NotImplementedError
+        return self.run_getters()
+
+    def gather(self):
+        """Return the list of points of ``collect()``, timing it in
+        ``self.stats``.
+
+        Also sets ``collection_time``, the time of the points that have
+        none: the start of the collector's current interval.  Writing the
+        points of a run again, or those of another run in the same
+        interval, therefore overwrites them rather than adding new ones.
+        """
+        self.collection_time = aligned_time(self.interval)
+        start = time.monotonic()
+        cpu_start = time.thread_time()
+        with self.deadline.applied():
+            data = list(self.collect())
+        self.stats.collect_seconds = time.monotonic() - start
+        self.stats.add_cpu(time.thread_time() - cpu_start)
+        self.stats.points = len(data)
+        return data
 
     def run(self):
-        data = self.collect()
+        data = self.gather()
 
         if self.dry_run:
             import yaml
 
-            self.log.info("[dry-run] Would submit:\n" + yaml.dump(data, default_flow_style=False))
+            data = [p.as_dict() if isinstance(p, Point) else p for p in data]
+            self.log.info(
+                "[dry-run] Would submit:\n" + yaml.dump(data, default_flow_style=False)
+            )
+            self.log.debug(
+                "[dry-run] Self stats:\n"
+                + yaml.dump(
+                    [p.as_dict() for p in self.stats.to_points(self.name)],
+                    default_flow_style=False,
+                )
+            )
         else:
-            self.influx_client.write_points(data)
+            if self.DEDUP_MEASUREMENTS:
+                data = self.suppress_unchanged(data)
+            start = time.monotonic()
+            self.write(data)
+            self.stats.write_seconds = time.monotonic() - start
+            self.commit_state()
+            self.write_self_stats()
+
+        if self.failed_getters:
+            raise CollectorError(
+                f"{self.name}: failed getters: {', '.join(self.failed_getters)}"
+            )
+
+    @property
+    def dedup_max_silence(self):
+        """How long unchanged points are suppressed for, in seconds.
+
+        Runs are at least ``interval`` apart, so a window of a single
+        interval would never suppress anything.
+        """
+        if self.DEDUP_MAX_SILENCE is None:
+            return self.DEDUP_SILENCE_RUNS * self.interval
+        return parse_timespan(self.DEDUP_MAX_SILENCE)
+
+    def suppress_unchanged(self, data):
+        """Drop the points of ``DEDUP_MEASUREMENTS`` that did not change."""
+        store = get_store()
+        if store is None:
+            return data
+        kept, updates = filter_unchanged(
+            store,
+            data,
+            set(self.DEDUP_MEASUREMENTS),
+            self.dedup_max_silence,
+            time.time(),
+        )
+        self.stats.suppressed = len(data) - len(kept)
+        self.log.debug(f"Suppressed {self.stats.suppressed} unchanged points")
+        self.pending_state.extend(updates)
+        return kept
+
+    def commit_state(self):
+        """Store ``pending_state``, now that the points have been written."""
+        store = get_store()
+        if store is None or not self.pending_state:
+            return
+        store.put_many(self.pending_state)
+        self.pending_state = []
+
+    def write_self_stats(self):
+        """Write ``self.stats`` as the ``collector_self_stats`` measurement.
+
+        Losing these must not fail the collector, so errors are only logged.
+        """
+        try:
+            self.write(self.stats.to_points(self.name))
+        except Exception as e:
+            self.log.warning(f"Failed to write self stats: {e}")
+
+    def write(self, data):
+        """Persist *data* to the spool and get it on its way to the sink.
+
+        In a one-shot process the spool is drained before returning; under
+        metrics.daemon a background thread does it instead, so a slow
+        database never holds up collection.  Without a usable spool the
+        points are written directly.  Mirrors (see metrics.lib.sinks) are
+        handed the points at once and write them in the background.
+        """
+        write_lines(self.writer, to_lines(data, self.collection_time), self.log)
@@ -0,0 +1,87 @@
+# Copyright 2026 Canonical Ltd
+
+"""Time budgets for collector runs.
+
+A collector that waits forever on one hung host holds up its whole run, and
+with it every point it had already gathered.  Each run therefore gets a
+:class:`Deadline` (``Metric.DEADLINE``), and each getter a share of it, which
+every network call draws from: ``HTTPClient`` clips its timeouts to the time
+left in the :func:`current` deadline and refuses to start a request once it
+has passed, raising :class:`DeadlineExceeded`.
+
+The current deadline is a context variable, so it follows a getter into the
+threads of ``fetch_all()`` but not into unrelated getters running
+concurrently.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+import requests
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The time budget of the run or getter is used up.
+
+    A ``requests`` timeout, so that collectors already handling network
+    errors keep the points they gathered so far.
+    """
+
+
+class Deadline:
+    """A point in time by which work must be finished.
+
+    *seconds* from now, but no later than *parent*'s if given.
+    """
+
+    def __init__(self, seconds, parent=None):
+        self.end = time.monotonic() + seconds
+        if parent is not None:
+            self.end = min(self.end, parent.end)
+        # Whether check() ever failed, i.e. some work was refused
+        self.exceeded = False
+
+    def remaining(self):
+        """Seconds left, 0 once expired."""
+        return max(0.0, self.end - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.end
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired:
+            self.exceeded = True
+            raise DeadlineExceeded("Deadline exceeded")
+
+    def share(self, seconds=None):
+        """Return a deadline *seconds* from now within this one (this one's
+        end if None)."""
+        return Deadline(self.remaining() if seconds is None else seconds, self)
+
+    def clip(self, timeout):
+        """Return *timeout* (seconds, a ``(connect, read)`` tuple or None)
+        limited to the time left.  Raises DeadlineExceeded if none is."""
+        self.check()
+        remaining = self.remaining()
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    @contextmanager
+    def applied(self):
+        """Make this the current deadline within the block."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+def current():
+    """Return the deadline applying to the calling code, or None."""
+    return _current.get()
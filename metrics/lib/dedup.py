@@ -0,0 +1,72 @@
+# Copyright 2026 Canonical Ltd
+
+"""Suppression of points that have not changed since they were last written.
+
+Many series change rarely but are collected every few minutes.  For the
+measurements a collector opts in with ``Metric.DEDUP_MEASUREMENTS``, a point
+is dropped when its tag set was last written with identical fields, unless
+that was longer than the maximum silence interval ago: the value is then
+written again so that dashboards querying a bounded time range stay
+continuous.
+
+What was last written is remembered in the ``dedup`` namespace of the
+:mod:`~metrics.lib.kvstore`.  :func:`filter_unchanged` only returns the
+updates to store; the caller applies them once the points have been
+written, so a failed write is retried in full on the next run.
+"""
+
+import json
+
+from metrics.lib.point import point_parts
+
+NAMESPACE = "dedup"
+
+
+def series_key(measurement, tags):
+    """Return the identity of the series of a point, e.g. ``m,a=1,b=2``."""
+    parts = [measurement]
+    parts.extend(
+        f"{key}={value}"
+        for key, value in sorted(tags.items())
+        if value is not None and value != ""
+    )
+    return ",".join(parts)
+
+
+def fingerprint(fields):
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+def filter_unchanged(store, points, measurements, max_silence, now):
+    """Drop the unchanged points of *measurements* from *points*.
+
+    Only points without an explicit time are considered: points carrying
+    their own timestamp are idempotent to rewrite anyway, and several of
+    them may legitimately share a tag set.  *now* and *max_silence* are in
+    seconds.
+
+    Returns ``(kept, updates)``, where *updates* are the ``(namespace, key,
+    value)`` items to store once *kept* has been written.
+    """
+    candidates = {}
+    for i, point in enumerate(points):
+        measurement, tags, fields, time = point_parts(point)
+        if measurement in measurements and time is None:
+            candidates[i] = (series_key(measurement, tags), fingerprint(fields))
+
+    last = store.get_many(NAMESPACE, {key for key, _ in candidates.values()})
+    kept = []
+    updates = []
+    for i, point in enumerate(points):
+        if i in candidates:
+            key, fields = candidates[i]
+            previous = last.get(key)
+            if (
+                previous is not None
+                and previous["fields"] == fields
+                and now - previous["written"] < max_silence
+            ):
+                continue
+            updates.append((NAMESPACE, key, {"fields": fields, "written": now}))
+        kept.append(point)
+    return kept, updates
@@ -0,0 +1,46 @@
+# Copyright 2026 Canonical Ltd
+
+"""Locations for data collectors keep between runs.
+
+Under systemd the service's ``CacheDirectory=``/``StateDirectory=`` are used
+(exported as ``$CACHE_DIRECTORY``/``$STATE_DIRECTORY``); otherwise the XDG
+base directories of the invoking user.  ``$METRICS_CACHE_DIR`` and
+``$METRICS_STATE_DIR`` override both, e.g. to keep a test run hermetic.
+
+Cache data can be thrown away at any time; state data is what makes the next
+run behave correctly (watermarks, last written values, ...).
+"""
+
+import os
+
+APP_NAME = "ubuntu-release-metrics"
+
+
+def _base(override_var, systemd_var, xdg_var, xdg_default):
+    base = os.environ.get(override_var)
+    if not base and os.environ.get(systemd_var):
+        # systemd passes a colon-separated list if several are configured
+        base = os.environ[systemd_var].split(":")[0]
+    if not base:
+        xdg = os.environ.get(xdg_var) or os.path.expanduser(xdg_default)
+        base = os.path.join(xdg, APP_NAME)
+    return base
+
+
+def _ensure(path):
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_dir(*parts):
+    """Return the cache directory joined with *parts*, creating it."""
+    base = _base("METRICS_CACHE_DIR", "CACHE_DIRECTORY", "XDG_CACHE_HOME", "~/.cache")
+    return _ensure(os.path.join(base, *parts))
+
+
+def state_dir(*parts):
+    """Return the state directory joined with *parts*, creating it."""
+    base = _base(
+        "METRICS_STATE_DIR", "STATE_DIRECTORY", "XDG_STATE_HOME", "~/.local/state"
+    )
+    return _ensure(os.path.join(base, *parts))
@@ -0,0 +1,79 @@
+# Copyright 2026 Canonical Ltd
+
+"""Concurrent URL fetching on top of the shared HTTP client.
+
+Collectors often need a handful of independent documents (one per series,
+one per report, ...).  Fetching them one after another makes the run as slow
+as the sum of every round trip; :func:`fetch_all` downloads them together so
+the run is roughly as slow as the slowest single request.
+
+The requests themselves still go through the blocking, pooled
+:class:`~metrics.lib.httpclient.HTTPClient`; asyncio is only used to
+schedule them on a small thread pool with a bounded number in flight.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of requests in flight at once for a single fetch_all() call
+DEFAULT_CONCURRENCY = 8
+
+
+async def fetch_many(client, urls, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """Fetch *urls* concurrently with *client*, at most *concurrency* at once.
+
+    Returns a list in the same order as *urls*.  Each element is either the
+    ``requests.Response`` for that URL or the exception raised while
+    fetching it; HTTP error statuses are left for the caller to check with
+    ``raise_for_status()``.  Extra keyword arguments are passed to
+    ``client.get()``.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(
+        max_workers=min(concurrency, len(urls)), thread_name_prefix="fetch"
+    )
+
+    async def fetch_one(url):
+        async with semaphore:
+            # Carry the caller's deadline (see metrics.lib.deadline) over
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                executor, functools.partial(context.run, client.get, url, **kwargs)
+            )
+
+    try:
+        return await asyncio.gather(
+            *(fetch_one(url) for url in urls), return_exceptions=True
+        )
+    finally:
+        executor.shutdown(wait=False)
+
+
+def fetch_all(client, urls, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """Synchronous wrapper around :func:`fetch_many`.
+
+    Returns a dict mapping each URL to its response or exception, in the
+    order the URLs were given.
+    """
+    urls = list(urls)
+    results = asyncio.run(fetch_many(client, urls, concurrency, **kwargs))
+    return dict(zip(urls, results))
+
+
+def unwrap(result):
+    """Return the response from a :func:`fetch_all` result, or raise.
+
+    Re-raises the exception if fetching failed, and raises
+    ``requests.HTTPError`` for an HTTP error status.
+    """
+    if isinstance(result, BaseException):
+        raise result
+    result.raise_for_status()
+    return result
@@ -0,0 +1,238 @@
+# Copyright 2026 Canonical Ltd
+
+"""Recording and replaying the HTTP traffic of collector runs.
+
+In record mode, every response a collector gets, through ``self.http`` (a
+``requests`` session) or through launchpadlib (``httplib2``), is saved in a
+fixture bundle: a gzip-compressed JSON file.  In replay mode the responses
+are served from the bundle instead and nothing goes to the network, so a
+collector can be run, timed and profiled reproducibly offline.
+
+Both modes start from empty, temporary cache and state directories, so that
+recording sees complete responses rather than revalidations of whatever was
+cached locally, and replaying issues exactly the same requests.  They must
+therefore be entered before the collector is constructed; see
+``run_metric_main()``'s ``--record`` and ``--replay`` options.
+
+Only HTTP is covered: e.g. the rsync listing of ``images`` still runs.
+"""
+
+import base64
+import gzip
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import httplib2
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from metrics.lib import httpclient
+from metrics.lib.dirs import cache_dir
+from metrics.lib.httpcache import HTTPCache
+
+BUNDLE_VERSION = 1
+
+# Recorded bodies are decoded, so these no longer describe them
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class FixtureBundle:
+    """Recorded responses, looked up by client, method, URL and range.
+
+    A request made several times is answered with its recorded responses in
+    order, the last one being repeated.
+    """
+
+    def __init__(self, entries=None):
+        self._lock = threading.Lock()
+        self.entries = []
+        self._by_key = {}
+        self._served = {}
+        for entry in entries or []:
+            self._add(entry)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported fixture bundle version in {path}")
+        return cls(data["entries"])
+
+    def save(self, path):
+        with self._lock:
+            data = {"version": BUNDLE_VERSION, "entries": self.entries}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _key(client, method, url, byte_range):
+        return (client, method.upper(), url, byte_range)
+
+    def _add(self, entry):
+        key = self._key(entry["client"], entry["method"], entry["url"], entry["range"])
+        self.entries.append(entry)
+        self._by_key.setdefault(key, []).append(entry)
+
+    def record(self, client, method, url, byte_range, status, headers, body):
+        headers = {
+            k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS
+        }
+        with self._lock:
+            self._add(
+                {
+                    "client": client,
+                    "method": method.upper(),
+                    "url": url,
+                    "range": byte_range,
+                    "status": status,
+                    "headers": headers,
+                    "body": base64.b64encode(body or b"").decode("ascii"),
+                }
+            )
+
+    def lookup(self, client, method, url, byte_range=None):
+        """Return ``(status, headers, body)`` recorded for the request, or
+        None."""
+        key = self._key(client, method, url, byte_range)
+        with self._lock:
+            entries = self._by_key.get(key)
+            if not entries:
+                return None
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            entry = entries[min(served, len(entries) - 1)]
+        return entry["status"], entry["headers"], base64.b64decode(entry["body"])
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter saving every response it gets into a bundle."""
+
+    def __init__(self, bundle, **kwargs):
+        super().__init__(**kwargs)
+        self.bundle = bundle
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.bundle.record(
+            "requests",
+            request.method,
+            request.url,
+            request.headers.get("Range"),
+            response.status_code,
+            dict(response.headers),
+            response.content,
+        )
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter answering requests from a bundle."""
+
+    def __init__(self, bundle):
+        super().__init__()
+        self.bundle = bundle
+
+    def send(self, request, **kwargs):
+        found = self.bundle.lookup(
+            "requests", request.method, request.url, request.headers.get("Range")
+        )
+        if found is None:
+            raise requests.exceptions.ConnectionError(
+                f"No recorded response for {request.method} {request.url}",
+                request=request,
+            )
+        status, headers, body = found
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def _recording_httplib2(original, bundle):
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        response, content = original(self, uri, method, body, headers, *args, **kwargs)
+        bundle.record("httplib2", method, uri, None, response.status, response, content)
+        return response, content
+
+    return request
+
+
+def _replaying_httplib2(bundle):
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        found = bundle.lookup("httplib2", method, uri)
+        if found is None:
+            raise httplib2.ServerNotFoundError(
+                f"No recorded response for {method} {uri}"
+            )
+        status, headers, content = found
+        return httplib2.Response({**headers, "status": str(status)}), content
+
+    return request
+
+
+@contextmanager
+def _environ(**values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def http_fixtures(mode, path):
+    """Record (*mode* ``"record"``) or replay (``"replay"``) the HTTP
+    traffic of the enclosed block into or from the bundle at *path*."""
+    if mode not in ("record", "replay"):
+        raise ValueError(f"Unknown fixtures mode '{mode}'")
+    bundle = FixtureBundle.load(path) if mode == "replay" else FixtureBundle()
+
+    with tempfile.TemporaryDirectory(prefix="metrics-fixtures-") as tmp, _environ(
+        METRICS_CACHE_DIR=os.path.join(tmp, "cache"),
+        METRICS_STATE_DIR=os.path.join(tmp, "state"),
+    ):
+        client = httpclient.HTTPClient(cache=HTTPCache(cache_dir("http")))
+        if mode == "record":
+            adapter = RecordingAdapter(
+                bundle,
+                pool_connections=httpclient.POOL_CONNECTIONS,
+                pool_maxsize=httpclient.POOL_MAXSIZE,
+            )
+            patched = _recording_httplib2(httplib2.Http.request, bundle)
+        else:
+            adapter = ReplayAdapter(bundle)
+            patched = _replaying_httplib2(bundle)
+        client.session.mount("http://", adapter)
+        client.session.mount("https://", adapter)
+
+        previous = httpclient.set_client(client)
+        original = httplib2.Http.request
+        httplib2.Http.request = patched
+        try:
+            yield bundle
+        finally:
+            httplib2.Http.request = original
+            httpclient.set_client(previous)
+            client.close()
+            if mode == "record":
+                bundle.save(path)
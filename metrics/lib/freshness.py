@@ -0,0 +1,96 @@
+# Copyright 2026 Canonical Ltd
+
+"""Skipping reports that were not regenerated since they were last read.
+
+Many reports state when they were generated (``# Generated: ...`` at the end
+of the proposed-migration reports, ``Generated: ...`` at the top of
+``priority-mismatches.txt`` and ``update_excuses.html``, ...) but are only
+regenerated every so often, while collectors run every few minutes.
+:class:`FreshnessGate` reads that stamp from just the first or last bytes of
+the report with a ``Range`` request and compares it with the one stored for
+the report the last time it was handled: if it did not move, the caller can
+skip downloading, parsing and writing the report altogether.
+
+Like :mod:`~metrics.lib.tail`, probing does not update the stored stamp:
+:meth:`Stamp.update` returns the ``(namespace, key, value)`` item to store
+once the report's points have been written (see ``Metric.stage_state()``).
+"""
+
+import logging
+import time
+
+NAMESPACE = "freshness"
+
+# Bytes read to find the stamp, unless the caller says otherwise
+DEFAULT_PROBE_BYTES = 4096
+
+log = logging.getLogger(__name__)
+
+
+class Stamp:
+    """The generation stamp of a report.
+
+    *document* is the full ``requests.Response`` of the report if the probe
+    got all of it anyway (the server ignored the range), else None.
+    """
+
+    def __init__(self, url, value, previous, document=None):
+        self.url = url
+        self.value = value
+        self.previous = previous
+        self.document = document
+
+    @property
+    def unchanged(self):
+        """Whether the report was handled before with the same stamp."""
+        return self.value is not None and self.value == self.previous
+
+    def update(self):
+        """Return the state item recording that this stamp was handled."""
+        return (NAMESPACE, self.url, {"stamp": self.value, "handled": time.time()})
+
+
+class FreshnessGate:
+    """Probe the generation stamps of reports.
+
+    *store* is a :class:`~metrics.lib.kvstore.KVStore`; without one every
+    report is new.
+    """
+
+    def __init__(self, http, store=None):
+        self.http = http
+        self.store = store
+
+    def probe(self, url, pattern, head=None, tail=None):
+        """Return the :class:`Stamp` of *url*: the first group of the regular
+        expression *pattern* in its first *head* or last *tail* bytes
+        (``DEFAULT_PROBE_BYTES`` of its head if neither is given).
+
+        The stamp's value is None if *pattern* was not found.  Network
+        errors are raised as usual.
+        """
+        if tail:
+            byte_range = f"bytes=-{tail}"
+        else:
+            head = head or DEFAULT_PROBE_BYTES
+            byte_range = f"bytes=0-{head - 1}"
+        response = self.http.get(
+            url, headers={"Range": byte_range, "Accept-Encoding": "identity"}
+        )
+        response.raise_for_status()
+
+        body = response.content
+        document = None
+        if response.status_code == 200:
+            # The server ignored the range
+            document = response
+            body = body[-tail:] if tail else body[:head]
+        m = pattern.search(body.decode("utf-8", errors="replace"))
+        value = m.group(1).strip() if m else None
+        if value is None:
+            log.debug("No generation stamp found in %s %s", byte_range, url)
+
+        previous = None
+        if self.store is not None:
+            previous = (self.store.get(NAMESPACE, url) or {}).get("stamp")
+        return Stamp(url, value, previous, document)
@@ -0,0 +1,162 @@
+# Copyright 2026 Canonical Ltd
+
+"""Persistent conditional-GET cache for the shared HTTP client.
+
+Most documents collectors download change far less often than collectors
+run.  The cache keeps the last ``200 OK`` body for each URL on disk along
+with its ``ETag``/``Last-Modified`` validators, so the next request can be
+made conditional and a ``304 Not Modified`` answered from disk.
+
+Each URL is stored as a single file (a JSON metadata line followed by the
+raw body) written atomically, so concurrent collector processes never see a
+torn entry.  The file's mtime is bumped on every hit and the least recently
+used entries are evicted once the cache grows beyond its size limit.  The
+directory is only scanned for that when the cache is first written to, and
+again when a running count of the bytes stored passes the limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+
+# Eviction frees room down to this fraction of the size limit, so that the
+# next ones are not needed for a while
+EVICT_TO = 0.9
+
+# Response headers kept alongside the body
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Date")
+
+log = logging.getLogger(__name__)
+
+
+class HTTPCache:
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        # Estimated size of the cache in bytes, None until scanned
+        self._size = None
+        self._size_lock = threading.Lock()
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def _read(self, url, with_body=True):
+        try:
+            with open(self._path(url), "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read() if with_body else None
+        except (OSError, ValueError):
+            return None, None
+        if meta.get("url") != url:
+            return None, None
+        return meta, body
+
+    def validators(self, url):
+        """Return the conditional request headers for a cached *url*."""
+        meta, _ = self._read(url, with_body=False)
+        if meta is None:
+            return {}
+        headers = {}
+        if meta["headers"].get("ETag"):
+            headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+        return headers
+
+    def load(self, url):
+        """Return the cached response for *url*, or None if there is none."""
+        meta, body = self._read(url)
+        if meta is None:
+            return None
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response._content = body
+        # There is no raw stream: iter_content() must use _content
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+    def store(self, url, response):
+        """Save a ``200 OK`` *response* for *url* if it carries validators."""
+        if response.status_code != 200:
+            return
+        headers = {
+            h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers
+        }
+        if "ETag" not in headers and "Last-Modified" not in headers:
+            return
+
+        meta = {"url": url, "headers": headers, "encoding": response.encoding}
+        path = self._path(url)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                f.write(response.content)
+                written = f.tell()
+            os.replace(tmp, path)
+        except OSError as exc:
+            log.warning("Failed to cache %s: %s", url, exc)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        with self._size_lock:
+            if self._size is not None:
+                self._size += written - replaced
+                if self._size <= self.max_size:
+                    return
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries if the cache is over its limit,
+        until it fits in EVICT_TO of it."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        entries.sort()
+        target = self.max_size * EVICT_TO if total > self.max_size else total
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+        with self._size_lock:
+            self._size = total
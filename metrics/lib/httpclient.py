@@ -0,0 +1,256 @@
+# Copyright 2026 Canonical Ltd
+
+"""Shared HTTP client for collectors.
+
+Collectors talk to a handful of hosts (ubuntu-archive-team.ubuntu.com,
+autopkgtest.ubuntu.com, reports.qa.ubuntu.com, ...) many times per run.  A
+single ``requests.Session`` with a per-host connection pool lets those
+requests reuse kept-alive TCP/TLS connections instead of handshaking for
+every fetch.
+
+Plain GETs are additionally answered from a persistent
+:class:`~metrics.lib.httpcache.HTTPCache` when the server says the document
+has not changed since the last run.
+"""
+
+import copy
+import logging
+import time
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from metrics.lib import deadline
+from metrics.lib.dirs import cache_dir
+from metrics.lib.httpcache import HTTPCache
+from metrics.lib.kvstore import get_store
+from metrics.lib.resilience import IDEMPOTENT_METHODS, CircuitBreaker, RetryPolicy
+from metrics.lib.scheduler import RequestScheduler
+
+# (connect, read) timeout in seconds applied when the caller passes none
+DEFAULT_TIMEOUT = (10, 60)
+
+# Number of distinct hosts to keep pools for, and connections kept per host
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 8
+
+USER_AGENT = "ubuntu-release-metrics"
+
+
+class HTTPClient:
+    """Thin wrapper around a pooled ``requests.Session``.
+
+    Every request gets a default timeout and advertises gzip support.
+    Responses are returned as ``requests.Response`` objects, so callers keep
+    using ``raise_for_status()``, ``.text`` and ``.json()`` as before.
+
+    If *cache* is given, GETs without a ``Range`` header are made conditional
+    on the cached copy; pass ``cache=False`` to ``get()`` to bypass it.
+
+    If *stats* (a :class:`~metrics.lib.selfstats.CollectorStats`) is set,
+    every request is accounted in it; see :meth:`with_stats`.
+
+    Timeouts are clipped to the current :mod:`~metrics.lib.deadline`, and
+    requests past it raise ``DeadlineExceeded`` instead of being sent.
+
+    With a *retry* policy, idempotent requests failing transiently are sent
+    again; with a *breaker*, requests to hosts that keep failing raise
+    ``CircuitOpenError`` at once (see :mod:`~metrics.lib.resilience`).  With
+    a *scheduler*, requests wait for their host's concurrency and rate limits
+    (see :mod:`~metrics.lib.scheduler`), queued fairly between the clients
+    returned by :meth:`with_stats`.
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        cache=None,
+        retry=None,
+        breaker=None,
+        scheduler=None,
+    ):
+        self.timeout = timeout
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self.scheduler = scheduler
+        self.stats = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
+        )
+
+    def with_stats(self, stats):
+        """Return a client sharing this one's connections and cache that
+        records its requests in *stats*."""
+        client = copy.copy(self)
+        client.stats = stats
+        return client
+
+    def request(self, method, url, **kwargs):
+        host = urlsplit(url).netloc
+        if self.breaker is not None:
+            try:
+                self.breaker.check(host)
+            except requests.exceptions.ConnectionError:
+                if self.stats is not None:
+                    self.stats.record_rejected(host)
+                raise
+
+        attempts = 1
+        if self.retry is not None and method.upper() in IDEMPOTENT_METHODS:
+            attempts = self.retry.attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                response = self._send(method, url, **kwargs)
+            except deadline.DeadlineExceeded:
+                raise
+            except requests.exceptions.RequestException as e:
+                transient = RetryPolicy.is_transient(error=e)
+                if attempt < attempts and transient and self._back_off(attempt):
+                    continue
+                if self.breaker is not None and transient:
+                    self.breaker.record_failure(host)
+                raise
+            if (
+                attempt < attempts
+                and RetryPolicy.is_transient(response)
+                and self._back_off(attempt)
+            ):
+                response.close()
+                continue
+            break
+
+        if self.breaker is not None:
+            if response.status_code >= 500:
+                self.breaker.record_failure(host)
+            else:
+                self.breaker.record_success(host)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        current = deadline.current()
+        if self.scheduler is None:
+            slot = nullcontext()
+        else:
+            # Each collector's stats identify its requests in the queue
+            slot = self.scheduler.slot(urlsplit(url).netloc, self.stats, self.stats)
+        with slot:
+            if current is not None:
+                kwargs["timeout"] = current.clip(kwargs["timeout"])
+            start = time.monotonic()
+            response = self._send_now(method, url, current, **kwargs)
+        if self.stats is not None:
+            self.stats.record_request(response, time.monotonic() - start)
+        return response
+
+    def _send_now(self, method, url, current, **kwargs):
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            if current is not None:
+                # Cut short by the deadline rather than by the server?
+                current.check()
+            raise
+
+    def _back_off(self, attempt):
+        """Wait before retrying after *attempt*; return False instead if the
+        current deadline would pass in the meantime."""
+        delay = self.retry.delay(attempt)
+        current = deadline.current()
+        if current is not None and current.remaining() <= delay:
+            return False
+        if self.stats is not None:
+            self.stats.record_retry()
+        time.sleep(delay)
+        return True
+
+    def get(self, url, cache=True, **kwargs):
+        headers = kwargs.get("headers") or {}
+        if not (
+            cache
+            and self.cache is not None
+            # Partial responses must not be stored as, or answered from, the
+            # whole document
+            and "Range" not in CaseInsensitiveDict(headers)
+            and not kwargs.get("stream")
+        ):
+            return self.request("GET", url, **kwargs)
+
+        if kwargs.get("params"):
+            url = (
+                requests.Request("GET", url, params=kwargs.pop("params")).prepare().url
+            )
+        kwargs["headers"] = {**self.cache.validators(url), **headers}
+        response = self.request("GET", url, **kwargs)
+        if response.status_code == 304:
+            cached = self.cache.load(url)
+            if cached is not None:
+                if self.stats is not None:
+                    self.stats.record_cache_hit()
+                return cached
+            # Evicted under our feet; fetch it again unconditionally
+            kwargs["headers"] = headers
+            response = self.request("GET", url, **kwargs)
+        self.cache.store(url, response)
+        return response
+
+    def get_json(self, url, **kwargs):
+        """GET *url*, raising on HTTP errors, and return the decoded JSON."""
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_text(self, url, **kwargs):
+        """GET *url*, raising on HTTP errors, and return the body as text."""
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide ``HTTPClient``, creating it on first use."""
+    global _client
+    if _client is None:
+        try:
+            cache = HTTPCache(cache_dir("http"))
+        except OSError as exc:
+            logging.getLogger(__name__).warning("HTTP cache disabled: %s", exc)
+            cache = None
+        try:
+            scheduler = RequestScheduler.from_env()
+        except ValueError as exc:
+            logging.getLogger(__name__).warning(
+                "Invalid $METRICS_HOST_LIMITS, using the defaults: %s", exc
+            )
+            scheduler = RequestScheduler()
+        _client = HTTPClient(
+            cache=cache,
+            retry=RetryPolicy(),
+            breaker=CircuitBreaker(get_store()),
+            scheduler=scheduler,
+        )
+    return _client
+
+
+def set_client(client):
+    """Make *client* the process-wide ``HTTPClient``; return the previous
+    one (possibly None)."""
+    global _client
+    previous, _client = _client, client
+    return previous
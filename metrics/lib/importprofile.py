@@ -0,0 +1,86 @@
+# Copyright 2026 Canonical Ltd
+
+"""Reporting of the slowest imports of a collector.
+
+Collectors run as fresh interpreters, so whatever their modules import at
+load time is paid on every run.  :func:`profile_imports` imports a module in
+a clean interpreter under ``python -X importtime`` and returns the per-module
+timings, which ``--import-profile`` prints (see ``run_metric_main()``).
+"""
+
+import re
+import subprocess
+import sys
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+class ImportTime:
+    """The import time of one module, in microseconds.
+
+    *self_us* excludes the modules it imported itself, *cumulative_us*
+    includes them.  *depth* is its nesting level, 0 for a top-level import.
+    """
+
+    def __init__(self, module, self_us, cumulative_us, depth):
+        self.module = module
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+
+    def __repr__(self):
+        return (
+            f"ImportTime({self.module!r}, {self.self_us}, {self.cumulative_us}, "
+            f"{self.depth})"
+        )
+
+
+def parse_importtime(output):
+    """Parse the ``-X importtime`` report in *output* into ImportTimes."""
+    timings = []
+    for line in output.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, module = m.groups()
+            # Nested imports are indented by two more spaces per level
+            depth = (len(indent) - 1) // 2
+            timings.append(ImportTime(module, int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def profile_imports(module):
+    """Import *module* in a new interpreter and return its ImportTimes."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    timings = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        errors = [
+            line for line in result.stderr.splitlines() if "import time:" not in line
+        ]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors))
+    return timings
+
+
+def format_report(module, timings, top=20):
+    """Return the *top* slowest imports of *module*, by cumulative and by
+    self time, as text."""
+    total = next((t for t in timings if t.module == module), None)
+    lines = []
+    if total is not None:
+        lines.append(f"Importing {module} took {total.cumulative_us / 1000:.1f}ms")
+    for title, key in (
+        ("cumulative", lambda t: t.cumulative_us),
+        ("self", lambda t: t.self_us),
+    ):
+        lines.append(f"\nSlowest imports by {title} time:")
+        for t in sorted(timings, key=key, reverse=True)[:top]:
+            lines.append(
+                f"  {t.cumulative_us / 1000:8.1f}ms {t.self_us / 1000:8.1f}ms  "
+                f"{'  ' * t.depth}{t.module}"
+            )
+    return "\n".join(lines)
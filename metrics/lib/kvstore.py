@@ -0,0 +1,134 @@
+# Copyright 2026 Canonical Ltd
+
+"""Small persistent key/value store for state kept between collector runs.
+
+Values are JSON-encoded and live in a SQLite database in the state
+directory, grouped in namespaces (one per feature, e.g. ``dedup``).  SQLite
+takes care of locking, so several collector processes can share the store.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from metrics.lib.dirs import state_dir
+
+STORE_FILE = "state.sqlite3"
+
+# How long to wait for another process holding the database lock
+BUSY_TIMEOUT = 30
+
+log = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class KVStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def get_many(self, namespace, keys):
+        """Return ``{key: value}`` for those of *keys* that are stored."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's limit on the number of parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]  # noqa: E203
+                rows = self._db.execute(
+                    "SELECT key, value FROM kv WHERE namespace = ? AND key IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    (namespace, *chunk),
+                )
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put(self, namespace, key, value):
+        self.put_many([(namespace, key, value)])
+
+    def put_many(self, items):
+        """Store ``(namespace, key, value)`` *items* in a single transaction."""
+        rows = [(ns, key, json.dumps(value)) for ns, key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value)"
+                    " VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    def update(self, namespace, key, function):
+        """Replace the value of *key* with ``function(value)`` (None if there
+        is none; returning None deletes it) and return the new value.
+
+        This happens in a single transaction, so that concurrent updates
+        from other threads or processes are not lost.
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                value = function(None if row is None else json.loads(row[0]))
+                if value is None:
+                    self._db.execute(
+                        "DELETE FROM kv WHERE namespace = ? AND key = ?",
+                        (namespace, key),
+                    )
+                else:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO kv (namespace, key, value)"
+                        " VALUES (?, ?, ?)",
+                        (namespace, key, json.dumps(value)),
+                    )
+        return value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def get_store():
+    """Return the process-wide KVStore, or None if it cannot be opened."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = KVStore(os.path.join(state_dir(), STORE_FILE))
+            except (OSError, sqlite3.Error) as e:
+                log.warning(f"State store unavailable: {e}")
+        return _store
@@ -0,0 +1,218 @@
+# Copyright 2026 Canonical Ltd
+
+"""Shared anonymous Launchpad sessions.
+
+Logging in to Launchpad downloads the service root and its WADL description,
+which launchpadlib keeps in an HTTP cache under ``launchpadlib_dir``.
+Collectors used to pass a fresh ``tempfile.mkdtemp()`` there, so every run
+started cold and left a directory behind.  :func:`login` instead uses a
+persistent, size-bounded cache directory and reuses the session for the
+lifetime of the thread; once the thread ends, its session goes to the next
+thread logging in, so that the getter threads of later runs (e.g. in
+``metrics.daemon``) do not log in again.
+
+launchpadlib (and httplib2 underneath) is not thread-safe, and neither the
+session nor the objects loaded through it may be used from another thread.
+Getters run in a thread pool: collectors therefore only keep plain data
+(names, links) from what they load in ``__init__``, and getters needing
+launchpadlib objects call :func:`login` themselves, e.g. to
+``login().load()`` a link.
+
+Collectors that only need the size of a collection should not materialise
+it through launchpadlib, which pages through every entry.  :func:`count_all`
+instead asks the REST API for ``ws.show=total_size`` directly, for many
+collections concurrently.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from urllib.parse import urlencode
+
+from metrics.lib import deadline
+from metrics.lib.dirs import cache_dir
+from metrics.lib.fetch import DEFAULT_CONCURRENCY, fetch_all, unwrap
+
+CONSUMER_NAME = "metrics"
+SERVICE_ROOT = "production"
+API_VERSION = "devel"
+API_ROOT = f"https://api.launchpad.net/{API_VERSION}/"
+
+# Socket timeout of launchpadlib's requests, which do not go through
+# HTTPClient and so are not bound by the collectors' deadlines
+LOGIN_TIMEOUT = 60
+
+DEFAULT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# Leftover mkdtemp() directories younger than this may still be in use
+STALE_TEMP_DIR_AGE = 24 * 60 * 60
+
+log = logging.getLogger(__name__)
+
+# One session per thread, see above; they all share the on-disk cache
+_local = threading.local()
+# Sessions of the threads that ended, for the next ones
+_idle = []
+_cleanup_lock = threading.Lock()
+_cleaned_up = False
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline has passed.
+
+    launchpadlib's requests are not bound by it (see LOGIN_TIMEOUT): getters
+    looping over them call this, so that they end once out of time.
+    """
+    current = deadline.current()
+    if current is not None:
+        current.check()
+
+
+def login():
+    """Return this thread's anonymous Launchpad session, that of a thread
+    that ended, or a new one."""
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        try:
+            lp = _idle.pop()
+        except IndexError:
+            lp = _login()
+        holder = _SessionHolder(lp)
+        # Thread-local data is dropped when the thread ends
+        weakref.finalize(holder, _idle.append, lp)
+        _local.holder = holder
+    return holder.lp
+
+
+class _SessionHolder:
+    def __init__(self, lp):
+        self.lp = lp
+
+
+def _login():
+    # launchpadlib is slow to import and collectors using only count_all()
+    # never need it
+    from launchpadlib.launchpad import Launchpad
+
+    directory = cache_dir("launchpadlib")
+    _cleanup_once(directory)
+    return Launchpad.login_anonymously(
+        CONSUMER_NAME,
+        SERVICE_ROOT,
+        launchpadlib_dir=directory,
+        timeout=LOGIN_TIMEOUT,
+        version=API_VERSION,
+    )
+
+
+def _cleanup_once(directory):
+    global _cleaned_up
+    with _cleanup_lock:
+        if _cleaned_up:
+            return
+        _cleaned_up = True
+    prune_cache(directory)
+    remove_stale_temp_dirs()
+
+
+def prune_cache(directory, max_size=DEFAULT_CACHE_MAX_SIZE):
+    """Delete the least recently modified cache files beyond *max_size*."""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def remove_stale_temp_dirs():
+    """Remove launchpadlib directories left in $TMPDIR by older collectors.
+
+    Only directories that look like ``tempfile.mkdtemp()`` output, belong to
+    us, contain nothing but launchpadlib's per-host cache and have not been
+    touched for a day are removed.
+    """
+    tmp = tempfile.gettempdir()
+    cutoff = time.time() - STALE_TEMP_DIR_AGE
+    try:
+        entries = list(os.scandir(tmp))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.startswith("tmp"):
+            continue
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if st.st_uid != os.getuid() or st.st_mtime > cutoff:
+                continue
+            if os.listdir(entry.path) != ["api.launchpad.net"]:
+                continue
+        except OSError:
+            continue
+        log.debug("Removing stale launchpadlib directory %s", entry.path)
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def api_url(path):
+    """Return the API URL of *path*, e.g. ``~motu/members``."""
+    return API_ROOT + path.lstrip("/")
+
+
+def count_url(url, **params):
+    """Return the URL asking for the size of the collection at *url*.
+
+    *params* are added to the query string, e.g. ``ws.op`` and the arguments
+    of a named operation returning a collection.
+    """
+    return url + "?" + urlencode({**params, "ws.show": "total_size"})
+
+
+def _total_size(http, response):
+    data = response.json()
+    if isinstance(data, int):
+        return data
+    # Not every collection honours ws.show; fall back to the batch metadata
+    if "total_size" in data:
+        return data["total_size"]
+    if "total_size_link" in data:
+        return http.get_json(data["total_size_link"])
+    raise ValueError(f"No collection size in response from {response.url}")
+
+
+def count_all(http, queries, concurrency=DEFAULT_CONCURRENCY):
+    """Count several Launchpad collections concurrently.
+
+    *queries* maps arbitrary keys to ``(url, params)`` pairs as taken by
+    :func:`count_url`.  Returns a dict mapping each key to the size of its
+    collection, or to the exception raised while counting it.
+    """
+    urls = {key: count_url(url, **params) for key, (url, params) in queries.items()}
+    responses = fetch_all(
+        http, urls.values(), concurrency, headers={"Accept": "application/json"}
+    )
+    counts = {}
+    for key, url in urls.items():
+        try:
+            counts[key] = _total_size(http, unwrap(responses[url]))
+        except Exception as e:
+            counts[key] = e
+    return counts
@@ -9,8 +9,7 @@ against Git repos must be discovered by scraping the web UI instead.
 
 import re
 
-import bs4
-import requests
+from metrics.lib.httpclient import get_client
 
 _MATCH_MP_HREF = re.compile(r"^/.*/\+merge/\d+$")
 
@@ -21,18 +20,28 @@ _MATCH_CAN_DO = re.compile(r"^(Requested reviews)|(Reviews) .* can do$")
 LAUNCHPAD_CODE_BASE = "https://code.launchpad.net"
 
 
-def count_team_reviews(team_name):
+def count_team_reviews(team_name, http=None):
     """Return the number of open MPs where *team_name* is a requested reviewer.
 
     Fetches ``https://code.launchpad.net/~<team_name>/+activereviews`` and counts
     the merge-proposal links that appear under "Requested reviews" or
-    "Reviews … can do" section headings.
+    "Reviews … can do" section headings.  *http* is the ``HTTPClient`` to fetch
+    with; the process-wide shared client is used by default.
     """
+    if http is None:
+        http = get_client()
     url = f"{LAUNCHPAD_CODE_BASE}/~{team_name}/+activereviews"
-    response = requests.get(url, timeout=60)
+    response = http.get(url)
     response.raise_for_status()
+    return count_reviews_in_page(response.text)
 
-    soup = bs4.BeautifulSoup(response.text, features="lxml")
+
+def count_reviews_in_page(html):
+    """Return the number of MPs to review listed in an ``+activereviews``
+    page."""
+    import bs4
+
+    soup = bs4.BeautifulSoup(html, features="lxml")
 
     count = 0
     in_can_do_section = False
@@ -0,0 +1,277 @@
+# Copyright 2026 Canonical Ltd
+
+"""Compact data points and a direct InfluxDB line-protocol encoder.
+
+Collectors historically build every point as a nested dict, which the
+influxdb client then walks again to serialise.  :class:`Point` keeps the
+same four parts in a ``__slots__`` object, and :func:`encode` turns Points
+(or the legacy dicts) straight into line protocol, caching the escaped form
+of the measurement names, tag keys, tag values and field keys that repeat on
+every point.
+
+The output is the same as ``influxdb.line_protocol.make_line()``'s for the
+value types collectors use.
+"""
+
+import sys
+from datetime import datetime, timezone
+
+# Timestamp divisor from nanoseconds for each InfluxDB time precision
+_PRECISIONS = {
+    "n": 1,
+    "u": 10**3,
+    "ms": 10**6,
+    "s": 10**9,
+    "m": 60 * 10**9,
+    "h": 3600 * 10**9,
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Bound the escape cache so an unexpectedly high-cardinality tag cannot grow
+# it forever; past this, strings are escaped without being cached
+_CACHE_MAX = 100_000
+_escaped = {}
+
+
+class Point:
+    """One data point: a measurement, its tags and fields, and a time.
+
+    *time* may be a ``datetime`` (naive means UTC), an integer timestamp
+    already in the write precision, or None to be stamped when written.
+    """
+
+    __slots__ = ("measurement", "tags", "fields", "time")
+
+    def __init__(self, measurement, fields, tags=None, time=None):
+        self.measurement = sys.intern(measurement)
+        self.fields = fields
+        self.tags = tags if tags is not None else {}
+        self.time = time
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["measurement"],
+            data.get("fields") or {},
+            data.get("tags"),
+            data.get("time"),
+        )
+
+    def as_dict(self):
+        """Return the point in the dict form ``write_points()`` accepts."""
+        data = {"measurement": self.measurement, "fields": self.fields}
+        if self.tags:
+            data["tags"] = self.tags
+        if self.time is not None:
+            data["time"] = self.time
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
+        return (
+            self.measurement == other.measurement
+            and self.tags == other.tags
+            and self.fields == other.fields
+            and self.time == other.time
+        )
+
+    def __repr__(self):
+        return (
+            f"Point({self.measurement!r}, {self.fields!r}, "
+            f"tags={self.tags!r}, time={self.time!r})"
+        )
+
+
+def point_parts(point):
+    """Return ``(measurement, tags, fields, time)`` of a Point or point dict."""
+    if type(point) is Point:
+        return point.measurement, point.tags, point.fields, point.time
+    return (
+        point["measurement"],
+        point.get("tags") or {},
+        point.get("fields") or {},
+        point.get("time"),
+    )
+
+
+def _escape(value):
+    """Escape a measurement, tag key/value or field key, with caching."""
+    if type(value) is not str:
+        value = "" if value is None else str(value)
+    try:
+        return _escaped[value]
+    except KeyError:
+        pass
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace(" ", "\\ ")
+        .replace(",", "\\,")
+        .replace("=", "\\=")
+        .replace("\n", "\\n")
+    )
+    if len(_escaped) < _CACHE_MAX:
+        _escaped[sys.intern(value)] = sys.intern(escaped)
+    return escaped
+
+
+def _field_value(value):
+    kind = type(value)
+    if kind is float:
+        return repr(value)
+    if kind is int:
+        return f"{value}i"
+    if kind is str:
+        return (
+            '"'
+            + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            + '"'
+        )
+    if kind is bool:
+        return str(value)
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        return f"{int(value)}i"
+    return repr(float(value))
+
+
+def _timestamp(value, divisor):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    ns = (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000
+    return ns // divisor
+
+
+def encode_line(measurement, tags, fields, time=None, precision="ms"):
+    """Return one point as a line of line protocol, or None if it has no
+    fields to write."""
+    field_list = []
+    for key in sorted(fields):
+        value = _field_value(fields[key])
+        if value != "":
+            field_list.append(_escape(key) + "=" + value)
+    if not field_list:
+        return None
+
+    line = _escape(measurement)
+    if tags:
+        for key in sorted(tags):
+            value = _escape(tags[key])
+            if value != "":
+                line += "," + _escape(key) + "=" + value
+    line += " " + ",".join(field_list)
+    if time is not None:
+        line += " " + str(_timestamp(time, _PRECISIONS[precision]))
+    return line
+
+
+def encode(points, precision="ms", default_time=None):
+    """Encode an iterable of Points or point dicts as line protocol.
+
+    Points without a time get *default_time*, if given.  Returns the list of
+    lines; points without any field are dropped, as InfluxDB would reject
+    them.
+    """
+    lines = []
+    append = lines.append
+    for point in points:
+        if type(point) is Point:
+            measurement, tags, fields, time = (
+                point.measurement,
+                point.tags,
+                point.fields,
+                point.time,
+            )
+        else:
+            measurement = point["measurement"]
+            tags = point.get("tags")
+            fields = point.get("fields") or {}
+            time = point.get("time")
+        if time is None:
+            time = default_time
+        line = encode_line(measurement, tags, fields, time, precision)
+        if line is not None:
+            append(line)
+    return lines
+
+
+def _split(text, sep, maxsplit=-1, quotes=False):
+    """Split *text* on the occurrences of *sep* that are not escaped, nor in
+    a quoted field value if *quotes*."""
+    parts = []
+    start = 0
+    quoted = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if quotes and c == '"' and (quoted or text[i - 1 : i] == "="):
+            quoted = not quoted
+        elif c == sep and not quoted and len(parts) != maxsplit:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            i += 1
+            c = "\n" if text[i] == "n" else text[i]
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _parse_field_value(text):
+    if text.startswith('"'):
+        return _unescape(text[1:-1])
+    if text.endswith("i"):
+        return int(text[:-1])
+    if text in ("True", "true", "t", "T"):
+        return True
+    if text in ("False", "false", "f", "F"):
+        return False
+    return float(text)
+
+
+def decode_line(line):
+    """Parse a line of line protocol, as made by :func:`encode_line`, into
+    ``(measurement, tags, fields, time)``.
+
+    *time* is the integer timestamp of the line, or None.  Raises
+    ``ValueError`` on malformed lines.
+    """
+    key, rest = _split(line, " ", maxsplit=1)
+    parts = _split(rest, " ", maxsplit=1, quotes=True)
+    fields_text = parts[0]
+    time = int(parts[1]) if len(parts) > 1 else None
+
+    measurement, *tag_items = _split(key, ",")
+    tags = {}
+    for item in tag_items:
+        tag, value = _split(item, "=", maxsplit=1)
+        tags[_unescape(tag)] = _unescape(value)
+    fields = {}
+    for item in _split(fields_text, ",", quotes=True):
+        field, value = _split(item, "=", maxsplit=1)
+        fields[_unescape(field)] = _parse_field_value(value)
+    if not fields:
+        raise ValueError(f"No fields in line {line!r}")
+    return _unescape(measurement), tags, fields, time
@@ -0,0 +1,214 @@
+# Copyright 2026 Canonical Ltd
+
+"""Profiling of a collector run, for ``--profile`` (see
+``run_metric_main()``).
+
+:func:`profiled` runs a block under two profilers at once:
+
+- cProfile, in every thread the block starts (getters run in a thread
+  pool), merged into a ``.pstats`` file for ``python3 -m pstats``,
+  snakeviz and the like;
+- a :class:`Sampler` thread, which records the stack of every other thread
+  every few milliseconds and whether that thread was on the CPU meanwhile
+  (from its CPU clock).  Time off the CPU is network wait if the thread was
+  in the socket or ssl modules, other wait (locks, sleeps, idle workers)
+  otherwise.  The stacks are written in the collapsed format of
+  ``flamegraph.pl`` and speedscope, and summarised as the functions with the
+  most CPU and network time under them.
+
+cProfile's overhead inflates CPU time somewhat; compare functions with each
+other rather than with the wall clock.
+"""
+
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Modules whose frames, at the top of a thread's stack, mean the thread is
+# waiting on the network (C calls like recv() have no frame of their own)
+NETWORK_MODULES = {"socket", "ssl", "selectors"}
+
+# Modules starting threads and running their work, under every function of
+# interest: left out of the report
+PLUMBING_MODULES = {"threading", "concurrent.futures.thread"}
+
+CPU, NETWORK, WAIT = range(3)
+_SUFFIXES = {CPU: "", NETWORK: ";[network]", WAIT: ";[wait]"}
+
+
+def _thread_cpu_time(ident):
+    """Return the CPU time of thread *ident*, or None if unavailable."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def _label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler(threading.Thread):
+    """Sample the stacks of all other threads every *interval* seconds.
+
+    ``stacks`` maps each stack seen, as a tuple of frame labels from the
+    thread's name down to the innermost frame, to its ``[cpu, network,
+    wait]`` seconds.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stopping = threading.Event()
+        # thread ident -> (wall clock, CPU time) at its last sample
+        self._last = {}
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+    def sample(self):
+        now = time.perf_counter()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            cpu = _thread_cpu_time(ident)
+            last = self._last.get(ident)
+            self._last[ident] = (now, cpu)
+            if last is None:
+                continue
+            wall = now - last[0]
+            innermost = frame.f_globals.get("__name__")
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+
+            if cpu is None or last[1] is None:
+                on_cpu = 0.0 if innermost in NETWORK_MODULES else wall
+            else:
+                on_cpu = min(max(cpu - last[1], 0.0), wall)
+            times = self.stacks.setdefault(tuple(stack), [0.0, 0.0, 0.0])
+            times[CPU] += on_cpu
+            times[NETWORK if innermost in NETWORK_MODULES else WAIT] += wall - on_cpu
+        self.samples += 1
+
+    def collapsed(self):
+        """Return the stacks in collapsed format, weighted in milliseconds;
+        time off the CPU ends in a ``[network]`` or ``[wait]`` frame."""
+        lines = []
+        for stack, times in sorted(self.stacks.items()):
+            for kind, seconds in enumerate(times):
+                ms = round(seconds * 1000)
+                if ms:
+                    lines.append(f"{';'.join(stack)}{_SUFFIXES[kind]} {ms}")
+        return "\n".join(lines) + "\n"
+
+    def functions(self):
+        """Return ``{function label: [cpu, network, wait]}``, the time of the
+        stacks each function is part of, but for PLUMBING_MODULES'."""
+        functions = {}
+        for stack, times in self.stacks.items():
+            # Count recursive functions once per stack
+            for label in set(stack[1:]):
+                if label.partition(":")[0] in PLUMBING_MODULES:
+                    continue
+                total = functions.setdefault(label, [0.0, 0.0, 0.0])
+                for kind, seconds in enumerate(times):
+                    total[kind] += seconds
+        return functions
+
+
+def format_report(sampler, top=25):
+    """Return the *top* functions by CPU plus network time under them, as
+    text."""
+    totals = [0.0, 0.0, 0.0]
+    for times in sampler.stacks.values():
+        for kind, seconds in enumerate(times):
+            totals[kind] += seconds
+    lines = [
+        f"{sampler.samples} samples: {totals[CPU]:.2f}s CPU, "
+        f"{totals[NETWORK]:.2f}s network wait, {totals[WAIT]:.2f}s other wait "
+        "(summed over threads)",
+        "",
+        "Functions by cumulative CPU + network time:",
+        f"  {'cpu':>8} {'network':>8}  function",
+    ]
+    functions = sorted(
+        sampler.functions().items(),
+        key=lambda item: item[1][CPU] + item[1][NETWORK],
+        reverse=True,
+    )
+    for label, times in functions[:top]:
+        lines.append(f"  {times[CPU]:7.2f}s {times[NETWORK]:7.2f}s  {label}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def _profile_all_threads():
+    """Run the block under cProfile, in its thread and those it starts;
+    yields the list of Profiles, complete once the block exits."""
+    profiles = [cProfile.Profile()]
+    if sys.version_info >= (3, 12):
+        # cProfile uses sys.monitoring, which sees every thread, and only one
+        # profiler may be enabled at a time
+        profiles[0].enable()
+        try:
+            yield profiles
+        finally:
+            profiles[0].disable()
+        return
+
+    lock = threading.Lock()
+
+    def start(*args):
+        # Called for the first event of each new thread: replace ourselves
+        # with a profiler of that thread
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()
+
+    threading.setprofile(start)
+    profiles[0].enable()
+    try:
+        yield profiles
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+
+
+@contextmanager
+def profiled(prefix, interval=DEFAULT_SAMPLE_INTERVAL, out=None):
+    """Profile the block, writing ``<prefix>.pstats`` and
+    ``<prefix>.collapsed`` and printing the report to *out* (standard
+    output by default) when it exits, even if it raised."""
+    sampler = Sampler(interval)
+    sampler.start()
+    try:
+        with _profile_all_threads() as profiles:
+            yield
+    finally:
+        sampler.stop()
+        pstats.Stats(*profiles).dump_stats(f"{prefix}.pstats")
+        with open(f"{prefix}.collapsed", "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+        out = out or sys.stdout
+        print(format_report(sampler), file=out)
+        print(f"\nWrote {prefix}.pstats and {prefix}.collapsed", file=out)
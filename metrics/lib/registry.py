@@ -0,0 +1,55 @@
+# Copyright 2026 Canonical Ltd
+
+"""Discovery of the collectors under ``metrics.collectors``."""
+
+import importlib
+import logging
+import pkgutil
+
+from metrics.lib.timespan import parse_timespan
+
+COLLECTORS_PACKAGE = "metrics.collectors"
+
+# Used for collectors whose package does not define RUN_INTERVAL
+DEFAULT_RUN_INTERVAL = "5m"
+
+log = logging.getLogger(__name__)
+
+
+def discover(only=None):
+    """Import every collector package and return ``{name: module}``.
+
+    A collector is any package directly under ``metrics.collectors`` that
+    exposes ``run_metric()``.  If *only* is given, just those names are
+    imported.
+    """
+    package = importlib.import_module(COLLECTORS_PACKAGE)
+    collectors = {}
+    for module_info in sorted(pkgutil.iter_modules(package.__path__)):
+        if not module_info.ispkg:
+            continue
+        if only and module_info.name not in only:
+            continue
+        module = importlib.import_module(f"{COLLECTORS_PACKAGE}.{module_info.name}")
+        if hasattr(module, "run_metric"):
+            collectors[module_info.name] = module
+    return collectors
+
+
+def run_interval(module):
+    """Return how often the collector *module* should run, in seconds.
+
+    This is the package's ``RUN_INTERVAL`` (a systemd-style time span such as
+    ``"1h"``), or ``DEFAULT_RUN_INTERVAL`` if it has none or it is invalid.
+    """
+    value = getattr(module, "RUN_INTERVAL", DEFAULT_RUN_INTERVAL)
+    try:
+        return parse_timespan(value)
+    except ValueError as exc:
+        log.warning(
+            "Ignoring RUN_INTERVAL of %s: %s; using %s",
+            module.__name__,
+            exc,
+            DEFAULT_RUN_INTERVAL,
+        )
+        return parse_timespan(DEFAULT_RUN_INTERVAL)
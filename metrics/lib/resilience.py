@@ -0,0 +1,183 @@
+# Copyright 2026 Canonical Ltd
+
+"""Retries and circuit breaking for the requests of :class:`HTTPClient`.
+
+The hosts collectors talk to are occasionally flaky, and sometimes down for
+hours.  ``HTTPClient`` therefore:
+
+- retries idempotent requests that failed to connect, timed out or got a
+  transient error status, after an exponentially growing, jittered delay
+  (:class:`RetryPolicy`), within the current deadline;
+- counts, per host, the requests that still failed.  After
+  FAILURE_THRESHOLD of them in a row the host's circuit opens
+  (:class:`CircuitBreaker`): requests to it fail at once with
+  :class:`CircuitOpenError` instead of waiting for yet another timeout.
+  Once the cooldown has passed, the circuit is half-open: a single request
+  is let through as a probe, the others still failing at once.  If it
+  succeeds the circuit closes, if it fails the circuit reopens for twice
+  as long.
+
+Circuit states live in the ``circuit`` namespace of the
+:mod:`~metrics.lib.kvstore`, so they carry over from one run to the next,
+and are updated in a single transaction, as several threads and processes
+share them.
+"""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+NAMESPACE = "circuit"
+
+# Consecutive failed requests to a host that open its circuit
+FAILURE_THRESHOLD = 3
+# First and longest time a circuit stays open, in seconds
+OPEN_SECONDS = 5 * 60
+MAX_OPEN_SECONDS = 2 * 60 * 60
+# After this long without an outcome, the probe of a half-open circuit is
+# presumed lost and another request is let through
+PROBE_SECONDS = 5 * 60
+
+# Methods safe to send again, and statuses worth sending them again for
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Requests to the host are failing and are not attempted for now."""
+
+
+class RetryPolicy:
+    """Up to *attempts* tries, the n-th retry after a random delay of up to
+    ``base_delay * 2**(n - 1)`` seconds, capped at *max_delay*."""
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        """Return how long to wait before the *retry*-th retry (from 1)."""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        )
+
+    @staticmethod
+    def is_transient(response=None, error=None):
+        """Whether the request that got *response*, or raised *error*, may
+        succeed if sent again."""
+        if error is not None:
+            return isinstance(
+                error,
+                (requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+            )
+        return response.status_code in RETRY_STATUSES
+
+
+class CircuitBreaker:
+    """Per-host circuit states, kept in *store* (a
+    :class:`~metrics.lib.kvstore.KVStore`) or in memory without one."""
+
+    def __init__(
+        self,
+        store=None,
+        threshold=FAILURE_THRESHOLD,
+        open_seconds=OPEN_SECONDS,
+        max_open_seconds=MAX_OPEN_SECONDS,
+    ):
+        self.store = store
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_seconds = PROBE_SECONDS
+        self._memory = {}
+        self._memory_lock = threading.Lock()
+
+    def _get(self, host):
+        if self.store is None:
+            return self._memory.get(host)
+        return self.store.get(NAMESPACE, host)
+
+    def _update(self, host, function):
+        """Replace the state of *host* with ``function(state)`` atomically
+        (see ``KVStore.update()``) and return it."""
+        if self.store is not None:
+            return self.store.update(NAMESPACE, host, function)
+        with self._memory_lock:
+            state = function(self._memory.get(host))
+            if state is None:
+                self._memory.pop(host, None)
+            else:
+                self._memory[host] = state
+        return state
+
+    def check(self, host):
+        """Raise CircuitOpenError if the circuit of *host* is open, or
+        half-open with its probe request already let through."""
+        state = self._get(host)
+        if not state or "open_until" not in state:
+            return
+        if state["open_until"] > time.time():
+            raise CircuitOpenError(
+                f"Not contacting {host} after {state['failures']} failed requests, "
+                f"until {time.ctime(state['open_until'])}"
+            )
+
+        probing = False
+
+        def claim_probe(state):
+            nonlocal probing
+            now = time.time()
+            if (
+                state
+                and state.get("open_until", 0) <= now
+                and state.get("probe_until", 0) <= now
+            ):
+                state["probe_until"] = now + self.probe_seconds
+                probing = True
+            return state
+
+        state = self._update(host, claim_probe)
+        if state and not probing:
+            raise CircuitOpenError(
+                f"Not contacting {host} after {state['failures']} failed requests, "
+                "while another request probes it"
+            )
+        if probing:
+            log.info("Circuit for %s half-open, probing it", host)
+
+    def record_success(self, host):
+        if self._get(host) is not None:
+            self._update(host, lambda state: None)
+            log.info("Circuit for %s closed", host)
+
+    def record_failure(self, host):
+        def fail(state):
+            state = state or {"failures": 0}
+            state["failures"] += 1
+            state.pop("probe_until", None)
+            if state["failures"] >= self.threshold:
+                # Open again after each failed probe, for twice as long each time
+                cooldown = state.get("cooldown")
+                cooldown = (
+                    self.open_seconds
+                    if cooldown is None
+                    else min(cooldown * 2, self.max_open_seconds)
+                )
+                state["cooldown"] = cooldown
+                state["open_until"] = time.time() + cooldown
+            return state
+
+        state = self._update(host, fail)
+        if state["failures"] >= self.threshold:
+            log.warning(
+                "Circuit for %s opened for %ds after %d failed requests",
+                host,
+                state["cooldown"],
+                state["failures"],
+            )
@@ -0,0 +1,185 @@
+# Copyright 2026 Canonical Ltd
+
+"""Per-host limits on the requests of :class:`HTTPClient`.
+
+Collectors fetch concurrently, and several of them run at once under
+``metrics.daemon``; without limits they could flood Launchpad or the small
+hosts serving the archive team's reports.  :class:`RequestScheduler` caps,
+for each host, the number of requests in flight and their rate (a token
+bucket allowing bursts of up to *concurrency* requests).
+
+Requests over the limits wait in a queue per host.  That queue is served
+round-robin between its owners (one per collector run) rather than in
+arrival order, so a collector queueing many requests at once does not hold
+up the others.  The time spent waiting is accounted in the collector's
+:class:`~metrics.lib.selfstats.CollectorStats`.
+
+Limits come from DEFAULT_HOST_LIMITS and ``$METRICS_HOST_LIMITS``, a
+comma-separated list of ``host=concurrency[:rate]`` (rate in requests per
+second), where ``*`` stands for any other host; e.g.
+``api.launchpad.net=4:10,*=16``.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from metrics.lib import deadline
+
+
+class HostLimits:
+    """At most *concurrency* requests in flight and *rate* per second (no
+    limit if None)."""
+
+    def __init__(self, concurrency, rate=None):
+        if concurrency < 1 or (rate is not None and rate <= 0):
+            raise ValueError(f"Invalid host limits {concurrency}:{rate}")
+        self.concurrency = concurrency
+        self.rate = rate
+
+    def __eq__(self, other):
+        if not isinstance(other, HostLimits):
+            return NotImplemented
+        return (self.concurrency, self.rate) == (other.concurrency, other.rate)
+
+    def __repr__(self):
+        return f"HostLimits({self.concurrency}, {self.rate})"
+
+
+DEFAULT_LIMITS = HostLimits(8)
+
+DEFAULT_HOST_LIMITS = {
+    "api.launchpad.net": HostLimits(4, 10),
+    "code.launchpad.net": HostLimits(2, 5),
+    "ubuntu-archive-team.ubuntu.com": HostLimits(2, 5),
+}
+
+
+def parse_host_limits(text):
+    """Parse ``$METRICS_HOST_LIMITS`` into ``{host: HostLimits}``.
+
+    Raises ``ValueError`` on invalid syntax.
+    """
+    limits = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, sep, value = item.partition("=")
+        if not sep or not host.strip():
+            raise ValueError(f"Expected host=concurrency[:rate], got '{item}'")
+        concurrency, _, rate = value.partition(":")
+        limits[host.strip()] = HostLimits(
+            int(concurrency), float(rate) if rate else None
+        )
+    return limits
+
+
+class _HostQueue:
+    def __init__(self, limits):
+        self.limits = limits
+        self.active = 0
+        # owner -> deque of its waiting tickets, in round-robin order
+        self.waiting = OrderedDict()
+        self.tokens = float(limits.concurrency)
+        self.refilled = time.monotonic()
+
+    def next_ticket(self):
+        owner = next(iter(self.waiting))
+        return self.waiting[owner][0]
+
+    def token_wait(self):
+        """Return how long until a token is available (0 if one is)."""
+        if self.limits.rate is None:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(
+            self.limits.concurrency,
+            self.tokens + (now - self.refilled) * self.limits.rate,
+        )
+        self.refilled = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.limits.rate
+
+    def dequeue(self, owner, ticket):
+        tickets = self.waiting[owner]
+        tickets.remove(ticket)
+        if tickets:
+            # Let the other owners go first
+            self.waiting.move_to_end(owner)
+        else:
+            del self.waiting[owner]
+
+
+class RequestScheduler:
+    """Enforce per-host *limits* (``{host: HostLimits}``), *default* for
+    hosts without any."""
+
+    def __init__(self, limits=None, default=DEFAULT_LIMITS):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._cond = threading.Condition()
+        self._hosts = {}
+
+    @classmethod
+    def from_env(cls):
+        """Return a scheduler with DEFAULT_HOST_LIMITS, overridden by
+        ``$METRICS_HOST_LIMITS``."""
+        limits = dict(DEFAULT_HOST_LIMITS)
+        limits.update(parse_host_limits(os.environ.get("METRICS_HOST_LIMITS", "")))
+        default = limits.pop("*", DEFAULT_LIMITS)
+        return cls(limits, default)
+
+    def _queue(self, host):
+        queue = self._hosts.get(host)
+        if queue is None:
+            queue = self._hosts[host] = _HostQueue(self.limits.get(host, self.default))
+        return queue
+
+    @contextmanager
+    def slot(self, host, owner=None, stats=None):
+        """Wait for *host*'s limits to allow a request, made in the block.
+
+        Waits are shared fairly between *owner*s, never outlast the current
+        deadline and are recorded in *stats* if given.
+        """
+        current = deadline.current()
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            queue = self._queue(host)
+            queue.waiting.setdefault(owner, deque()).append(ticket)
+            try:
+                while True:
+                    wait = None
+                    if (
+                        queue.active < queue.limits.concurrency
+                        and queue.next_ticket() is ticket
+                    ):
+                        wait = queue.token_wait()
+                        if not wait:
+                            break
+                    if current is not None:
+                        current.check()
+                        remaining = current.remaining()
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                queue.dequeue(owner, ticket)
+                # The next ticket in line may now be another one
+                self._cond.notify_all()
+            if queue.limits.rate is not None:
+                queue.tokens -= 1
+            queue.active += 1
+
+        if stats is not None:
+            stats.record_queue_wait(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            with self._cond:
+                queue.active -= 1
+                self._cond.notify_all()
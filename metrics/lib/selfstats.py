@@ -0,0 +1,169 @@
+# Copyright 2026 Canonical Ltd
+
+"""Self-instrumentation of collector runs.
+
+Every ``Metric.run()`` fills a :class:`CollectorStats` and writes it to
+InfluxDB as the ``collector_self_stats`` measurement next to the collected
+data, so the cost of each collector (and of each of its getters) can be
+followed in Grafana:
+
+- one point tagged only with ``collector`` for the whole run: wall time of
+  ``collect()``, CPU time spent processing in it, HTTP requests made through
+  ``self.http`` (count, cache hits, retries, requests refused by open
+  circuits, bytes on the wire, time waited for responses and in the per-host
+  queues), number of points collected and of unchanged ones suppressed, time
+  taken to write them, and getter threads abandoned still running at the
+  deadline;
+- one point per getter run with ``Metric.run_getter()`` (or listed in
+  ``Metric.GETTERS``), additionally tagged with ``getter``: its wall and CPU
+  time, whether it failed and whether it ran out of time (see
+  :mod:`~metrics.lib.deadline`);
+- one point per host whose circuit was open (see
+  :mod:`~metrics.lib.resilience`), additionally tagged with ``host``: the
+  number of requests to it that were refused.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics.lib.point import Point
+
+MEASUREMENT = "collector_self_stats"
+
+
+class CollectorStats:
+    """Counters for one collector run; safe to update from several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.collect_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.write_seconds = 0.0
+        self.points = 0
+        self.suppressed = 0
+        self.http_requests = 0
+        self.http_cached = 0
+        self.http_retries = 0
+        # host -> requests refused because its circuit is open
+        self.http_rejected = {}
+        self.http_bytes = 0
+        self.http_seconds = 0.0
+        self.http_queue_seconds = 0.0
+        self.abandoned_threads = 0
+        # getter name -> [wall seconds, CPU seconds, failed, timed out]
+        self.getters = {}
+
+    def record_request(self, response, elapsed):
+        """Account for one HTTP request answered by *response*."""
+        with self._lock:
+            self.http_requests += 1
+            self.http_bytes += _wire_bytes(response)
+            self.http_seconds += elapsed
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.http_cached += 1
+
+    def record_queue_wait(self, seconds):
+        with self._lock:
+            self.http_queue_seconds += seconds
+
+    def record_retry(self):
+        with self._lock:
+            self.http_retries += 1
+
+    def record_rejected(self, host):
+        with self._lock:
+            self.http_rejected[host] = self.http_rejected.get(host, 0) + 1
+
+    def add_cpu(self, seconds):
+        with self._lock:
+            self.cpu_seconds += seconds
+
+    @contextmanager
+    def timer(self, getter):
+        """Time the block as a run of *getter*, which failed if it raises."""
+        start = time.monotonic()
+        cpu_start = time.thread_time()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            wall = time.monotonic() - start
+            cpu = time.thread_time() - cpu_start
+            with self._lock:
+                totals = self._getter(getter)
+                totals[0] += wall
+                totals[1] += cpu
+                totals[2] = totals[2] or failed
+
+    def mark_timed_out(self, getter, seconds=0.0):
+        """Record that *getter* failed by running out of time, *seconds*
+        after it started if it is still running."""
+        with self._lock:
+            totals = self._getter(getter)
+            totals[0] = max(totals[0], seconds)
+            totals[2] = totals[3] = True
+
+    def _getter(self, getter):
+        return self.getters.setdefault(getter, [0.0, 0.0, False, False])
+
+    def to_points(self, collector):
+        """Return the stats as ``collector_self_stats`` Points."""
+        with self._lock:
+            points = [
+                Point(
+                    MEASUREMENT,
+                    {
+                        "collect_seconds": self.collect_seconds,
+                        "cpu_seconds": self.cpu_seconds,
+                        "write_seconds": self.write_seconds,
+                        "points": self.points,
+                        "suppressed": self.suppressed,
+                        "http_requests": self.http_requests,
+                        "http_cached": self.http_cached,
+                        "http_retries": self.http_retries,
+                        "http_rejected": sum(self.http_rejected.values()),
+                        "http_bytes": self.http_bytes,
+                        "http_seconds": self.http_seconds,
+                        "http_queue_seconds": self.http_queue_seconds,
+                        "abandoned_threads": self.abandoned_threads,
+                    },
+                    {"collector": collector},
+                )
+            ]
+            for getter, (wall, cpu, failed, timed_out) in sorted(self.getters.items()):
+                points.append(
+                    Point(
+                        MEASUREMENT,
+                        {
+                            "seconds": wall,
+                            "cpu_seconds": cpu,
+                            "failed": failed,
+                            "timed_out": timed_out,
+                        },
+                        {"collector": collector, "getter": getter},
+                    )
+                )
+            for host, rejected in sorted(self.http_rejected.items()):
+                points.append(
+                    Point(
+                        MEASUREMENT,
+                        {"rejected_requests": rejected},
+                        {"collector": collector, "host": host},
+                    )
+                )
+        return points
+
+
+def _wire_bytes(response):
+    """Bytes read from the network for *response*, compressed or not."""
+    if response.raw is None:
+        # Not from the network, e.g. replayed from fixtures
+        return len(response.content or b"")
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError):
+        return len(response.content or b"")
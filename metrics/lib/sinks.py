@@ -0,0 +1,528 @@
+# Copyright 2026 Canonical Ltd
+
+"""Destinations for the line protocol collectors produce.
+
+A :class:`Sink` takes batches of lines of line protocol: InfluxDB 1.x
+(:class:`InfluxDBSink`, the default), an InfluxDB 2.x-style HTTP write
+endpoint (:class:`LineProtocolHTTPSink`), a file of line protocol or of
+newline-delimited JSON (:class:`FileSink`), or standard output
+(:class:`StdoutSink`).
+
+``Metric.write()`` sends points through the write-ahead spool to a single
+*primary* sink, ``$METRICS_SINK``; they are only dropped from the spool once
+that sink took them.  Points can also be mirrored to further sinks,
+``$METRICS_MIRRORS`` (comma-separated): each mirror gets every run's points
+once, when they are spooled, through a :class:`QueuedSink` that batches
+and writes them from a background thread.  Mirrors therefore neither slow
+collection down nor hold up the primary sink, and a failing mirror only
+loses its own copy.
+
+Sinks are given as:
+
+- ``influxdb``: InfluxDB 1.x, configured by the ``INFLUXDB_*`` environment;
+- ``influxdb2:URL``: POST to the write endpoint *URL*, e.g.
+  ``http://localhost:8086/api/v2/write?org=ubuntu&bucket=metrics``, with
+  ``$INFLUXDB_TOKEN`` if set;
+- ``file:PATH``: append to *PATH*, as JSON lines if it ends with
+  ``.json``, ``.jsonl`` or ``.ndjson``;
+- ``stdout``.
+"""
+
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import requests
+
+from metrics.lib.errors import CollectorError
+from metrics.lib.point import decode_line
+
+# Default number of points per write request; INFLUXDB_BATCH_SIZE in the
+# environment overrides it
+DEFAULT_WRITE_BATCH_SIZE = 5000
+
+# Precision of the timestamps sent to sinks
+WRITE_TIME_PRECISION = "ms"
+
+# Attempts per batch, and the delay before the first retry (doubled after
+# each further failure)
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 2
+
+# Statuses meaning that something in the batch is invalid (malformed line,
+# wrong field type, ...) or too large: the lines responsible are found and
+# set aside.  Other errors (authentication, missing database, outages, ...)
+# keep the whole batch for later.
+REJECTED_STATUSES = {400, 413, 422}
+
+# Lines a QueuedSink holds before dropping the oldest, how long it waits
+# for a batch to fill up before writing what it has, and how long after a
+# failed write it tries again
+DEFAULT_MAX_QUEUED = 100_000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_REQUEUE_DELAY = 30
+
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+
+log = logging.getLogger(__name__)
+
+
+class BatchRejected(Exception):
+    """The sink refused a batch; sending it again would not help."""
+
+
+class SinkUnavailable(Exception):
+    """The sink could not take a batch right now."""
+
+
+class Sink:
+    """Batched, retried writes of line protocol.
+
+    Subclasses implement :meth:`send`, writing one batch of at most
+    *batch_size* lines and raising BatchRejected if the sink refused some of
+    its lines, SinkUnavailable or ``OSError`` (which includes network
+    errors) if it could not take the batch.
+    """
+
+    def __init__(self, batch_size=DEFAULT_WRITE_BATCH_SIZE, log=log):
+        self.batch_size = batch_size
+        self.log = log
+
+    def send(self, batch):
+        raise NotImplementedError
+
+    def write_batch(self, batch, quarantine=None):
+        """Write one batch, retrying transient failures.
+
+        Lines the sink rejects are singled out by bisecting the batch, and
+        passed to *quarantine* with the error (logged and dropped without
+        one), so that they do not hold up the rest.  Returns False if the
+        sink was unavailable, True once every line was written or rejected.
+        """
+        try:
+            self._send_retrying(batch)
+        except BatchRejected as e:
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                return self.write_batch(
+                    batch[:middle], quarantine
+                ) and self.write_batch(batch[middle:], quarantine)
+            self.log.error(f"{self} rejected {batch[0]!r}: {e}")
+            if quarantine is not None:
+                quarantine(batch, str(e))
+            return True
+        except (SinkUnavailable, OSError):
+            return False
+        return True
+
+    def _send_retrying(self, batch):
+        delay = WRITE_RETRY_DELAY
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                self.send(batch)
+                return
+            except (SinkUnavailable, OSError) as e:
+                if attempt == WRITE_ATTEMPTS:
+                    self.log.error(
+                        f"Giving up writing a batch of {len(batch)} to {self} "
+                        f"after {attempt} attempts: {e}"
+                    )
+                    raise
+                self.log.warning(
+                    f"Writing a batch of {len(batch)} to {self} failed ({e}), "
+                    f"retrying in {delay}s"
+                )
+                time.sleep(delay)
+                delay *= 2
+
+    def write(self, lines):
+        """Write *lines* in batches of ``batch_size`` points.
+
+        Each batch is retried on its own, so one failed write does not lose
+        the rest of the points.  Raises ``CollectorError`` if any line could
+        not be written.
+        """
+        start = time.monotonic()
+        failed = 0
+        rejected = []
+        for i in range(0, len(lines), self.batch_size):
+            batch = lines[i : i + self.batch_size]  # noqa: E203
+            if not self.write_batch(batch, lambda lines, e: rejected.extend(lines)):
+                failed += len(batch)
+        failed += len(rejected)
+        self._report(len(lines) - failed, time.monotonic() - start)
+        if failed:
+            raise CollectorError(f"Failed to write {failed} of {len(lines)} points")
+
+    def drain(self, spool):
+        """Send everything in *spool* to this sink, quarantining the lines
+        it rejects in the spool."""
+        start = time.monotonic()
+        written = spool.drain(
+            lambda batch: self.write_batch(batch, spool.quarantine), self.batch_size
+        )
+        if written:
+            self._report(written, time.monotonic() - start)
+        elif written is None:
+            self.log.warning("Could not drain the spool, will retry later")
+
+    def close(self, timeout=None):
+        """Release the sink's resources, writing what it still holds."""
+
+    def _report(self, written, elapsed):
+        self.log.info(
+            "Wrote %d points to %s in %.2fs (%.0f points/s)",
+            written,
+            self,
+            elapsed,
+            written / elapsed if elapsed else 0,
+        )
+
+    def __str__(self):
+        return type(self).__name__
+
+
+class InfluxDBSink(Sink):
+    """Write to InfluxDB 1.x through an ``influxdb.InfluxDBClient``."""
+
+    def __init__(self, client, batch_size=DEFAULT_WRITE_BATCH_SIZE, log=log):
+        super().__init__(batch_size, log)
+        self.client = client
+
+    def send(self, batch):
+        from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+
+        try:
+            self.client.write_points(
+                batch, time_precision=WRITE_TIME_PRECISION, protocol="line"
+            )
+        except InfluxDBClientError as e:
+            if e.code in REJECTED_STATUSES:
+                raise BatchRejected(e) from e
+            # e.g. bad credentials: fixing them will let the points through
+            raise SinkUnavailable(e) from e
+        except InfluxDBServerError as e:
+            raise SinkUnavailable(e) from e
+
+    def __str__(self):
+        return "InfluxDB"
+
+
+class LineProtocolHTTPSink(Sink):
+    """POST gzip-compressed line protocol to the write endpoint *url* of
+    InfluxDB 2.x, or of anything speaking its API, authenticating with
+    *token* if given."""
+
+    def __init__(
+        self, url, token=None, batch_size=DEFAULT_WRITE_BATCH_SIZE, timeout=60, log=log
+    ):
+        super().__init__(batch_size, log)
+        if "precision=" not in url:
+            url += ("&" if "?" in url else "?") + f"precision={WRITE_TIME_PRECISION}"
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Content-Type": "text/plain; charset=utf-8",
+                "Content-Encoding": "gzip",
+            }
+        )
+        if token:
+            self.session.headers["Authorization"] = f"Token {token}"
+
+    def send(self, batch):
+        body = gzip.compress(("\n".join(batch) + "\n").encode("utf-8"))
+        response = self.session.post(self.url, data=body, timeout=self.timeout)
+        if response.status_code in REJECTED_STATUSES:
+            raise BatchRejected(
+                f"{response.status_code} {response.reason}: {response.text[:200]}"
+            )
+        if response.status_code >= 400:
+            raise SinkUnavailable(f"{response.status_code} {response.reason}")
+
+    def close(self, timeout=None):
+        self.session.close()
+
+    def __str__(self):
+        return self.url.split("?")[0]
+
+
+class FileSink(Sink):
+    """Append to the file *path*, as line protocol, or as one JSON object
+    per point (``measurement``, ``tags``, ``fields`` and ``time``, in
+    WRITE_TIME_PRECISION) if *json_lines*; by default, if *path* ends with
+    one of JSON_SUFFIXES."""
+
+    def __init__(
+        self, path, json_lines=None, batch_size=DEFAULT_WRITE_BATCH_SIZE, log=log
+    ):
+        super().__init__(batch_size, log)
+        self.path = path
+        if json_lines is None:
+            json_lines = path.endswith(JSON_SUFFIXES)
+        self.json_lines = json_lines
+        # Several collectors write concurrently under metrics.daemon
+        self._lock = threading.Lock()
+
+    def format(self, batch):
+        if not self.json_lines:
+            return "".join(line + "\n" for line in batch)
+        out = []
+        for line in batch:
+            measurement, tags, fields, timestamp = decode_line(line)
+            point = {"measurement": measurement, "tags": tags, "fields": fields}
+            if timestamp is not None:
+                point["time"] = timestamp
+            out.append(json.dumps(point, sort_keys=True) + "\n")
+        return "".join(out)
+
+    def send(self, batch):
+        try:
+            text = self.format(batch)
+        except ValueError as e:
+            raise BatchRejected(e) from e
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def __str__(self):
+        return self.path
+
+
+class StdoutSink(FileSink):
+    """Print line protocol to *stream*, standard output by default."""
+
+    def __init__(self, stream=None, batch_size=DEFAULT_WRITE_BATCH_SIZE, log=log):
+        super().__init__("<stdout>", False, batch_size, log)
+        self.stream = stream
+
+    def send(self, batch):
+        stream = self.stream or sys.stdout
+        with self._lock:
+            stream.write(self.format(batch))
+            stream.flush()
+
+
+class QueuedSink(Sink):
+    """Write to *sink* from a background thread.
+
+    :meth:`write_batch` only queues its lines and returns at once; the
+    thread writes them in batches of the sink's ``batch_size``, or of
+    whatever arrived within *flush_interval* seconds.  Lines the sink could
+    not take go back to the front of the queue, to be written again after
+    *requeue_delay* seconds.  Past *max_queued* waiting lines the oldest are
+    dropped, so a sink that is down cannot exhaust memory.
+    """
+
+    def __init__(
+        self,
+        sink,
+        max_queued=DEFAULT_MAX_QUEUED,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        requeue_delay=DEFAULT_REQUEUE_DELAY,
+    ):
+        super().__init__(sink.batch_size, sink.log)
+        self.sink = sink
+        self.max_queued = max_queued
+        self.flush_interval = flush_interval
+        self.requeue_delay = requeue_delay
+        self.dropped = 0
+        # Lists of lines, oldest first, and their total length
+        self._pending = deque()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"sink-{sink}", daemon=True
+        )
+        self._thread.start()
+
+    def write_batch(self, batch, quarantine=None):
+        # Mirrors log and drop the lines they reject: there is no spool
+        with self._cond:
+            if self._closed:
+                return False
+            self._pending.append(list(batch))
+            self._queued += len(batch)
+            self._trim()
+            self._cond.notify()
+        return True
+
+    def _trim(self):
+        while self._queued > self.max_queued and len(self._pending) > 1:
+            # Make room by dropping the oldest lines
+            oldest = self._pending.popleft()
+            self._queued -= len(oldest)
+            self.dropped += len(oldest)
+            self.log.warning(f"{self} queue full, dropped {len(oldest)} points")
+
+    def _requeue(self, lines):
+        """Put back *lines* the sink did not take, and wait before the next
+        attempt; once closed, give up on them."""
+        with self._cond:
+            if self._closed:
+                self.dropped += len(lines)
+                self.log.error(f"Could not write {len(lines)} points to {self}")
+                return
+            self.log.warning(
+                f"Could not write {len(lines)} points to {self}, "
+                f"retrying in {self.requeue_delay}s"
+            )
+            self._pending.appendleft(lines)
+            self._queued += len(lines)
+            self._trim()
+            # Woken early by close()
+            self._cond.wait(self.requeue_delay)
+
+    def _take(self):
+        """Wait for a batch of lines and return it, or None once closed and
+        empty."""
+        with self._cond:
+            deadline = None
+            while self._queued < self.batch_size and not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._pending:
+                return None
+            batch = []
+            while self._pending and (
+                not batch or len(batch) + len(self._pending[0]) <= self.batch_size
+            ):
+                batch.extend(self._pending.popleft())
+            self._queued -= len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            start = time.monotonic()
+            written = 0
+            for i in range(0, len(batch), self.batch_size):
+                chunk = batch[i : i + self.batch_size]  # noqa: E203
+                try:
+                    ok = self.sink.write_batch(chunk)
+                except Exception:
+                    self.log.exception(f"Writing to {self.sink} failed")
+                    ok = False
+                if not ok:
+                    self._requeue(batch[i:])
+                    break
+                written += len(chunk)
+            if written:
+                self.log.debug(
+                    "Wrote %d points to %s in %.2fs",
+                    written,
+                    self.sink,
+                    time.monotonic() - start,
+                )
+
+    def close(self, timeout=None):
+        """Write the queued lines, waiting at most *timeout* seconds, and
+        stop the thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.log.warning(f"{self} did not finish writing in {timeout}s")
+        self.sink.close(timeout)
+
+    def __str__(self):
+        return str(self.sink)
+
+
+class FanOutSink(Sink):
+    """Write to several *sinks* at once.
+
+    :meth:`write_batch` succeeds if every sink took the batch; give it
+    QueuedSinks to have it return without waiting for any of them.
+    """
+
+    def __init__(self, sinks):
+        sinks = list(sinks)
+        super().__init__(min((s.batch_size for s in sinks), default=1), log)
+        self.sinks = sinks
+
+    def write_batch(self, batch, quarantine=None):
+        return all([sink.write_batch(batch, quarantine) for sink in self.sinks])
+
+    def close(self, timeout=None):
+        for sink in self.sinks:
+            sink.close(timeout)
+
+    def __str__(self):
+        return ", ".join(str(sink) for sink in self.sinks)
+
+
+def influxdb_sink_from_env(log=log):
+    """Return an InfluxDBSink configured by the INFLUXDB_* environment.
+
+    Request bodies are gzip-compressed.
+    """
+    try:
+        hostname = os.environ["INFLUXDB_HOSTNAME"]
+        port = os.environ["INFLUXDB_PORT"]
+        username = os.environ["INFLUXDB_USERNAME"]
+        password = os.environ["INFLUXDB_PASSWORD"]
+        database = os.environ["INFLUXDB_DATABASE"]
+    except KeyError as e:
+        log.error(f"Make sure {e} is set in the environment.")
+        raise CollectorError(f"Variable {e} not set") from e
+
+    # Imported here: dry runs and other sinks never need it
+    from influxdb import InfluxDBClient
+
+    log.debug(f"Connecting to influxdb at {hostname}:{port}...")
+    client = InfluxDBClient(
+        hostname,
+        port,
+        username,
+        password,
+        database,
+        ssl=True,
+        verify_ssl=False,
+        gzip=True,
+    )
+    return InfluxDBSink(client, batch_size_from_env(), log)
+
+
+def batch_size_from_env():
+    try:
+        return int(os.environ.get("INFLUXDB_BATCH_SIZE", DEFAULT_WRITE_BATCH_SIZE))
+    except ValueError as e:
+        raise CollectorError(f"Invalid INFLUXDB_BATCH_SIZE: {e}") from e
+
+
+def sink_from_spec(spec, log=log):
+    """Return the sink described by *spec* (see the module docstring).
+
+    Raises ``CollectorError`` if *spec* is invalid or incomplete.
+    """
+    kind, _, arg = spec.strip().partition(":")
+    if kind == "influxdb" and not arg:
+        return influxdb_sink_from_env(log)
+    if kind == "influxdb2" and arg:
+        return LineProtocolHTTPSink(
+            arg, os.environ.get("INFLUXDB_TOKEN"), batch_size_from_env(), log=log
+        )
+    if kind == "file" and arg:
+        return FileSink(arg, batch_size=batch_size_from_env(), log=log)
+    if kind == "stdout" and not arg:
+        return StdoutSink(batch_size=batch_size_from_env(), log=log)
+    raise CollectorError(f"Invalid sink '{spec}'")
@@ -0,0 +1,185 @@
+# Copyright 2026 Canonical Ltd
+
+"""Local write-ahead spool for points on their way to InfluxDB.
+
+``Metric.run()`` appends the points it collected to the spool as a segment
+file of line protocol and returns; the spool is then drained to InfluxDB in
+large batches.  If the database is down or slow the segments simply stay on
+disk, survive restarts, and are sent on the next successful drain instead
+of the collection being lost.  Once the spool grows beyond its size limit
+the oldest segments are dropped first.  Lines the database rejects as
+invalid are set aside in ``rejected.txt`` so that draining can go on.
+
+Each append creates a new segment, written to a temporary name and renamed
+into place, and segment names sort by creation time.  Several processes can
+therefore append concurrently; draining is serialised with a lock file.
+"""
+
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# How often a background drainer retries when it is not woken up
+DRAIN_INTERVAL = 60
+
+SEGMENT_SUFFIX = ".lp"
+
+# Lines the database rejected, kept for inspection rather than retried
+REJECTED_FILE = "rejected.txt"
+
+log = logging.getLogger(__name__)
+
+
+class Spool:
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self):
+        """Return the paths of the complete segments, oldest first."""
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def append(self, lines):
+        """Store *lines* of line protocol as a new segment."""
+        if not lines:
+            return
+        fd, tmp = tempfile.mkstemp(
+            dir=self.directory, prefix=f"{time.time_ns():020d}-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, tmp[: -len(".tmp")] + SEGMENT_SUFFIX)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.enforce_limit()
+
+    def enforce_limit(self):
+        """Drop the oldest segments until the spool fits its size limit."""
+        sizes = []
+        for path in self.segments():
+            try:
+                sizes.append((path, os.path.getsize(path)))
+            except OSError:
+                continue
+        total = sum(size for _, size in sizes)
+        for path, size in sizes:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            log.warning("Spool over %d bytes, dropped %s", self.max_size, path)
+
+    def drain(self, write_batch, batch_size):
+        """Send the spooled points, oldest first, with *write_batch*.
+
+        *write_batch* is called with lists of at most *batch_size* lines and
+        returns whether they were handled: written, or set aside with
+        :meth:`quarantine` if invalid.  Segments are deleted once all of
+        their lines have been written; draining stops at the first failure
+        and the remaining segments are kept for next time.  Returns the
+        number of points written, or None if another drain was in progress
+        or a batch failed.
+        """
+        lock_path = os.path.join(self.directory, ".lock")
+        with open(lock_path, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                log.debug("Spool is already being drained")
+                return None
+
+            written = 0
+            lines = []
+            segments = []
+            for path in self.segments():
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        lines.extend(line for line in f.read().splitlines() if line)
+                except FileNotFoundError:
+                    continue
+                segments.append(path)
+                if len(lines) >= batch_size:
+                    if not self._flush(write_batch, batch_size, lines, segments):
+                        return None
+                    written += len(lines)
+                    lines = []
+                    segments = []
+            if segments:
+                if not self._flush(write_batch, batch_size, lines, segments):
+                    return None
+                written += len(lines)
+            return written
+
+    def quarantine(self, lines, reason):
+        """Set *lines*, rejected for *reason*, aside in REJECTED_FILE."""
+        path = os.path.join(self.directory, REJECTED_FILE)
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(f"# {time.strftime('%Y-%m-%dT%H:%M:%S')} {reason}\n")
+                f.write("".join(line + "\n" for line in lines))
+        except OSError as e:
+            log.error("Failed to quarantine %d rejected lines: %s", len(lines), e)
+            return
+        log.warning("Quarantined %d rejected lines in %s", len(lines), path)
+
+    @staticmethod
+    def _flush(write_batch, batch_size, lines, segments):
+        for i in range(0, len(lines), batch_size):
+            if not write_batch(lines[i : i + batch_size]):  # noqa: E203
+                return False
+        for path in segments:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+
+class SpoolDrainer(threading.Thread):
+    """Drain a spool in the background whenever woken, or periodically.
+
+    *drain* is a callable doing a single drain pass.
+    """
+
+    def __init__(self, drain, interval=DRAIN_INTERVAL):
+        super().__init__(name="spool-drainer", daemon=True)
+        self._drain = drain
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self._drain()
+            except Exception:
+                log.exception("Draining the spool failed")
+
+    def stop(self, timeout=None):
+        """Stop the thread after one last drain pass."""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
@@ -0,0 +1,230 @@
+# Copyright 2026 Canonical Ltd
+
+"""Incremental reading of append-only files served over HTTP.
+
+Several reports (``nbs.csv``, ``component-mismatches.csv``,
+``update_excuses.csv``, ...) are CSV files that only ever get rows appended.
+:class:`TailFollower` remembers, per URL, how far the file was read and only
+asks for the bytes after that with a ``Range`` request.
+
+To notice a file that was truncated or replaced since, the request starts
+with the last line already read, which must come back unchanged, the file
+must not have shrunk, and its first ``HEAD_BYTES`` must still have the same
+checksum; otherwise, if there is no last line to compare (nothing complete
+was read yet), or if the server cannot satisfy the range, the whole file is
+read again.
+Callers can also store a watermark (typically the timestamp of the newest
+row they sent) to skip rows they have already sent when that happens.
+
+Reading does not update the stored state: :meth:`Tail.update` returns the
+``(namespace, key, value)`` item to store once the rows have been written
+(see ``Metric.stage_state()``).
+"""
+
+import hashlib
+import logging
+import re
+import time
+
+NAMESPACE = "tail"
+
+# How much of the start of the file is checksummed
+HEAD_BYTES = 1024
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+log = logging.getLogger(__name__)
+
+
+class Tail:
+    """The complete lines appended to a file since it was last read.
+
+    *full* is true if the whole file was read (first read, truncation or
+    rotation), in which case *lines* are all of its lines, minus the header.
+    """
+
+    def __init__(self, url, lines, header, full, previous, state):
+        self.url = url
+        self.lines = lines
+        self.header = header
+        self.full = full
+        self._previous = previous or {}
+        self._state = state
+
+    @property
+    def watermark(self):
+        """The watermark stored with the previous read, or None."""
+        return self._previous.get("watermark")
+
+    def update(self, watermark=None):
+        """Return the state item recording this read, and *watermark* (the
+        previous one is kept if None)."""
+        state = dict(self._state)
+        state["watermark"] = watermark if watermark is not None else self.watermark
+        return (NAMESPACE, self.url, state)
+
+
+class TailFollower:
+    """Read what was appended to files since the last run.
+
+    *store* is a :class:`~metrics.lib.kvstore.KVStore`; without one every
+    read is a first read.
+    """
+
+    def __init__(self, http, store=None):
+        self.http = http
+        self.store = store
+
+    def read(self, url, initial_tail=None, header=False):
+        """Return a :class:`Tail` of *url*.
+
+        On the first read only the last *initial_tail* bytes are fetched, if
+        given, and the partial line they start with is dropped.  If *header*
+        is true the first line of the file is kept aside as ``Tail.header``
+        on every read, which requires reading the whole file the first time.
+        """
+        previous = self.store.get(NAMESPACE, url) if self.store else None
+        if previous and header != (previous.get("header") is not None):
+            # Read differently before; start over
+            previous = None
+
+        response = None
+        if previous:
+            tail = self._read_appended(url, previous)
+            if tail is not None:
+                return tail
+            log.info("%s was truncated or replaced, reading all of it", url)
+        elif initial_tail and not header:
+            response = self._get_range(url, f"bytes=-{initial_tail}")
+            if response.status_code == 206:
+                start, _, size = _content_range(response)
+                body = response.content
+                head = body[:HEAD_BYTES] if start == 0 else self._get_head(url) or b""
+                if start > 0:
+                    # Drop the partial first line
+                    skip = body.find(b"\n") + 1 or len(body)
+                    body = body[skip:]
+                    start += skip
+                return self._tail(url, body, start, size, head, None, False, previous)
+            if response.status_code != 200:
+                response = None
+
+        if response is None:
+            response = self.http.get(url)
+            response.raise_for_status()
+        body = response.content
+        header_line = None
+        start = 0
+        if header:
+            start = body.find(b"\n") + 1 or len(body)
+            header_line = body[:start].decode("utf-8", errors="replace").rstrip("\r\n")
+            body = body[start:]
+        return self._tail(
+            url,
+            body,
+            start,
+            len(response.content),
+            response.content[:HEAD_BYTES],
+            header_line,
+            True,
+            previous,
+        )
+
+    def _read_appended(self, url, previous):
+        last = previous["last"].encode("utf-8")
+        if not last or "head_sha256" not in previous:
+            # Anything would look appended
+            return None
+        offset = previous["offset"]
+        start = offset - len(last)
+        response = self._get_range(url, f"bytes={start}-")
+        if response.status_code == 416:
+            return None
+        body = response.content
+        if response.status_code == 206:
+            first, _, size = _content_range(response)
+            if first != start:
+                return None
+            head = self._get_head(url, previous["head_size"])
+        else:
+            # The server ignored the range
+            size = len(body)
+            head = body[: previous["head_size"]]
+            body = body[start:]
+        if not body.startswith(last):
+            return None
+        if size is not None and size < previous["size"]:
+            return None
+        if head is None or _checksum(head) != previous["head_sha256"]:
+            return None
+        return self._tail(
+            url,
+            body[len(last) :],  # noqa: E203
+            offset,
+            size,
+            head,
+            previous.get("header"),
+            False,
+            previous,
+            last=previous["last"],
+        )
+
+    def _get_range(self, url, byte_range):
+        # Ranges must apply to the file itself, not to a compressed encoding
+        response = self.http.get(
+            url, headers={"Range": byte_range, "Accept-Encoding": "identity"}
+        )
+        if response.status_code != 416:
+            response.raise_for_status()
+        return response
+
+    def _get_head(self, url, size=HEAD_BYTES):
+        """Return the first *size* bytes of *url*, or None if it is shorter."""
+        if not size:
+            return b""
+        response = self._get_range(url, f"bytes=0-{size - 1}")
+        if response.status_code == 416:
+            return None
+        head = response.content[:size]
+        if response.status_code == 206 and _content_range(response)[0] != 0:
+            return None
+        return head
+
+    @staticmethod
+    def _tail(url, body, start, size, head, header, full, previous, last=""):
+        """Build the Tail of the complete lines of *body*, found at offset
+        *start* of the file of *size* bytes that starts with *head*."""
+        end = body.rfind(b"\n") + 1
+        lines = body[:end].decode("utf-8", errors="replace").split("\n")[:-1]
+        if lines:
+            last = lines[-1] + "\n"
+        state = {
+            "offset": start + end,
+            "size": size,
+            "last": last,
+            "head_size": len(head),
+            "head_sha256": _checksum(head),
+            "header": header,
+            "read": time.time(),
+        }
+        return Tail(
+            url,
+            [line.rstrip("\r") for line in lines],
+            header,
+            full,
+            previous,
+            state,
+        )
+
+
+def _checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _content_range(response):
+    """Return ``(first, last, size)`` from the response's Content-Range."""
+    m = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+    if not m:
+        return 0, None, None
+    first, last, size = m.groups()
+    return int(first), int(last), None if size == "*" else int(size)
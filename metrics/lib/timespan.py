@@ -0,0 +1,66 @@
+# Copyright 2026 Canonical Ltd
+
+"""Parsing of systemd-style time spans such as ``5m``, ``1h`` or ``1h 30min``.
+
+``RUN_INTERVAL`` was historically passed straight to ``OnUnitInactiveSec=``
+in a systemd timer, so the same syntax is accepted here.
+"""
+
+import re
+
+_UNITS = {
+    "us": 1e-6,
+    "usec": 1e-6,
+    "ms": 1e-3,
+    "msec": 1e-3,
+    "s": 1,
+    "sec": 1,
+    "second": 1,
+    "seconds": 1,
+    "m": 60,
+    "min": 60,
+    "minute": 60,
+    "minutes": 60,
+    "h": 3600,
+    "hr": 3600,
+    "hour": 3600,
+    "hours": 3600,
+    "d": 86400,
+    "day": 86400,
+    "days": 86400,
+    "w": 604800,
+    "week": 604800,
+    "weeks": 604800,
+}
+
+_COMPONENT = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([a-z]*)", re.IGNORECASE)
+
+
+def parse_timespan(value):
+    """Return the number of seconds in the time span *value*.
+
+    Numbers (and strings without a unit) are taken as seconds.  Raises
+    ``ValueError`` for anything else that cannot be parsed.
+    """
+    if isinstance(value, (int, float)):
+        return value
+
+    text = value.strip()
+    if not text:
+        raise ValueError("Empty time span")
+
+    total = 0
+    pos = 0
+    while pos < len(text):
+        m = _COMPONENT.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid time span '{value}'")
+        number, unit = m.groups()
+        unit = unit.lower() or "s"
+        if unit not in _UNITS:
+            raise ValueError(f"Unknown time unit '{unit}' in '{value}'")
+        total += float(number) * _UNITS[unit]
+        pos = m.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+    return total
@@ -0,0 +1,184 @@
+# Copyright 2026 Canonical Ltd
+
+"""Run every collector once, concurrently, and write all of their points.
+
+Meant for testing, backfilling or catching up after an outage, when
+starting each collector by hand would be tedious.  Collectors are discovered
+like by ``metrics.daemon`` and run in a pool of processes, so that they
+neither share a GIL nor a launchpadlib session; the whole run takes about as
+long as the slowest collector.
+
+The worker processes only collect: they send their points back as line
+protocol, along with the state they would store once those are written (see
+``Metric.stage_state()``).  The parent process then writes the points of all
+collectors in one stream, and stores their state if that succeeded.  A
+table of each collector's time, number of points and status is printed at
+the end; the exit status is 1 if any collector failed.
+
+Run with ``python3 -m metrics.run_all``.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from metrics.lib.basemetric import (
+    Metric,
+    sink_from_env,
+    to_lines,
+    write_lines,
+)
+from metrics.lib.kvstore import get_store
+from metrics.lib.registry import discover
+
+log = logging.getLogger(__name__)
+
+
+class CollectorResult:
+    """What a worker process sends back about the run of one collector."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.points = 0
+        self.lines = []
+        # (namespace, key, value) items to store once lines are written
+        self.state = []
+        self.error = None
+
+
+def collector_class(module):
+    """Return the Metric subclass exposed by the collector package *module*."""
+    for value in vars(module).values():
+        if (
+            isinstance(value, type)
+            and issubclass(value, Metric)
+            and value is not Metric
+        ):
+            return value
+    raise LookupError(f"No collector class in {module.__name__}")
+
+
+def collect(name, dry_run=False, verbose=False):
+    """Run the collector *name* up to writing its points, and return its
+    CollectorResult.  Runs in a worker process."""
+    result = CollectorResult(name)
+    start = time.monotonic()
+    try:
+        metric = collector_class(discover([name])[name])(
+            dry_run=dry_run, verbose=verbose
+        )
+        data = metric.gather()
+        if not dry_run and metric.DEDUP_MEASUREMENTS:
+            data = metric.suppress_unchanged(data)
+        result.points = len(data)
+        result.lines = to_lines(
+            data + metric.stats.to_points(metric.name), metric.collection_time
+        )
+        result.state = metric.pending_state
+        if metric.failed_getters:
+            result.error = f"failed getters: {', '.join(metric.failed_getters)}"
+    except Exception as e:
+        log.exception("Collector %s failed", name)
+        result.error = str(e) or type(e).__name__
+    result.seconds = time.monotonic() - start
+    return result
+
+
+def run_all(names, dry_run=False, verbose=False, jobs=None):
+    """Run the collectors *names* in at most *jobs* processes (one per
+    collector by default) and write their points.
+
+    Returns the CollectorResults, in completion order, and whether the points
+    were written.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs or len(names)) as pool:
+        futures = {pool.submit(collect, name, dry_run, verbose): name for name in names}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died
+                result = CollectorResult(futures[future])
+                result.error = str(e) or type(e).__name__
+            log.info(
+                "Collector %s finished in %.1fs%s",
+                result.name,
+                result.seconds,
+                f" ({result.error})" if result.error else "",
+            )
+            results.append(result)
+
+    lines = [line for result in results for line in result.lines]
+    if dry_run:
+        log.info("[dry-run] Would submit %d lines", len(lines))
+        log.debug("[dry-run] Lines:\n%s", "\n".join(lines))
+        return results, True
+
+    try:
+        write_lines(sink_from_env(log), lines, log)
+    except Exception:
+        log.exception("Failed to write the points")
+        return results, False
+    store = get_store()
+    if store is not None:
+        store.put_many([item for result in results for item in result.state])
+    return results, True
+
+
+def format_report(results):
+    """Return a table of the collectors' results, slowest first."""
+    rows = [f"{'collector':<16} {'status':<7} {'seconds':>8} {'points':>7}"]
+    for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+        status = "failed" if result.error else "ok"
+        row = f"{result.name:<16} {status:<7} {result.seconds:8.1f} {result.points:7d}"
+        if result.error:
+            row += f"  {result.error}"
+        rows.append(row)
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Do not act but print what would be submitted",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Be more verbose")
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="COLLECTOR",
+        help="Only run this collector (may be given more than once)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Maximum number of collectors running at once (default: all)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s - %(processName)s - %(message)s",
+    )
+    names = sorted(discover(args.only))
+    if not names:
+        parser.error("No collectors to run")
+
+    start = time.monotonic()
+    results, written = run_all(names, args.dry_run, args.verbose, args.jobs)
+    print(format_report(results))
+    print(f"Ran {len(results)} collectors in {time.monotonic() - start:.1f}s")
+    if not written or any(result.error for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
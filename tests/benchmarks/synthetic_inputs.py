@@ -0,0 +1,139 @@
+# Copyright 2026 Canonical Ltd
+
+"""Synthetic inputs for the parser benchmarks.
+
+Each generator takes a *scale*: 1 produces a document of about the size the
+collectors see today, 10 and 100 ten and a hundred times as much (more
+packages, teams, tests or images rather than longer lines).  Inputs are
+deterministic, so timings are comparable between runs.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+
+ARCHES = ["amd64", "arm64", "armhf", "i386", "ppc64el", "riscv64", "s390x"]
+RELEASES = ["focal", "jammy", "noble", "oracular", "plucky", "questing"]
+FLAVORS = ["kubuntu", "lubuntu", "ubuntu-budgie", "ubuntustudio", "xubuntu"]
+
+NOW = datetime(2026, 1, 15, 12, 0, 0)
+
+
+def _packages(rng, n):
+    return [f"pkg{rng.randrange(10**6)}-{i}" for i in range(n)]
+
+
+def byarch_report(scale):
+    """A proposed-migration ``*_uninst.txt`` report: ~40 packages per arch."""
+    rng = random.Random(1)
+    lines = []
+    counts = {}
+    for arch in ARCHES:
+        packages = _packages(rng, 40 * scale)
+        counts[arch] = len(packages)
+        lines.append(f"* {arch}")
+        lines.extend(f"  {p}: {rng.choice(packages)} (>= 1.0)" for p in packages)
+        lines.append("")
+    lines.append("* summary")
+    lines.extend(f"  {count:4d} {arch}" for arch, count in counts.items())
+    lines.append("# Generated: Thu, 15 Jan 2026 12:00:00 +0000")
+    return "\n".join(lines) + "\n", counts
+
+
+def priority_mismatches(scale):
+    """``priority-mismatches.txt``: ~60 packages per arch in 3 subsections."""
+    rng = random.Random(2)
+    lines = ["Generated: Thu Jan 15 12:00:00 GMT 2026", ""]
+    counts = {}
+    for arch in ARCHES:
+        lines.extend([arch, "=" * len(arch), ""])
+        counts[arch] = 0
+        for priority in ("required", "important", "standard"):
+            heading = (
+                f'Packages with priority "{priority}" but in a lower seed than\n'
+                "expected"
+            )
+            lines.extend(heading.splitlines())
+            lines.append("-" * 40)
+            packages = _packages(rng, 20 * scale)
+            lines.extend(packages)
+            lines.append("")
+            counts[arch] += len(packages)
+    return "\n".join(lines) + "\n", counts
+
+
+def update_excuses_by_team(scale):
+    """``update_excuses_by_team.yaml``: ~60 teams, ~25 packages each."""
+    rng = random.Random(3)
+    lines = []
+    for t in range(60 * scale):
+        lines.append(f"team-{t}:")
+        for p in _packages(rng, 25):
+            lines.append(f"- source: {p}")
+            lines.append(f"  age: {rng.uniform(0, 60):.2f}")
+            lines.append(f"  data: {{new-version: '1.{rng.randrange(99)}'}}")
+    return "\n".join(lines) + "\n"
+
+
+def running_json(scale):
+    """Decoded ``running.json``: ~150 packages, 1-2 runs per release/arch."""
+    rng = random.Random(4)
+    running = {}
+    for pkg in _packages(rng, 150 * scale):
+        running[pkg] = {}
+        for _ in range(rng.randint(1, 2)):
+            params = json.dumps({"triggers": [f"{pkg}/{rng.randrange(99)}"]})
+            running[pkg][params] = {
+                release: {arch: [{"submit-time": "x"}, 42] for arch in ARCHES[:4]}
+                for release in rng.sample(RELEASES, 2)
+            }
+    return running
+
+
+def rsync_listing(scale):
+    """rsync ``%l %M %f`` listing of the cdimage trees: ~600 images."""
+    rng = random.Random(5)
+    lines = []
+    for i in range(600 * scale):
+        flavor = rng.choice(FLAVORS)
+        release = rng.choice(RELEASES)
+        arch = rng.choice(ARCHES)
+        state = rng.choice(["current", "pending"])
+        kind = rng.choice(["daily-live", "daily-minimal", "dvd"])
+        mtime = (NOW - timedelta(hours=rng.randrange(24 * 30))).strftime(
+            "%Y/%m/%d-%H:%M:%S"
+        )
+        path = f"{flavor}/{kind}/{state}/{release}-desktop-{arch}.iso"
+        lines.append(f"'{rng.randrange(10**9, 6 * 10**9)} {mtime} {path}'")
+        # Directory entries and checksums, which are skipped
+        lines.append(f"'4096 {mtime} {flavor}/{kind}/{state}'")
+        lines.append(f"'512 {mtime} {flavor}/{kind}/{state}/SHA256SUMS'")
+        if i % 50 == 0:
+            lines.append(f"'{i} {mtime} ubuntu/{kind}/{state}/x-{arch}.iso'")
+    return "\n".join(lines) + "\n"
+
+
+def active_reviews_page(scale):
+    """A Launchpad ``+activereviews`` page: ~60 MPs in three sections."""
+    rng = random.Random(6)
+    sections = [
+        ("Reviews ubuntu-archive can do", 30 * scale),
+        ("Requested reviews by ubuntu-archive", 20 * scale),
+        ("Reviews I am doing", 10 * scale),
+    ]
+    rows = []
+    for heading, n in sections:
+        rows.append(f'<tr><td class="section-heading" colspan="4">{heading}</td></tr>')
+        for i in range(n):
+            mp = rng.randrange(10**6)
+            rows.append(
+                "<tr><td>"
+                f'<a href="/~someone/+git/{i}/+merge/{mp}">lp:~someone/{i}</a>'
+                f'</td><td><a href="/~someone">Some One</a></td>'
+                f"<td>{rng.randrange(30)} days ago</td>"
+                '<td><img src="/@@/pending" /></td></tr>'
+            )
+    return (
+        "<html><head><title>Active reviews</title></head><body>"
+        '<table class="listing">' + "".join(rows) + "</table></body></html>"
+    ), 50 * scale
@@ -0,0 +1,168 @@
+# Copyright 2026 Canonical Ltd
+
+"""Benchmarks of the collectors' parsers on synthetic inputs.
+
+Every parser is run on inputs 1x and 10x the size of today's (see
+synthetic_inputs), and its time and peak memory are printed for each scale
+(run pytest with ``-s`` to see them).  Set ``$METRICS_BENCHMARK_SCALES`` to
+``1,10,100`` for the full, much slower, run.  A benchmark fails if:
+
+- the parser scales worse than linearly: its time or peak memory per unit of
+  input at the largest scale is more than SCALING_TOLERANCE times that at
+  the one before;
+- ``$METRICS_BENCHMARK_BASELINE`` names a file of earlier results and the
+  parser got more than BASELINE_TOLERANCE times slower at 10x.  If the file
+  does not exist, the results are saved there to serve as the baseline.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+import unittest
+
+from metrics.collectors.autopkgtest.autopkgtest_collector import count_running
+from metrics.collectors.britney.britney_collector import (
+    parse_update_excuses_by_team,
+)
+from metrics.collectors.images.images_collector import parse_rsync_listing
+from metrics.collectors.ubuntu_archive.ubuntu_archive_collector import (
+    parse_byarch_report,
+    parse_priority_mismatches,
+)
+from metrics.lib.lp_scrape_mps import count_reviews_in_page
+
+from . import synthetic_inputs as inputs
+
+SCALES = [int(s) for s in os.environ.get("METRICS_BENCHMARK_SCALES", "1,10").split(",")]
+SCALING_TOLERANCE = 3.0
+# Timings below this are too noisy to compare
+MIN_COMPARABLE_TIME = 0.005
+BASELINE_TOLERANCE = 1.5
+
+
+def measure(func, *args):
+    """Return the best wall time of *func(*args)* and its peak memory."""
+    elapsed = []
+    deadline = time.perf_counter() + 1
+    while len(elapsed) < 3 and (not elapsed or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        func(*args)
+        elapsed.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(elapsed), peak
+
+
+class ParserBenchmark(unittest.TestCase):
+    def bench(self, name, make_input, parse, check=None):
+        """Run *parse* on ``make_input(scale)`` at every scale."""
+        results = {}
+        for scale in SCALES:
+            args = make_input(scale)
+            if check is not None:
+                check(scale, parse(*args))
+            results[scale] = measure(parse, *args)
+
+        print(f"\n{name}:")
+        for scale, (elapsed, peak) in results.items():
+            print(f"  {scale:4d}x {elapsed * 1000:9.1f}ms {peak / 1024:10.0f}KiB")
+
+        if len(SCALES) > 1:
+            small, large = sorted(SCALES)[-2:]
+            for i, what in enumerate(("time", "peak memory")):
+                if i == 0 and results[large][0] < MIN_COMPARABLE_TIME:
+                    continue
+                self.assertLessEqual(
+                    results[large][i] / large,
+                    results[small][i] / small * SCALING_TOLERANCE,
+                    f"{name}: {what} grows faster than the input",
+                )
+        self.check_baseline(name, results)
+
+    def check_baseline(self, name, results):
+        path = os.environ.get("METRICS_BENCHMARK_BASELINE")
+        if not path or 10 not in results:
+            return
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            baseline = {}
+        if name not in baseline:
+            baseline[name] = results[10][0]
+            with open(path, "w") as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            return
+        self.assertLessEqual(
+            max(results[10][0], MIN_COMPARABLE_TIME),
+            max(baseline[name], MIN_COMPARABLE_TIME) * BASELINE_TOLERANCE,
+            f"{name} regressed: {results[10][0]:.4f}s, baseline {baseline[name]:.4f}s",
+        )
+
+    def test_byarch_report(self):
+        def make(scale):
+            return (inputs.byarch_report(scale)[0],)
+
+        def check(scale, result):
+            self.assertEqual(result[1], inputs.byarch_report(scale)[1])
+
+        self.bench("parse_byarch_report", make, parse_byarch_report, check)
+
+    def test_priority_mismatches(self):
+        def make(scale):
+            return inputs.priority_mismatches(scale)[0], inputs.ARCHES
+
+        def check(scale, result):
+            self.assertEqual(result[1], inputs.priority_mismatches(scale)[1])
+
+        self.bench("parse_priority_mismatches", make, parse_priority_mismatches, check)
+
+    def test_update_excuses_by_team(self):
+        def check(scale, result):
+            self.assertEqual(len(result), 60 * scale)
+
+        self.bench(
+            "parse_update_excuses_by_team",
+            lambda scale: (inputs.update_excuses_by_team(scale),),
+            parse_update_excuses_by_team,
+            check,
+        )
+
+    def test_count_running(self):
+        def check(scale, result):
+            self.assertTrue(set(result) <= set(inputs.RELEASES))
+
+        self.bench(
+            "count_running",
+            lambda scale: (inputs.running_json(scale),),
+            count_running,
+            check,
+        )
+
+    def test_rsync_listing(self):
+        def check(scale, result):
+            self.assertGreater(len(result), 300 * scale)
+
+        self.bench(
+            "parse_rsync_listing",
+            lambda scale: (inputs.rsync_listing(scale), {}, inputs.NOW),
+            parse_rsync_listing,
+            check,
+        )
+
+    def test_active_reviews(self):
+        def check(scale, result):
+            self.assertEqual(result, inputs.active_reviews_page(scale)[1])
+
+        self.bench(
+            "count_reviews_in_page",
+            lambda scale: (inputs.active_reviews_page(scale)[0],),
+            count_reviews_in_page,
+            check,
+        )
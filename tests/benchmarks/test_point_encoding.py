@@ -0,0 +1,106 @@
+# Copyright 2026 Canonical Ltd
+
+"""Micro-benchmark of building and encoding points.
+
+Compares the historical path (point dicts serialised by the influxdb client's
+``make_lines()``) with :class:`metrics.lib.point.Point` and its encoder, on
+points shaped like the autopkgtest queue sizes.
+"""
+
+import time
+import timeit
+import tracemalloc
+import unittest
+from datetime import datetime, timezone
+
+from influxdb.line_protocol import make_lines
+
+from metrics.lib.point import Point, encode
+
+CONTEXTS = ["ubuntu", "huge", "ppa", "upstream"]
+RELEASES = ["focal", "jammy", "noble", "oracular", "plucky", "questing"]
+ARCHES = ["amd64", "arm64", "armhf", "i386", "ppc64el", "riscv64", "s390x"]
+INSTANCES = ["production", "staging"]
+REPEAT = 120
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _keys():
+    for _ in range(REPEAT):
+        for context in CONTEXTS:
+            for release in RELEASES:
+                for arch in ARCHES:
+                    for instance in INSTANCES:
+                        yield context, release, arch, instance
+
+
+def dict_points():
+    return [
+        {
+            "measurement": "autopkgtest_queue_size",
+            "fields": {"count": i},
+            "tags": {
+                "context": context,
+                "release": release,
+                "arch": arch,
+                "instance": instance,
+            },
+            "time": NOW,
+        }
+        for i, (context, release, arch, instance) in enumerate(_keys())
+    ]
+
+
+def slot_points():
+    return [
+        Point(
+            "autopkgtest_queue_size",
+            {"count": i},
+            {
+                "context": context,
+                "release": release,
+                "arch": arch,
+                "instance": instance,
+            },
+            NOW,
+        )
+        for i, (context, release, arch, instance) in enumerate(_keys())
+    ]
+
+
+def old_path():
+    return make_lines({"points": dict_points()}, precision="ms").splitlines()
+
+
+def new_path():
+    return encode(slot_points(), "ms")
+
+
+def _peak_memory(build):
+    tracemalloc.start()
+    try:
+        points = build()  # noqa: F841
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestPointEncoding(unittest.TestCase):
+    def test_encoder_is_faster(self):
+        self.assertEqual(new_path(), old_path())
+
+        old = min(timeit.repeat(old_path, number=1, repeat=3, timer=time.perf_counter))
+        new = min(timeit.repeat(new_path, number=1, repeat=3, timer=time.perf_counter))
+        count = len(dict_points())
+        print(
+            f"\n{count} points: dicts + make_lines {old * 1000:.0f}ms, "
+            f"Point + encode {new * 1000:.0f}ms ({old / new:.1f}x)"
+        )
+        self.assertLess(new, old)
+
+    def test_points_are_smaller(self):
+        old = _peak_memory(dict_points)
+        new = _peak_memory(slot_points)
+        print(f"\npeak memory: dicts {old >> 10}KiB, Points {new >> 10}KiB")
+        self.assertLess(new, old)
@@ -3,13 +3,41 @@
 import importlib
 import os
 import pkgutil
+import tempfile
 import unittest
+from unittest import mock
 
+from metrics.lib import basemetric, kvstore
 from metrics.lib.basemetric import Metric
 from metrics.lib.errors import CollectorError
+from metrics.lib.httpclient import set_client
 
 
 class TestCollector(unittest.TestCase):
+    def setUp(self):
+        # Keep the cache and state of the runs away from the real ones
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = mock.patch.dict(
+            os.environ,
+            {
+                "METRICS_CACHE_DIR": os.path.join(directory.name, "cache"),
+                "METRICS_STATE_DIR": os.path.join(directory.name, "state"),
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        self._reset_singletons()
+        self.addCleanup(self._reset_singletons)
+
+    @staticmethod
+    def _reset_singletons():
+        set_client(None)
+        if kvstore._store is not None:
+            kvstore._store.close()
+            kvstore._store = None
+        basemetric._spool = None
+
     def test_dry_run(self):
         """Test each test runner in dry run mode. They will all most likely
         access the internet, so we may want to consider replacing this with
@@ -19,7 +47,12 @@ class TestCollector(unittest.TestCase):
         ):
             importlib.import_module(name, __package__)
 
-        all_collectors = Metric.__subclasses__()
+        # Not those defined by other tests
+        all_collectors = [
+            collector
+            for collector in Metric.__subclasses__()
+            if collector.__module__.startswith("metrics.collectors.")
+        ]
 
         for collector in all_collectors:
             with self.subTest(collector_name=collector.__name__):
@@ -0,0 +1,1480 @@
+# Copyright 2026 Canonical Ltd
+
+import gzip
+import http.server
+import io
+import json
+import os
+import pstats
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import httplib2
+import requests
+from influxdb.line_protocol import make_lines
+
+from metrics.daemon import STARTUP_SPREAD, CollectorDaemon, run_daemon
+from metrics.lib import basemetric, kvstore, launchpad
+from metrics.lib.basemetric import Metric, aligned_time, to_lines
+from metrics.lib.deadline import Deadline, DeadlineExceeded
+from metrics.lib.dedup import filter_unchanged
+from metrics.lib.errors import CollectorError
+from metrics.lib.fetch import fetch_all
+from metrics.lib.fixtures import http_fixtures
+from metrics.lib.freshness import FreshnessGate
+from metrics.lib.httpcache import HTTPCache
+from metrics.lib.httpclient import HTTPClient, get_client, set_client
+from metrics.lib.importprofile import parse_importtime, profile_imports
+from metrics.lib.kvstore import KVStore
+from metrics.lib.point import Point, decode_line, encode
+from metrics.lib.profiling import profiled
+from metrics.lib.registry import discover
+from metrics.lib.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from metrics.lib.scheduler import HostLimits, RequestScheduler, parse_host_limits
+from metrics.lib.selfstats import CollectorStats
+from metrics.lib.sinks import (
+    BatchRejected,
+    FanOutSink,
+    FileSink,
+    LineProtocolHTTPSink,
+    QueuedSink,
+    Sink,
+    sink_from_spec,
+)
+from metrics.lib.spool import REJECTED_FILE, Spool
+from metrics.lib.tail import TailFollower
+from metrics.lib.timespan import parse_timespan
+from metrics.run_all import CollectorResult, collector_class, format_report
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serve ``/<n>`` with body ``<n>`` after a short delay, ``/etag`` with
+    an ETag honouring ``If-None-Match``, ``/file`` with ``file_body``
+    honouring ``Range`` (``bytes=N-M`` only if ``bounded_ranges``),
+    ``/flaky`` with a 503 while ``flaky_failures`` is positive (decrementing
+    it) and a 200 afterwards; 404 otherwise.  POSTs to ``/write`` are
+    recorded in ``writes`` and answered the next of ``write_statuses``, or
+    ``write_status`` once there are none left."""
+
+    delay = 0.2
+    etag_bodies_sent = 0
+    file_body = b""
+    bounded_ranges = True
+    flaky_failures = 0
+    writes = []
+    write_statuses = []
+    write_status = 204
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        type(self).writes.append((self.path, dict(self.headers), body))
+        statuses = type(self).write_statuses
+        self.send_response(statuses.pop(0) if statuses else self.write_status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        name = self.path.lstrip("/")
+        if name == "flaky":
+            status = 503 if type(self).flaky_failures > 0 else 200
+            type(self).flaky_failures -= 1
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if name == "file":
+            self._send_file()
+            return
+        if name == "etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            type(self).etag_bodies_sent += 1
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "5")
+            self.end_headers()
+            self.wfile.write(b"hello")
+            return
+        if not name.isdigit():
+            self.send_error(404)
+            return
+        time.sleep(self.delay)
+        body = name.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self):
+        body = self.file_body
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "") or "")
+        suffix = re.fullmatch(r"bytes=-(\d+)", self.headers.get("Range", "") or "")
+        if m and m.group(2) and not self.bounded_ranges:
+            m = None
+        if m or suffix:
+            start = int(m.group(1)) if m else max(len(body) - int(suffix.group(1)), 0)
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            end = min(int(m.group(2)), len(body) - 1) if m and m.group(2) else -1
+            end %= len(body)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            body = body[start : end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IsolatedTestCase(unittest.TestCase):
+    """Keep the cache and state of each test in a temporary directory, with
+    fresh process-wide HTTP client, state store and spool."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = mock.patch.dict(
+            os.environ,
+            {
+                "METRICS_CACHE_DIR": os.path.join(directory.name, "cache"),
+                "METRICS_STATE_DIR": os.path.join(directory.name, "state"),
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        self._reset_singletons()
+        self.addCleanup(self._reset_singletons)
+
+    @staticmethod
+    def _reset_singletons():
+        set_client(None)
+        if kvstore._store is not None:
+            kvstore._store.close()
+            kvstore._store = None
+        basemetric._spool = None
+
+
+class LocalServerTestCase(IsolatedTestCase):
+    """Run a local HTTP stand-in for the duration of the test class."""
+
+    handler = _Handler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), cls.handler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+
+class TestFetchAll(LocalServerTestCase):
+    def test_fetch_all_is_concurrent_and_ordered(self):
+        urls = [self.base_url + str(n) for n in range(6)] + [self.base_url + "x"]
+        start = time.monotonic()
+        results = fetch_all(HTTPClient(), urls, concurrency=8)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(list(results), urls)
+        self.assertEqual([results[u].text for u in urls[:6]], list("012345"))
+        self.assertEqual(results[urls[-1]].status_code, 404)
+        # Six 0.2s requests in sequence would take at least 1.2s
+        self.assertLess(elapsed, 1.0)
+
+    def test_fetch_all_returns_exceptions(self):
+        url = "http://127.0.0.1:1/"
+        results = fetch_all(HTTPClient(), [url])
+        self.assertIsInstance(results[url], Exception)
+
+
+class _LaunchpadHandler(_Handler):
+    """Serve ``/<name>?...`` with the body ``collections[name]``, recording
+    the query strings in ``queries``."""
+
+    collections = {}
+    queries = []
+
+    def do_GET(self):
+        name, _, query = self.path.lstrip("/").partition("?")
+        if name not in self.collections:
+            self.send_error(404)
+            return
+        type(self).queries.append(query)
+        body = self.collections[name].encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestCountAll(LocalServerTestCase):
+    handler = _LaunchpadHandler
+
+    def setUp(self):
+        super().setUp()
+        _LaunchpadHandler.queries = []
+        _LaunchpadHandler.collections = {
+            "bare": "5",
+            "batch": '{"total_size": 7, "entries": []}',
+            "linked": json.dumps({"total_size_link": self.base_url + "size"}),
+            "size": "9",
+            "html": "<html>Oops</html>",
+            "empty": "{}",
+        }
+
+    def test_sizes_of_every_form(self):
+        counts = launchpad.count_all(
+            HTTPClient(),
+            {
+                "bare": (self.base_url + "bare", {"ws.op": "searchTasks"}),
+                "batch": (self.base_url + "batch", {}),
+                "linked": (self.base_url + "linked", {}),
+            },
+        )
+        self.assertEqual(counts, {"bare": 5, "batch": 7, "linked": 9})
+        self.assertIn("ws.op=searchTasks&ws.show=total_size", _LaunchpadHandler.queries)
+
+    def test_failures_do_not_abort_the_other_queries(self):
+        counts = launchpad.count_all(
+            HTTPClient(),
+            {
+                "missing": (self.base_url + "missing", {}),
+                "html": (self.base_url + "html", {}),
+                "empty": (self.base_url + "empty", {}),
+                "unreachable": ("http://127.0.0.1:1/", {}),
+                "bare": (self.base_url + "bare", {}),
+            },
+        )
+        self.assertEqual(counts.pop("bare"), 5)
+        self.assertIsInstance(counts.pop("missing"), requests.HTTPError)
+        for key, count in counts.items():
+            with self.subTest(key=key):
+                self.assertIsInstance(count, Exception)
+
+
+class TestLaunchpadSessions(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        idle = mock.patch.object(launchpad, "_idle", [])
+        idle.start()
+        self.addCleanup(idle.stop)
+        login = mock.patch.object(launchpad, "_login", side_effect=object)
+        self.login = login.start()
+        self.addCleanup(login.stop)
+
+    def in_thread(self, function):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(function()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_sessions_outlive_their_threads(self):
+        first = self.in_thread(launchpad.login)
+        # Like the getter threads of the next run
+        self.assertIs(self.in_thread(launchpad.login), first)
+        self.assertIs(self.in_thread(launchpad.login), first)
+        self.assertEqual(self.login.call_count, 1)
+
+    def test_concurrent_threads_get_their_own_session(self):
+        barrier = threading.Barrier(2)
+
+        def login_twice():
+            lp = launchpad.login()
+            barrier.wait()
+            self.assertIs(launchpad.login(), lp)
+            return lp
+
+        sessions = []
+        threads = [
+            threading.Thread(target=lambda: sessions.append(login_twice()))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(sessions[0], sessions[1])
+        self.assertEqual(self.login.call_count, 2)
+
+
+class TestLaunchpadCleanup(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+
+    def make(self, name, files, age):
+        path = os.path.join(self.dir, name)
+        for file in files:
+            os.makedirs(os.path.dirname(os.path.join(path, file)), exist_ok=True)
+            with open(os.path.join(path, file), "w") as f:
+                f.write("x" * 100)
+        os.makedirs(path, exist_ok=True)
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def test_only_stale_launchpadlib_dirs_are_removed(self):
+        day = launchpad.STALE_TEMP_DIR_AGE
+        lp_cache = ["api.launchpad.net/cache/entry"]
+        stale = self.make("tmpstale", lp_cache, 2 * day)
+        kept = [
+            self.make("tmpfresh", lp_cache, 60),
+            self.make("tmpforeign", lp_cache + ["notes.txt"], 2 * day),
+            self.make("tmpother", ["data"], 2 * day),
+            self.make("tmpempty", [], 2 * day),
+            self.make("launchpadlib", lp_cache, 2 * day),
+        ]
+        with open(os.path.join(self.dir, "tmpfile"), "w"):
+            pass
+
+        with mock.patch.object(tempfile, "tempdir", self.dir):
+            launchpad.remove_stale_temp_dirs()
+
+        self.assertFalse(os.path.exists(stale))
+        for path in kept:
+            self.assertTrue(os.path.isdir(path), path)
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, "tmpfile")))
+
+    def test_cache_is_pruned_oldest_first(self):
+        cache = os.path.join(self.dir, "cache")
+        for n, age in enumerate((400, 300, 200, 100)):
+            path = os.path.join(cache, "host", f"entry{n}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("x" * 100)
+            then = time.time() - age
+            os.utime(path, (then, then))
+
+        launchpad.prune_cache(cache, max_size=250)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(cache, "host"))), ["entry2", "entry3"]
+        )
+
+        launchpad.prune_cache(cache, max_size=250)
+        self.assertEqual(len(os.listdir(os.path.join(cache, "host"))), 2)
+
+
+class TestHTTPCache(LocalServerTestCase):
+    def test_not_modified_is_served_from_disk(self):
+        with tempfile.TemporaryDirectory() as d:
+            url = self.base_url + "etag"
+            sent = _Handler.etag_bodies_sent
+            first = HTTPClient(cache=HTTPCache(d)).get(url)
+            # A fresh client (i.e. the next collector run) shares the cache
+            second = HTTPClient(cache=HTTPCache(d)).get(url)
+
+            self.assertEqual(first.text, "hello")
+            self.assertEqual(second.text, "hello")
+            self.assertTrue(getattr(second, "from_cache", False))
+            self.assertEqual(_Handler.etag_bodies_sent, sent + 1)
+
+            cached = HTTPCache(d).load(url)
+            self.assertEqual(b"".join(cached.iter_content(2)), b"hello")
+            self.assertEqual(list(cached.iter_lines()), [b"hello"])
+
+    def test_range_requests_bypass_the_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            url = self.base_url + "etag"
+            client = HTTPClient(cache=HTTPCache(d))
+            client.get(url, headers={"range": "bytes=0-1"})
+            self.assertIsNone(client.cache.load(url))
+
+            client.get(url)
+            sent = _Handler.etag_bodies_sent
+            response = client.get(url, headers={"range": "bytes=0-1"})
+            self.assertFalse(getattr(response, "from_cache", False))
+            self.assertEqual(_Handler.etag_bodies_sent, sent + 1)
+
+    def test_eviction_keeps_most_recent(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = HTTPCache(d, max_size=200)
+            client = HTTPClient(cache=cache)
+            for n in range(3):
+                response = client.get(self.base_url + "etag")
+                cache.store(f"http://example.invalid/{n}", response)
+                time.sleep(0.01)
+
+            self.assertIsNone(cache.load("http://example.invalid/0"))
+            self.assertIsNotNone(cache.load("http://example.invalid/2"))
+
+    def test_directory_is_scanned_only_past_the_limit(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = HTTPCache(d, max_size=10_000)
+            response = HTTPClient().get(self.base_url + "etag")
+            with mock.patch.object(cache, "evict", wraps=cache.evict) as evict:
+                for n in range(100):
+                    cache.store(f"http://example.invalid/{n}", response)
+                # Once to learn the size, then only when the entries pass
+                # 10kB, after which 1kB is freed: every few stores, not on
+                # each of them
+                self.assertLess(evict.call_count, 10)
+            self.assertLessEqual(sum(e.stat().st_size for e in os.scandir(d)), 10_000)
+
+
+class TestCollectorStats(LocalServerTestCase):
+    def test_requests_and_getters_are_recorded(self):
+        with tempfile.TemporaryDirectory() as d:
+            stats = CollectorStats()
+            client = HTTPClient(cache=HTTPCache(d)).with_stats(stats)
+            with stats.timer("get_things"):
+                client.get(self.base_url + "etag")
+                client.get(self.base_url + "etag")
+                fetch_all(client, [self.base_url + "1", self.base_url + "2"])
+
+        self.assertEqual(stats.http_requests, 4)
+        self.assertEqual(stats.http_cached, 1)
+        self.assertEqual(stats.http_bytes, len("hello") + 2)
+        self.assertGreater(stats.http_seconds, 0.2)
+
+        total, getter = stats.to_points("test")
+        self.assertEqual(total.tags, {"collector": "test"})
+        self.assertEqual(total.fields["http_requests"], 4)
+        self.assertEqual(getter.tags, {"collector": "test", "getter": "get_things"})
+        self.assertGreater(getter.fields["seconds"], 0.2)
+
+
+def _getter_metric():
+    # Defined on demand: test_collectors dry-runs every Metric subclass
+    class GetterMetric(Metric):
+        GETTERS = ("slow_a", "slow_b", ("broken", "after_broken"))
+
+        def slow_a(self):
+            time.sleep(0.3)
+            return [Point("m", {"v": 1})]
+
+        def slow_b(self):
+            time.sleep(0.3)
+            return [Point("m", {"v": 2})]
+
+        def broken(self):
+            raise ValueError("boom")
+
+        def after_broken(self):
+            return [Point("m", {"v": 3})]
+
+    metric = GetterMetric(dry_run=True)
+    metric.log.disabled = True
+    return metric
+
+
+class TestGetters(IsolatedTestCase):
+    def test_getters_run_concurrently_and_failures_are_isolated(self):
+        metric = _getter_metric()
+        start = time.monotonic()
+        try:
+            data = metric.collect()
+        finally:
+            metric.log.disabled = False
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(sorted(p.fields["v"] for p in data), [1, 2, 3])
+        self.assertEqual(metric.failed_getters, ["broken"])
+        self.assertTrue(metric.stats.getters["broken"][2])
+        self.assertFalse(metric.stats.getters["slow_a"][2])
+
+    def test_getters_of_a_group_run_in_order(self):
+        class GroupMetric(Metric):
+            GETTERS = (("produce", "consume"),)
+
+            def produce(self):
+                time.sleep(0.1)
+                self.produced = 1
+                return [Point("m", {"v": 1})]
+
+            def consume(self):
+                return [Point("m", {"v": self.produced + 1})]
+
+        metric = GroupMetric(dry_run=True)
+        data = metric.collect()
+        self.assertEqual([p.fields["v"] for p in data], [1, 2])
+        self.assertEqual(metric.failed_getters, [])
+
+    def test_britney_run_duration_uses_the_run_age_dates(self):
+        cls = collector_class(discover(["britney"])["britney"])
+        module = sys.modules[cls.__module__]
+        pages = {
+            "noble/update_excuses.html": "Generated: 2026.01.15 12:00:00 +0000",
+            "log/noble/2026-01-15/": '<td><a href="./20260115-1200.log"></a><td>',
+        }
+        log = (
+            "Thu, 15 Jan 2026 12:00:00 +0000\n"
+            "Finished at: Thu, 15 Jan 2026 12:30:00 +0000"
+        )
+
+        def fake_fetch_all(urls, **kwargs):
+            base = len(module.BRITNEY_URL)
+            return {url: mock.Mock(text=pages[url[base:]]) for url in urls}
+
+        distro_info = mock.Mock()
+        distro_info.return_value.supported.return_value = ["noble"]
+        distro_info.return_value.supported_esm.return_value = []
+        distro_info.return_value.devel.return_value = "resolute"
+        with mock.patch.object(module, "UbuntuDistroInfo", distro_info):
+            metric = cls(dry_run=True)
+        metric.GETTERS = [g for g in cls.GETTERS if not isinstance(g, str)]
+        metric.fetch_all = fake_fetch_all
+        metric.http = mock.Mock()
+        metric.http.get.return_value.text = log
+
+        data = metric.run_getters()
+        self.assertEqual(metric.failed_getters, [])
+        durations = [p for p in data if "run_duration" in p["fields"]]
+        self.assertEqual(durations[0]["fields"], {"run_duration": 30})
+
+    def test_points_get_the_aligned_collection_time(self):
+        metric = _getter_metric()
+        try:
+            data = metric.gather()
+        finally:
+            metric.log.disabled = False
+
+        # Not a collector package, so the default interval of 5 minutes
+        self.assertEqual(metric.collection_time.timestamp() % 300, 0)
+        stamp = int(metric.collection_time.timestamp() * 1000)
+        for line in to_lines(data, metric.collection_time):
+            self.assertTrue(line.endswith(f" {stamp}"), line)
+
+    def test_aligned_time(self):
+        self.assertEqual(
+            aligned_time(300, 1768478699.5),
+            datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc),
+        )
+        self.assertEqual(
+            aligned_time(86400, 1768478699),
+            datetime(2026, 1, 15, tzinfo=timezone.utc),
+        )
+
+    def test_run_reports_failed_getters(self):
+        metric = _getter_metric()
+        try:
+            with self.assertRaises(CollectorError):
+                metric.run()
+        finally:
+            metric.log.disabled = False
+
+
+def _deadline_metric(base_url):
+    class DeadlineMetric(Metric):
+        GETTERS = ("quick", "hung", "partial")
+        DEADLINE = "1"
+        DEADLINE_GRACE = 0.3
+
+        release = threading.Event()
+        hung_done = threading.Event()
+
+        def quick(self):
+            self.stage_state(("test", "quick", 1))
+            return [Point("m", {"v": 0})]
+
+        def hung(self):
+            self.release.wait(3)
+            self.stage_state(("test", "hung", 1))
+            self.hung_done.set()
+            return [Point("m", {"v": -1})]
+
+        def partial(self):
+            data = []
+            for n in range(1, 20):
+                try:
+                    self.http.get(base_url + str(n), cache=False)
+                except requests.exceptions.RequestException:
+                    break
+                data.append(Point("m", {"v": n}))
+            return data
+
+    metric = DeadlineMetric(dry_run=True)
+    metric.log.disabled = True
+    return metric
+
+
+class TestDeadline(LocalServerTestCase):
+    def test_clip(self):
+        deadline = Deadline(5)
+        self.assertEqual(deadline.clip((1, 60))[0], 1)
+        self.assertLessEqual(deadline.clip((1, 60))[1], 5)
+        self.assertLessEqual(deadline.clip(None), 5)
+        self.assertLessEqual(deadline.share(1).remaining(), 1)
+        self.assertLessEqual(deadline.share(10).remaining(), 5)
+
+    def test_requests_past_deadline_are_refused(self):
+        with Deadline(0).applied() as deadline:
+            with self.assertRaises(DeadlineExceeded):
+                HTTPClient().get(self.base_url + "1")
+        self.assertTrue(deadline.exceeded)
+
+    def test_deadline_follows_into_fetch_all(self):
+        url = self.base_url + "1"
+        start = time.monotonic()
+        with Deadline(0.1).applied():
+            result = fetch_all(HTTPClient(), [url])[url]
+        self.assertIsInstance(result, DeadlineExceeded)
+        self.assertLess(time.monotonic() - start, 0.2)
+
+    def test_getters_out_of_time_are_abandoned(self):
+        metric = _deadline_metric(self.base_url)
+        start = time.monotonic()
+        try:
+            data = metric.collect()
+        finally:
+            metric.log.disabled = False
+
+        self.assertLess(time.monotonic() - start, 2)
+        values = [p.fields["v"] for p in data]
+        # partial's points gathered before the deadline are kept
+        self.assertEqual(values[0], 0)
+        self.assertGreater(len(values), 2)
+        self.assertNotIn(-1, values)
+        self.assertEqual(sorted(metric.failed_getters), ["hung", "partial"])
+        self.assertTrue(metric.stats.getters["hung"][3])
+        self.assertTrue(metric.stats.getters["partial"][3])
+        self.assertEqual(metric.stats.abandoned_threads, 1)
+
+        # Nothing hung stages once abandoned is committed with this run
+        metric.release.set()
+        self.assertTrue(metric.hung_done.wait(1))
+        self.assertEqual(metric.pending_state, [("test", "quick", 1)])
+
+
+class TestResilience(LocalServerTestCase):
+    def test_transient_errors_are_retried(self):
+        _Handler.flaky_failures = 2
+        stats = CollectorStats()
+        client = HTTPClient(retry=RetryPolicy(base_delay=0.01)).with_stats(stats)
+        self.assertEqual(client.get(self.base_url + "flaky").status_code, 200)
+        self.assertEqual((stats.http_requests, stats.http_retries), (3, 2))
+
+        _Handler.flaky_failures = 5
+        self.assertEqual(client.get(self.base_url + "flaky").status_code, 503)
+
+    def test_circuit_opens_and_persists(self):
+        url = "http://127.0.0.1:1/"
+        with tempfile.TemporaryDirectory() as d:
+            store = KVStore(os.path.join(d, "state.sqlite3"))
+            client = HTTPClient(breaker=CircuitBreaker(store, threshold=2))
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectionError) as cm:
+                    client.get(url)
+                self.assertNotIsInstance(cm.exception, CircuitOpenError)
+
+            # A new process sharing the store fails fast too
+            stats = CollectorStats()
+            client = HTTPClient(breaker=CircuitBreaker(store)).with_stats(stats)
+            with self.assertRaises(CircuitOpenError):
+                client.get(url)
+            self.assertEqual(stats.http_rejected, {"127.0.0.1:1": 1})
+            self.assertEqual(stats.http_requests, 0)
+            hosts = [p.tags.get("host") for p in stats.to_points("test")]
+            self.assertIn("127.0.0.1:1", hosts)
+
+            # Once the cooldown has passed, a success closes the circuit
+            host = self.base_url.split("/")[2]
+            breaker = CircuitBreaker(store, threshold=2, open_seconds=0)
+            breaker.record_failure(host)
+            breaker.record_failure(host)
+            self.assertIsNotNone(store.get("circuit", host))
+            client = HTTPClient(breaker=breaker)
+            self.assertEqual(client.get(self.base_url + "flaky").status_code, 200)
+            self.assertIsNone(store.get("circuit", host))
+            store.close()
+
+    def test_failures_from_concurrent_threads_all_count(self):
+        with tempfile.TemporaryDirectory() as d:
+            store = KVStore(os.path.join(d, "state.sqlite3"))
+            breakers = [CircuitBreaker(store, threshold=1000) for _ in range(4)]
+            threads = [
+                threading.Thread(
+                    target=lambda b=b: [b.record_failure("h") for _ in range(50)]
+                )
+                for b in breakers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(store.get("circuit", "h")["failures"], 200)
+            store.close()
+
+    def test_half_open_circuit_lets_one_probe_through(self):
+        breaker = CircuitBreaker(threshold=1, open_seconds=0)
+        breaker.record_failure("h")
+        breaker.check("h")
+        with self.assertRaises(CircuitOpenError):
+            breaker.check("h")
+
+        # The probe failed: open again, then probe again
+        breaker.record_failure("h")
+        breaker.check("h")
+        breaker.record_success("h")
+        breaker.check("h")
+        breaker.check("h")
+
+
+class TestSinks(LocalServerTestCase):
+    LINES = ["m,host=a v=1i 1000", 'm,host=b note="x y",v=2i 2000']
+
+    def setUp(self):
+        super().setUp()
+        _Handler.writes = []
+        _Handler.write_statuses = []
+        _Handler.write_status = 204
+
+    def test_http_sink(self):
+        sink = LineProtocolHTTPSink(
+            self.base_url + "write?org=o&bucket=b", token="secret"
+        )
+        self.assertTrue(sink.write_batch(self.LINES))
+        path, headers, body = _Handler.writes[0]
+        self.assertEqual(path, "/write?org=o&bucket=b&precision=ms")
+        self.assertEqual(headers["Authorization"], "Token secret")
+        self.assertEqual(body.decode().splitlines(), self.LINES)
+
+        # Rejected lines are singled out rather than retried
+        _Handler.write_status = 400
+        rejected = []
+        self.assertTrue(sink.write_batch(self.LINES, lambda b, e: rejected.extend(b)))
+        self.assertEqual(rejected, self.LINES)
+        self.assertEqual(len(_Handler.writes), 4)
+
+        # Other client errors keep the batch for later
+        _Handler.write_status = 401
+        with mock.patch("metrics.lib.sinks.WRITE_RETRY_DELAY", 0):
+            self.assertFalse(sink.write_batch(self.LINES))
+
+    def test_http_sink_batches_and_compresses(self):
+        lines = [f"m v={i}i {i}" for i in range(5)]
+        sink = LineProtocolHTTPSink(self.base_url + "write", batch_size=2)
+        sink.write(lines[:4])
+        sink.write(lines)
+        self.assertEqual(
+            [body.decode().splitlines() for _, _, body in _Handler.writes],
+            [lines[0:2], lines[2:4], lines[0:2], lines[2:4], lines[4:]],
+        )
+        for _, headers, _ in _Handler.writes:
+            # The handler only decompresses bodies sent as gzip
+            self.assertEqual(headers["Content-Encoding"], "gzip")
+            self.assertEqual(headers["Content-Type"], "text/plain; charset=utf-8")
+
+    def test_http_sink_retries_unavailable_servers(self):
+        sink = LineProtocolHTTPSink(self.base_url + "write")
+        for status in (500, 503, 429):
+            with self.subTest(status=status):
+                _Handler.writes = []
+                _Handler.write_statuses = [status, status]
+                with mock.patch(
+                    "metrics.lib.sinks.WRITE_RETRY_DELAY", 0
+                ), self.assertLogs("metrics.lib.sinks", "WARNING"):
+                    self.assertTrue(sink.write_batch(self.LINES))
+                self.assertEqual(
+                    [body.decode().splitlines() for _, _, body in _Handler.writes],
+                    [self.LINES] * 3,
+                )
+
+        # Given up on after WRITE_ATTEMPTS, keeping the batch for later
+        _Handler.writes = []
+        _Handler.write_status = 503
+        with mock.patch("metrics.lib.sinks.WRITE_RETRY_DELAY", 0), self.assertLogs(
+            "metrics.lib.sinks", "ERROR"
+        ):
+            self.assertFalse(sink.write_batch(self.LINES))
+        self.assertEqual(len(_Handler.writes), 3)
+
+    def test_fan_out_to_queued_sinks(self):
+        with tempfile.TemporaryDirectory() as d:
+            lp = os.path.join(d, "points.lp")
+            ndjson = os.path.join(d, "points.ndjson")
+            mirror = FanOutSink(
+                [
+                    QueuedSink(FileSink(lp, batch_size=1)),
+                    QueuedSink(sink_from_spec(f"file:{ndjson}")),
+                    QueuedSink(
+                        LineProtocolHTTPSink(self.base_url + "write"),
+                        flush_interval=0.05,
+                    ),
+                ]
+            )
+            self.assertTrue(mirror.write_batch(self.LINES[:1]))
+            self.assertTrue(mirror.write_batch(self.LINES[1:]))
+            mirror.close(timeout=10)
+            self.assertFalse(mirror.write_batch(self.LINES))
+
+            with open(lp) as f:
+                self.assertEqual(f.read().splitlines(), self.LINES)
+            with open(ndjson) as f:
+                points = [json.loads(line) for line in f]
+            self.assertEqual(
+                points[1],
+                {
+                    "measurement": "m",
+                    "tags": {"host": "b"},
+                    "fields": {"note": "x y", "v": 2},
+                    "time": 2000,
+                },
+            )
+            sent = [b.decode() for _, _, b in _Handler.writes]
+            self.assertEqual("".join(sent).splitlines(), self.LINES)
+
+    def test_queue_drops_oldest_when_full(self):
+        # Nothing gets written before close(): the batch never fills up
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "points.lp")
+            sink = QueuedSink(FileSink(path), max_queued=2, flush_interval=60)
+            for line in ["m v=1i 1", "m v=2i 2", "m v=3i 3"]:
+                sink.write_batch([line])
+            sink.close(timeout=10)
+            self.assertEqual(sink.dropped, 1)
+            with open(path) as f:
+                self.assertEqual(f.read(), "m v=2i 2\nm v=3i 3\n")
+
+    def test_queue_keeps_what_the_sink_could_not_take(self):
+        class DownOnceSink(Sink):
+            def __init__(self):
+                super().__init__(batch_size=2)
+                self.written = []
+                self.attempts = 0
+
+            def write_batch(self, batch, quarantine=None):
+                self.attempts += 1
+                if self.attempts == 1:
+                    return False
+                self.written.extend(batch)
+                return True
+
+        down = DownOnceSink()
+        sink = QueuedSink(down, flush_interval=0.01, requeue_delay=0.01)
+        with self.assertLogs("metrics.lib.sinks", "WARNING"):
+            sink.write_batch(["m v=1i 1", "m v=2i 2", "m v=3i 3"])
+            deadline = time.monotonic() + 5
+            while len(down.written) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        sink.close(timeout=5)
+        self.assertEqual(down.written, ["m v=1i 1", "m v=2i 2", "m v=3i 3"])
+        self.assertEqual(sink.dropped, 0)
+
+    def test_invalid_spec(self):
+        with self.assertRaises(CollectorError):
+            sink_from_spec("carrier-pigeon")
+
+
+class TestScheduler(LocalServerTestCase):
+    def test_concurrency_limit(self):
+        host = self.base_url.split("/")[2]
+        scheduler = RequestScheduler({host: HostLimits(2)})
+        stats = CollectorStats()
+        client = HTTPClient(scheduler=scheduler).with_stats(stats)
+        start = time.monotonic()
+        results = fetch_all(client, [self.base_url + str(n) for n in range(6)])
+        self.assertEqual([r.text for r in results.values()], list("012345"))
+        # Three rounds of two 0.2s requests
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+        self.assertGreater(stats.http_queue_seconds, 0.5)
+
+    def test_rate_limit(self):
+        scheduler = RequestScheduler(default=HostLimits(1, rate=20))
+        start = time.monotonic()
+        for _ in range(5):
+            with scheduler.slot("example"):
+                pass
+        # One burst token, then four more at 20/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_owners_are_served_round_robin(self):
+        scheduler = RequestScheduler(default=HostLimits(1))
+        order = []
+        release = threading.Event()
+
+        def request(owner):
+            with scheduler.slot("example", owner):
+                order.append(owner)
+                release.wait()
+
+        threads = [threading.Thread(target=request, args=("a",)) for _ in range(4)]
+        threads.append(threading.Thread(target=request, args=("b",)))
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order[:3], ["a", "a", "b"])
+
+    def test_parse_host_limits(self):
+        self.assertEqual(
+            parse_host_limits("api.launchpad.net=4:10, *=16"),
+            {"api.launchpad.net": HostLimits(4, 10.0), "*": HostLimits(16)},
+        )
+        for bad in ("example", "example=0", "example=x", "=4"):
+            with self.subTest(value=bad):
+                with self.assertRaises(ValueError):
+                    parse_host_limits(bad)
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fake_collector(clock, interval="1m", duration=30, fail=False):
+    """A collector module whose runs take *duration* seconds of *clock*,
+    recording their start in its ``runs``."""
+    module = types.SimpleNamespace(__name__="fake", RUN_INTERVAL=interval, runs=[])
+
+    def run_metric(dry_run=False, verbose=False):
+        module.runs.append(clock.now)
+        clock.now += duration
+        if fail:
+            raise CollectorError("fake: failed getters: all")
+
+    module.run_metric = run_metric
+    return module
+
+
+class TestDaemon(IsolatedTestCase):
+    def run_for(self, daemon, clock, seconds):
+        # Collectors run inline, and the clock moves a second at a time
+        end = clock.now + seconds
+        while clock.now < end:
+            daemon.run_due(lambda function, *args: function(*args))
+            clock.now += 1
+
+    def test_startup_is_spread(self):
+        clock = _FakeClock()
+        collectors = {f"c{n}": _fake_collector(clock, duration=0) for n in range(20)}
+        daemon = CollectorDaemon(collectors, clock=clock)
+        daemon.schedule_startup()
+
+        starts = set(daemon._due.values())
+        self.assertGreater(len(starts), 1)
+        self.assertTrue(all(1000 <= due <= 1000 + STARTUP_SPREAD for due in starts))
+        self.run_for(daemon, clock, STARTUP_SPREAD + 1)
+        self.assertTrue(all(c.runs for c in collectors.values()))
+
+    def test_runs_land_in_consecutive_intervals(self):
+        clock = _FakeClock()
+        collector = _fake_collector(clock, "1m", duration=30)
+        daemon = CollectorDaemon({"c": collector}, clock=clock)
+        daemon.schedule_startup()
+        self.run_for(daemon, clock, 600)
+
+        # The first run, at startup, lands wherever the daemon started
+        runs = collector.runs[1:]
+        buckets = [aligned_time(60, start).timestamp() for start in runs]
+        self.assertGreaterEqual(len(buckets), 8)
+        self.assertEqual(
+            [b - a for a, b in zip(buckets, buckets[1:])], [60] * (len(buckets) - 1)
+        )
+        for previous, start in zip(runs, runs[1:]):
+            # After the previous run finished, at the collector's offset
+            self.assertGreaterEqual(start, previous + 30)
+            self.assertLess((start - daemon.offsets["c"]) % 60, 1)
+
+    def test_overrunning_collector_skips_intervals(self):
+        clock = _FakeClock()
+        collector = _fake_collector(clock, "1m", duration=70)
+        daemon = CollectorDaemon({"c": collector}, clock=clock)
+        daemon.schedule_startup()
+        self.run_for(daemon, clock, 600)
+
+        runs = collector.runs[1:]
+        buckets = [aligned_time(60, start).timestamp() for start in runs]
+        self.assertGreaterEqual(len(buckets), 3)
+        self.assertEqual(
+            [b - a for a, b in zip(buckets, buckets[1:])], [120] * (len(buckets) - 1)
+        )
+
+    def test_failing_collector_does_not_stop_the_others(self):
+        clock = _FakeClock()
+        broken = _fake_collector(clock, "1m", duration=1, fail=True)
+        working = _fake_collector(clock, "1m", duration=1)
+        daemon = CollectorDaemon({"broken": broken, "working": working}, clock=clock)
+        daemon.schedule_startup()
+        with self.assertLogs("metrics.daemon", "ERROR") as logs:
+            self.run_for(daemon, clock, 300)
+
+        self.assertGreaterEqual(len(working.runs), 4)
+        # Retried on its next cycles too
+        self.assertGreaterEqual(len(broken.runs), 4)
+        self.assertIn("Collector broken failed", logs.output[0])
+
+    @mock.patch("metrics.daemon.STARTUP_SPREAD", 0)
+    def test_stop_ends_the_loop(self):
+        ran = threading.Event()
+        collector = types.SimpleNamespace(
+            __name__="fake", RUN_INTERVAL="1h", run_metric=lambda **kw: ran.set()
+        )
+        daemon = CollectorDaemon({"c": collector})
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+        self.assertTrue(ran.wait(5))
+        daemon.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    @mock.patch("metrics.daemon.STARTUP_SPREAD", 0)
+    def test_sigterm_stops_run_daemon(self):
+        collector = types.SimpleNamespace(
+            __name__="fake",
+            RUN_INTERVAL="1h",
+            run_metric=lambda **kw: os.kill(os.getpid(), signal.SIGTERM),
+        )
+        handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+        for sig, handler in handlers.items():
+            self.addCleanup(signal.signal, sig, handler)
+        with mock.patch("metrics.daemon.discover", return_value={"c": collector}):
+            # Returns once the signal stopped it
+            run_daemon(dry_run=True)
+
+
+class TestRunAll(IsolatedTestCase):
+    def test_collector_class(self):
+        import metrics.collectors.sponsoring as sponsoring
+
+        self.assertEqual(collector_class(sponsoring).__name__, "SponsoringMetrics")
+
+    def test_format_report(self):
+        fast, slow = CollectorResult("fast"), CollectorResult("slow")
+        fast.seconds, fast.points = 1.0, 10
+        slow.seconds, slow.error = 5.0, "boom"
+        rows = format_report([fast, slow]).splitlines()
+        self.assertEqual(rows[1].split(), ["slow", "failed", "5.0", "0", "boom"])
+        self.assertEqual(rows[2].split(), ["fast", "ok", "1.0", "10"])
+
+
+class TestTimespan(unittest.TestCase):
+    def test_parse_timespan(self):
+        self.assertEqual(parse_timespan("5m"), 300)
+        self.assertEqual(parse_timespan("1h"), 3600)
+        self.assertEqual(parse_timespan("1h 30min"), 5400)
+        self.assertEqual(parse_timespan("90"), 90)
+        self.assertEqual(parse_timespan(42), 42)
+        for bad in ("", "5 parsecs", "m5"):
+            with self.subTest(value=bad):
+                with self.assertRaises(ValueError):
+                    parse_timespan(bad)
+
+
+class TestSpool(IsolatedTestCase):
+    def test_drain_keeps_segments_until_written(self):
+        with tempfile.TemporaryDirectory() as d:
+            spool = Spool(d)
+            spool.append(["m v=1i 1", "m v=2i 2"])
+            spool.append(["m v=3i 3"])
+
+            self.assertIsNone(spool.drain(lambda batch: False, batch_size=2))
+            self.assertEqual(len(spool.segments()), 2)
+
+            batches = []
+
+            def write(batch):
+                batches.append(batch)
+                return True
+
+            self.assertEqual(spool.drain(write, batch_size=2), 3)
+            self.assertEqual(batches, [["m v=1i 1", "m v=2i 2"], ["m v=3i 3"]])
+            self.assertEqual(spool.segments(), [])
+
+    def test_rejected_lines_do_not_block_the_spool(self):
+        class PickySink(Sink):
+            sent = []
+
+            def send(self, batch):
+                if any(line.startswith("bad") for line in batch):
+                    raise BatchRejected("unable to parse")
+                self.sent.extend(batch)
+
+        with tempfile.TemporaryDirectory() as d:
+            spool = Spool(d)
+            spool.append(["bad v=oops 1"])
+            spool.append(["m v=1i 1", "m v=2i 2"])
+            spool.append(["m v=3i 3", "bad v= 2", "m v=4i 4"])
+            sink = PickySink(batch_size=4)
+            sink.log = mock.Mock()
+            sink.drain(spool)
+
+            self.assertEqual(
+                sink.sent, ["m v=1i 1", "m v=2i 2", "m v=3i 3", "m v=4i 4"]
+            )
+            self.assertEqual(spool.segments(), [])
+            with open(os.path.join(d, REJECTED_FILE)) as f:
+                rejected = [line for line in f.read().splitlines() if line[0] != "#"]
+            self.assertEqual(rejected, ["bad v=oops 1", "bad v= 2"])
+
+    def test_size_limit_drops_oldest(self):
+        with tempfile.TemporaryDirectory() as d:
+            spool = Spool(d, max_size=20)
+            spool.append(["old v=1i 1"])
+            spool.append(["new v=2i 2"])
+            with open(spool.segments()[0]) as f:
+                self.assertEqual(f.read(), "new v=2i 2\n")
+
+
+class TestPoint(unittest.TestCase):
+    POINTS = [
+        {
+            "measurement": "autopkgtest_queue_size",
+            "fields": {"count": 3},
+            "tags": {"context": "ubuntu", "release": "noble", "arch": "amd64"},
+            "time": datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc),
+        },
+        {
+            "measurement": "daily_image_details",
+            "fields": {"age": 2, "size": 123456789, "ratio": 0.5, "ok": True},
+            "tags": {"flavor": "ubuntu", "image_type": None, "arch": "arm64"},
+            "time": datetime(2026, 1, 2, 3, 4, 5),
+        },
+        {
+            "measurement": "needs escaping,really",
+            "fields": {"note": 'a "quoted"\nvalue\\', "gone": None},
+            "tags": {"with space": "a=b,c d", "empty": ""},
+            "time": 1767323045000,
+        },
+    ]
+
+    def test_matches_influxdb_make_lines(self):
+        expected = make_lines({"points": self.POINTS}, precision="ms").splitlines()
+        self.assertEqual(encode(self.POINTS, "ms"), expected)
+        points = [Point.from_dict(p) for p in self.POINTS]
+        self.assertEqual(encode(points, "ms"), expected)
+
+    def test_drops_points_without_fields(self):
+        # make_lines() emits "m 1" here, which InfluxDB rejects with the
+        # whole batch
+        point = {"measurement": "m", "fields": {"gone": None}, "time": 1}
+        self.assertEqual(encode([point]), [])
+
+    def test_decode_line(self):
+        for point in self.POINTS:
+            (line,) = encode([point], "ms")
+            measurement, tags, fields, timestamp = decode_line(line)
+            self.assertEqual(measurement, point["measurement"])
+            self.assertEqual(tags, {k: v for k, v in point["tags"].items() if v})
+            self.assertEqual(
+                fields, {k: v for k, v in point["fields"].items() if v is not None}
+            )
+            point = Point(measurement, fields, tags, timestamp)
+            self.assertEqual(encode([point], "ms"), [line])
+
+    def test_default_time(self):
+        point = Point("m", {"v": 1})
+        self.assertEqual(encode([point], "s", default_time=5), ["m v=1i 5"])
+        self.assertEqual(point.as_dict(), {"measurement": "m", "fields": {"v": 1}})
+
+
+class TestKVStore(IsolatedTestCase):
+    def test_round_trip_and_persistence(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "state.sqlite3")
+            store = KVStore(path)
+            store.put("ns", "a", {"x": 1})
+            store.put_many([("ns", "b", [1, 2]), ("other", "a", "v")])
+            store.close()
+
+            store = KVStore(path)
+            self.assertEqual(store.get("ns", "a"), {"x": 1})
+            self.assertEqual(
+                store.get_many("ns", ["a", "b", "c"]), {"a": {"x": 1}, "b": [1, 2]}
+            )
+            self.assertEqual(store.get("other", "a"), "v")
+            store.delete("ns", "a")
+            self.assertIsNone(store.get("ns", "a"))
+            store.close()
+
+
+class TestDedup(IsolatedTestCase):
+    def test_unchanged_points_are_suppressed_until_max_silence(self):
+        with tempfile.TemporaryDirectory() as d:
+            store = KVStore(os.path.join(d, "state.sqlite3"))
+            dedup = ("m",)
+
+            def run(points, now):
+                kept, updates = filter_unchanged(store, points, dedup, 3600, now)
+                store.put_many(updates)
+                return kept
+
+            a = Point("m", {"v": 1}, {"t": "a"})
+            b = Point("m", {"v": 2}, {"t": "b"})
+            other = Point("other", {"v": 1})
+            timed = Point("m", {"v": 1}, {"t": "a"}, time=1)
+
+            self.assertEqual(run([a, b, other], 0), [a, b, other])
+            self.assertEqual(run([a, b, other, timed], 60), [other, timed])
+            changed = Point("m", {"v": 3}, {"t": "b"})
+            self.assertEqual(run([a, changed], 120), [changed])
+            # a was last written at 0
+            self.assertEqual(run([a, changed], 3600), [a])
+            store.close()
+
+    def test_collectors_suppress_at_their_real_interval(self):
+        for name in ("contributors", "ubuntu_archive", "versions"):
+            with self.subTest(collector=name):
+                cls = collector_class(discover([name])[name])
+                # Not constructed: only what suppress_unchanged() needs
+                metric = cls.__new__(cls)
+                metric.stats = CollectorStats()
+                metric.log = mock.Mock()
+                metric.pending_state = []
+                point = {"measurement": cls.DEDUP_MEASUREMENTS[0], "fields": {"v": 1}}
+
+                # Like metrics.daemon: the next run starts an interval after
+                # the previous one finished
+                written = []
+                for run in range(13):
+                    now = 1_000_000 + run * (metric.interval + 30)
+                    with mock.patch("time.time", return_value=now):
+                        if metric.suppress_unchanged([point]):
+                            written.append(run)
+                    metric.commit_state()
+                self.assertEqual(written, [0, 6, 12])
+
+
+class TestTailFollower(LocalServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = KVStore(os.path.join(self.dir.name, "state.sqlite3"))
+        self.follower = TailFollower(HTTPClient(), self.store)
+        self.url = self.base_url + "file"
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def read(self, **kwargs):
+        tail = self.follower.read(self.url, **kwargs)
+        self.store.put_many([tail.update(watermark=len(tail.lines))])
+        return tail
+
+    def test_only_appended_lines_are_read(self):
+        _Handler.file_body = b"1,a\n2,b\n3,c\n"
+        tail = self.read(initial_tail=6)
+        self.assertEqual(tail.lines, ["3,c"])
+        self.assertFalse(tail.full)
+
+        self.assertEqual(self.read().lines, [])
+
+        _Handler.file_body += b"4,d\n5,"
+        tail = self.read()
+        self.assertEqual(tail.lines, ["4,d"])
+        self.assertEqual(tail.watermark, 0)
+
+        _Handler.file_body += b"e\n"
+        self.assertEqual(self.read().lines, ["5,e"])
+
+    def test_rotation_and_truncation_read_everything(self):
+        _Handler.file_body = b"1,a\n2,b\n"
+        self.read()
+
+        _Handler.file_body = b"1,x\n2,y\n3,z\n"
+        tail = self.read()
+        self.assertTrue(tail.full)
+        self.assertEqual(tail.lines, ["1,x", "2,y", "3,z"])
+        self.assertEqual(tail.watermark, 2)
+
+        _Handler.file_body = b"1,x\n"
+        tail = self.read()
+        self.assertTrue(tail.full)
+        self.assertEqual(tail.lines, ["1,x"])
+
+    def test_rewrite_keeping_the_last_line_reads_everything(self):
+        _Handler.file_body = b"1,a\n2,b\n"
+        self.read()
+
+        # Same last line at the same offset, but not the same file
+        _Handler.file_body = b"1,x\n2,b\n3,c\n"
+        tail = self.read()
+        self.assertTrue(tail.full)
+        self.assertEqual(tail.lines, ["1,x", "2,b", "3,c"])
+
+    def test_nothing_to_compare_with_reads_everything(self):
+        # No complete line in the initial tail, so no last line to check
+        _Handler.file_body = b"aaaaaaaa\n"
+        tail = self.read(initial_tail=4)
+        self.assertEqual(tail.lines, [])
+
+        _Handler.file_body = b"1,x\n2,y\n3,z\n"
+        tail = self.read()
+        self.assertTrue(tail.full)
+        self.assertEqual(tail.lines, ["1,x", "2,y", "3,z"])
+
+    def test_header_is_kept(self):
+        _Handler.file_body = b"time,n\n1,a\n"
+        tail = self.read(header=True)
+        self.assertEqual((tail.header, tail.lines), ("time,n", ["1,a"]))
+
+        _Handler.file_body += b"2,b\n"
+        tail = self.read(header=True)
+        self.assertEqual((tail.header, tail.lines), ("time,n", ["2,b"]))
+
+
+class TestFreshnessGate(LocalServerTestCase):
+    def test_unchanged_stamp(self):
+        url = self.base_url + "file"
+        pattern = re.compile(r"# Generated:\s+(.+)")
+        with tempfile.TemporaryDirectory() as d:
+            store = KVStore(os.path.join(d, "state.sqlite3"))
+            gate = FreshnessGate(HTTPClient(), store)
+
+            _Handler.file_body = b"* summary\n  1 amd64\n# Generated: Thu, 1\n"
+            stamp = gate.probe(url, pattern, tail=32)
+            self.assertEqual(stamp.value, "Thu, 1")
+            self.assertFalse(stamp.unchanged)
+            self.assertIsNone(stamp.document)
+
+            # Not handled yet, so not unchanged either
+            self.assertFalse(gate.probe(url, pattern, tail=32).unchanged)
+            store.put_many([stamp.update()])
+            self.assertTrue(gate.probe(url, pattern, tail=32).unchanged)
+
+            _Handler.file_body = b"* summary\n  2 amd64\n# Generated: Fri, 2\n"
+            self.assertFalse(gate.probe(url, pattern, tail=32).unchanged)
+            store.close()
+
+    @mock.patch.object(_Handler, "bounded_ranges", False)
+    def test_range_ignored(self):
+        _Handler.file_body = b"Generated: Thu\n" + b"x" * 100
+        stamp = FreshnessGate(HTTPClient()).probe(
+            self.base_url + "file", re.compile(r"Generated:\s+(.+)"), head=20
+        )
+        self.assertEqual(stamp.value, "Thu")
+        self.assertEqual(stamp.document.content, _Handler.file_body)
+
+
+class TestFixtures(LocalServerTestCase):
+    def test_record_then_replay(self):
+        _Handler.file_body = b"1,a\n2,b\n"
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "fixtures.json.gz")
+            with http_fixtures("record", path):
+                recorded = [
+                    get_client().get_text(self.base_url + "etag"),
+                    get_client()
+                    .get(self.base_url + "file", headers={"Range": "bytes=-4"})
+                    .text,
+                    httplib2.Http().request(self.base_url + "1")[1],
+                ]
+            _Handler.file_body = b"changed\n"
+
+            with http_fixtures("replay", path):
+                start = time.monotonic()
+                replayed = [
+                    get_client().get_text(self.base_url + "etag"),
+                    get_client()
+                    .get(self.base_url + "file", headers={"Range": "bytes=-4"})
+                    .text,
+                    httplib2.Http().request(self.base_url + "1")[1],
+                ]
+                # Served without the server's delay
+                self.assertLess(time.monotonic() - start, 0.2)
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    get_client().get(self.base_url + "2")
+
+        self.assertEqual(recorded, ["hello", "2,b\n", b"1"])
+        self.assertEqual(replayed, recorded)
+
+    def test_replay_implies_dry_run(self):
+        runs = []
+
+        class Replayed(Metric):
+            def collect(self):
+                runs.append(self.dry_run)
+                return [{"measurement": "m", "fields": {"v": 1}}]
+
+        module = types.ModuleType("replayed")
+        module.Replayed = Replayed
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "fixtures.json.gz")
+            written = []
+            for argv in (["--record", path], ["--replay", path], []):
+                ndjson = os.path.join(d, f"{len(written)}.ndjson")
+                with mock.patch.dict(sys.modules, replayed=module), mock.patch.dict(
+                    os.environ, METRICS_SINK=f"file:{ndjson}"
+                ), mock.patch.object(sys, "argv", ["replayed"] + argv):
+                    basemetric.run_metric_main("replayed", "Replayed")
+                written.append(os.path.exists(ndjson))
+
+        self.assertEqual(runs, [False, True, False])
+        self.assertEqual(written, [True, False, True])
+
+
+class TestImportProfile(unittest.TestCase):
+    def test_parse_importtime(self):
+        timings = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       199 |        199 |   _io\n"
+            "import time:       405 |       1069 | encodings\n"
+            "unrelated line\n"
+        )
+        self.assertEqual(
+            [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings],
+            [("_io", 199, 199, 1), ("encodings", 405, 1069, 0)],
+        )
+
+    def test_collector_imports_stay_lazy(self):
+        modules = {
+            t.module for t in profile_imports("metrics.collectors.ubuntu_archive")
+        }
+        self.assertIn("metrics.lib.basemetric", modules)
+        for heavy in ("influxdb", "launchpadlib", "bs4", "yaml"):
+            self.assertNotIn(heavy, modules)
+
+
+def _busy(seconds):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+class TestProfiling(IsolatedTestCase):
+    def test_profiled_getters(self):
+        metric = _getter_metric()
+        metric.slow_a = lambda: _busy(0.2) or [Point("m", {"v": 1})]
+        metric.slow_a.__name__ = "slow_a"
+        out = io.StringIO()
+        try:
+            with tempfile.TemporaryDirectory() as d:
+                prefix = os.path.join(d, "run")
+                with profiled(prefix, interval=0.001, out=out):
+                    metric.collect()
+
+                stats = pstats.Stats(prefix + ".pstats").stats
+                self.assertIn("_busy", {function for _, _, function in stats})
+                with open(prefix + ".collapsed") as f:
+                    collapsed = f.read().splitlines()
+        finally:
+            metric.log.disabled = False
+
+        busy = [line for line in collapsed if "test_lib:_busy" in line]
+        self.assertTrue(busy)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed))
+        # slow_b sleeps: off the CPU, but not waiting on the network
+        self.assertTrue(
+            any("slow_b;" in line and "[wait]" in line for line in collapsed)
+        )
+        self.assertIn("test_lib:_busy", out.getvalue())